@@ -0,0 +1,46 @@
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+
+from .models import Booking
+
+# Opening hours offered by book.html, one booking per hour.
+SLOTS = range(11, 20)
+# The default cache is per process, so a booking only refreshes the worker
+# that took it; keep the others' copies short-lived. A stale offer is still
+# refused by reserve().
+CACHE_TIMEOUT = 30
+
+
+def cache_key(date):
+    return f'restaurant:availability:{date}'
+
+
+def build_availability(date):
+    taken = set(Booking.objects.filter(reservation_date=date)
+                .values_list('reservation_slot', flat=True))
+    return {slot: slot not in taken for slot in SLOTS}
+
+
+def availability(date):
+    slots = cache.get(cache_key(date))
+    if slots is None:
+        slots = build_availability(date)
+        cache.set(cache_key(date), slots, CACHE_TIMEOUT)
+    return slots
+
+
+def refresh_availability(date):
+    cache.set(cache_key(date), build_availability(date), CACHE_TIMEOUT)
+
+
+def reserve(first_name, reservation_date, reservation_slot):
+    """Book a slot, or return None when somebody already holds it."""
+    try:
+        with transaction.atomic():
+            return Booking.objects.create(
+                first_name=first_name,
+                reservation_date=reservation_date,
+                reservation_slot=reservation_slot,
+            )
+    except IntegrityError:
+        return None
@@ -0,0 +1,148 @@
+import csv
+import json
+from datetime import datetime
+
+from django.utils.dateparse import parse_date
+
+from .availability import SLOTS
+from .models import Booking
+
+BOOKING_FIELDS = ('id', 'first_name', 'reservation_date', 'reservation_slot')
+PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+EXPORT_CHUNK_SIZE = 2000
+
+
+def _date(value, name):
+    try:
+        parsed = parse_date(value)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise ValueError(f'{name} must be a YYYY-MM-DD date')
+    return parsed
+
+
+def booking_payload(data):
+    """Read (first_name, reservation_date, reservation_slot) from a JSON body."""
+    if not isinstance(data, dict):
+        raise ValueError('expected a JSON object')
+    first_name = data.get('first_name')
+    if not isinstance(first_name, str) or not first_name.strip() or len(first_name) > 200:
+        raise ValueError('first_name must be a name of up to 200 characters')
+    reservation_date = data.get('reservation_date')
+    if not isinstance(reservation_date, str):
+        raise ValueError('reservation_date must be a YYYY-MM-DD date')
+    reservation_date = _date(reservation_date, 'reservation_date')
+    slot = data.get('reservation_slot')
+    if isinstance(slot, str) and slot.isdigit():
+        slot = int(slot)
+    if isinstance(slot, bool) or slot not in SLOTS:
+        raise ValueError(f'reservation_slot must be an hour from {SLOTS[0]} to {SLOTS[-1]}')
+    return first_name, reservation_date, slot
+
+
+def booking_query(params):
+    """Read (start, end, after, page_size) from the query string.
+
+    `date` selects a single day, `start`/`end` a range; without either the
+    bookings of today are listed. `after` is the `date,slot` cursor of the
+    previous page.
+    """
+    if 'date' in params:
+        start = end = _date(params['date'], 'date')
+    elif 'start' in params or 'end' in params:
+        start = _date(params.get('start', '0001-01-01'), 'start')
+        end = _date(params.get('end', '9999-12-31'), 'end')
+    else:
+        start = end = datetime.today().date()
+
+    after = None
+    if params.get('after'):
+        date, _, slot = params['after'].partition(',')
+        if not slot.isdigit():
+            raise ValueError('after must be a date,slot cursor')
+        after = (_date(date, 'after'), int(slot))
+
+    page_size = params.get('page_size', str(PAGE_SIZE))
+    if not page_size.isdigit() or int(page_size) == 0:
+        raise ValueError('page_size must be a positive integer')
+    return start, end, after, min(int(page_size), MAX_PAGE_SIZE)
+
+
+def stream_bookings(request, rows, page_size):
+    """Yield one page of bookings as {"results": [...], "next": url}.
+
+    Rows are encoded as they come off the cursor, so the page is never
+    held in memory as model instances.
+    """
+    yield '{"results":['
+    last = None
+    for index, row in enumerate(rows[:page_size + 1].iterator()):
+        if index == page_size:
+            break
+        booking = dict(zip(BOOKING_FIELDS, row))
+        booking['reservation_date'] = booking['reservation_date'].isoformat()
+        yield (',' if index else '') + json.dumps(booking)
+        last = booking
+    else:
+        last = None
+
+    next_url = None
+    if last is not None:
+        params = request.GET.copy()
+        params['after'] = f"{last['reservation_date']},{last['reservation_slot']}"
+        next_url = request.build_absolute_uri(f'{request.path}?{params.urlencode()}')
+    yield '],"next":' + json.dumps(next_url) + '}'
+
+
+class _Line:
+    def write(self, value):
+        return value
+
+
+def export_csv(rows):
+    writer = csv.writer(_Line())
+    yield writer.writerow(BOOKING_FIELDS)
+    for row in rows.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield writer.writerow(row)
+
+
+def export_ndjson(rows):
+    for row in rows.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        booking = dict(zip(BOOKING_FIELDS, row))
+        booking['reservation_date'] = booking['reservation_date'].isoformat()
+        yield json.dumps(booking) + '\n'
+
+
+EXPORTS = {
+    'csv': (export_csv, 'text/csv'),
+    'ndjson': (export_ndjson, 'application/x-ndjson'),
+}
+
+
+def availability_query(params):
+    """Read the day whose free slots are asked for; today by default."""
+    if 'date' in params:
+        return _date(params['date'], 'date')
+    return datetime.today().date()
+
+
+def export_query(params):
+    """Read (output, start, end) for an export from the query string."""
+    output = params.get('output', 'csv')
+    if output not in EXPORTS:
+        raise ValueError('output must be csv or ndjson')
+    start = _date(params['start'], 'start') if 'start' in params else None
+    end = _date(params['end'], 'end') if 'end' in params else None
+    return output, start, end
+
+
+def export_rows(start=None, end=None):
+    """Every booking between the optional dates, in slot order."""
+    rows = Booking.objects.order_by('reservation_date', 'reservation_slot')
+    if start is not None:
+        rows = rows.filter(reservation_date__gte=start)
+    if end is not None:
+        rows = rows.filter(reservation_date__lte=end)
+    return rows.values_list(*BOOKING_FIELDS)
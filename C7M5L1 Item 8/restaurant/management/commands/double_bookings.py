@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Min
+
+from restaurant.bookings import BOOKING_FIELDS, EXPORTS
+from restaurant.models import Booking
+
+
+def later_bookings():
+    """Every booking but the first of its slot."""
+    first = (Booking.objects.values('reservation_date', 'reservation_slot')
+             .annotate(first=Min('id')).values('first'))
+    return Booking.objects.exclude(id__in=first)
+
+
+class Command(BaseCommand):
+    help = (
+        "Export the bookings that share a slot with an earlier one, and with "
+        "--delete remove them, before migrating restaurant to 0004."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', required=True,
+                            help="CSV file to write the later bookings of each slot to.")
+        parser.add_argument('--delete', action='store_true',
+                            help="Delete the exported bookings, keeping the first of each slot.")
+
+    def handle(self, *args, **options):
+        # Exactly the exported rows are deleted, whatever is booked meanwhile.
+        ids = list(later_bookings().values_list('id', flat=True))
+        rows = (Booking.objects.filter(id__in=ids)
+                .order_by('reservation_date', 'reservation_slot', 'id')
+                .values_list(*BOOKING_FIELDS))
+        write, _ = EXPORTS['csv']
+        with open(options['output'], 'w', newline='', encoding='utf-8') as out:
+            out.writelines(write(rows))
+
+        if not ids:
+            self.stdout.write("No slot holds more than one booking.")
+        elif options['delete']:
+            deleted, _ = Booking.objects.filter(id__in=ids).delete()
+            self.stdout.write(self.style.SUCCESS(
+                f"Exported and deleted {deleted} bookings, see {options['output']}."))
+        else:
+            self.stdout.write(self.style.WARNING(
+                f"Exported {len(ids)} bookings to {options['output']}; "
+                "rerun with --delete to remove them."))
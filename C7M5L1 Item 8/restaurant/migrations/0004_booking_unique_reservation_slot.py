@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:28
+
+from django.db import migrations, models
+
+
+def check_double_bookings(apps, schema_editor):
+    # Deleting bookings is the restaurant's call, so stop and say which.
+    Booking = apps.get_model('restaurant', 'Booking')
+    doubled = (Booking.objects.using(schema_editor.connection.alias)
+               .values('reservation_date', 'reservation_slot')
+               .annotate(bookings=models.Count('id')).filter(bookings__gt=1)
+               .order_by('reservation_date', 'reservation_slot'))
+    if doubled:
+        slots = ', '.join(f"{row['reservation_date']} {row['reservation_slot']}:00"
+                          for row in doubled[:10])
+        raise RuntimeError(
+            f"{len(doubled)} slots hold more than one booking ({slots}). Run "
+            "'manage.py double_bookings --output FILE' to export them, then "
+            "'manage.py double_bookings --output FILE --delete' to keep only the first "
+            "booking of each slot, and migrate again.")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurant', '0003_remove_booking_comment_remove_booking_guest_number_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_double_bookings, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='booking',
+            constraint=models.UniqueConstraint(fields=('reservation_date', 'reservation_slot'), name='unique_reservation_slot'),
+        ),
+    ]
@@ -7,6 +7,14 @@ class Booking(models.Model):
     reservation_date = models.DateField()
     reservation_slot = models.SmallIntegerField(default=10)
 
+    class Meta:
+        # One booking per slot; also the index behind availability lookups.
+        constraints = [
+            models.UniqueConstraint(
+                fields=['reservation_date', 'reservation_slot'],
+                name='unique_reservation_slot'),
+        ]
+
     def __str__(self): 
         return self.first_name
 
@@ -0,0 +1,24 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .availability import refresh_availability
+from .models import Booking
+
+
+@receiver(pre_save, sender=Booking)
+def remember_booking_date(sender, instance, **kwargs):
+    # A rescheduled booking frees a slot on its previous date as well.
+    instance._previous_date = None
+    if instance.pk:
+        instance._previous_date = (Booking.objects.filter(pk=instance.pk)
+                                   .values_list('reservation_date', flat=True).first())
+
+
+@receiver([post_save, post_delete], sender=Booking)
+def booking_changed(sender, instance, **kwargs):
+    dates = {str(instance.reservation_date)}
+    if getattr(instance, '_previous_date', None):
+        dates.add(str(instance._previous_date))
+    for date in dates:
+        transaction.on_commit(lambda date=date: refresh_availability(date))
@@ -1,3 +1,190 @@
-from django.test import TestCase
+import csv
+import gzip
+import io
+import json
+import os
+import tempfile
+import time
+from datetime import date
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase
+
+from .availability import CACHE_TIMEOUT, availability, reserve
+from .models import Booking, Menu
+
+
+class SlotAvailabilityTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.day = date(2024, 5, 1)
+
+    def test_reserve_refuses_a_taken_slot(self):
+        self.assertIsNotNone(reserve('Ann', self.day, 12))
+        self.assertIsNone(reserve('Bob', self.day, 12))
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_availability_follows_bookings(self):
+        self.assertTrue(availability(self.day)[12])
+        with self.captureOnCommitCallbacks(execute=True):
+            booking = reserve('Ann', self.day, 12)
+        with self.assertNumQueries(0):
+            self.assertFalse(availability(self.day)[12])
+        with self.captureOnCommitCallbacks(execute=True):
+            booking.delete()
+        self.assertTrue(availability(self.day)[12])
+
+    def test_availability_endpoint_rejects_bad_dates(self):
+        for day in ['2024-02-30', 'garbage']:
+            response = self.client.get(f'/availability?date={day}')
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json(), {'error': 'date must be a YYYY-MM-DD date'})
+        self.assertEqual(self.client.get('/availability?date=2024-05-01').status_code, 200)
+
+    def test_other_workers_see_a_booking_once_the_cache_expires(self):
+        availability(self.day)
+        # A booking taken by another worker leaves this one's copy alone.
+        Booking.objects.bulk_create([Booking(first_name='Ann', reservation_date=self.day, reservation_slot=12)])
+        self.assertTrue(availability(self.day)[12])
+        later = time.time() + CACHE_TIMEOUT + 1
+        with mock.patch('django.core.cache.backends.locmem.time.time', return_value=later):
+            self.assertFalse(availability(self.day)[12])
+
+    def test_bookings_endpoint_reports_conflicts(self):
+        payload = {'first_name': 'Ann', 'reservation_date': '2024-05-01', 'reservation_slot': '12'}
+        self.client.post('/bookings', payload, content_type='application/json')
+        response = self.client.post('/bookings', payload, content_type='application/json')
+        self.assertEqual(response.json(), {'error': 1})
+
+    def test_bookings_endpoint_rejects_bad_input(self):
+        valid = {'first_name': 'Ann', 'reservation_date': '2024-05-01', 'reservation_slot': 12}
+        for change in [{'reservation_date': 'tomorrow'}, {'reservation_date': 20240501},
+                       {'reservation_slot': 'noon'}, {'reservation_slot': 3},
+                       {'reservation_slot': None}, {'first_name': ['Ann']}, {'first_name': ''}]:
+            with self.subTest(change):
+                response = self.client.post('/bookings', {**valid, **change},
+                                            content_type='application/json')
+                self.assertEqual(response.status_code, 400)
+        for body in ['[]', '{"first_name": ', '"Ann"']:
+            with self.subTest(body):
+                response = self.client.post('/bookings', body, content_type='application/json')
+                self.assertEqual(response.status_code, 400)
+        self.assertFalse(Booking.objects.exists())
+
+
+class BookingsApiTest(TestCase):
+    def setUp(self):
+        for day in (1, 2, 3):
+            for slot in (11, 12):
+                Booking.objects.create(first_name=f'Guest {day}-{slot}',
+                                       reservation_date=date(2024, 5, day), reservation_slot=slot)
+
+    def get(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return json.loads(b''.join(response.streaming_content))
+
+    def test_lists_only_booking_fields_for_a_day(self):
+        data = self.get('/bookings?date=2024-05-02')
+        self.assertEqual([b['reservation_slot'] for b in data['results']], [11, 12])
+        self.assertEqual(set(data['results'][0]), {'id', 'first_name', 'reservation_date', 'reservation_slot'})
+        self.assertIsNone(data['next'])
+
+    def test_pages_through_a_date_range(self):
+        data = self.get('/bookings?start=2024-05-01&end=2024-05-02&page_size=3')
+        self.assertEqual(len(data['results']), 3)
+        rest = self.get(data['next'])
+        self.assertEqual([(b['reservation_date'], b['reservation_slot']) for b in rest['results']],
+                         [('2024-05-02', 12)])
+        self.assertIsNone(rest['next'])
+
+    def test_rejects_bad_dates(self):
+        self.assertEqual(self.client.get('/bookings?date=tomorrow').status_code, 400)
+
+
+class DoubleBookingMigrationTest(TransactionTestCase):
+    before = [('restaurant', '0003_remove_booking_comment_remove_booking_guest_number_and_more')]
+    after = [('restaurant', '0004_booking_unique_reservation_slot')]
+
+    def setUp(self):
+        self.executor = MigrationExecutor(connection)
+        self.executor.migrate(self.before)
+        Booking = self.executor.loader.project_state(self.before).apps.get_model('restaurant', 'Booking')
+        day = date(2024, 5, 1)
+        self.kept = Booking.objects.create(first_name='Ann', reservation_date=day, reservation_slot=12)
+        self.double = Booking.objects.create(first_name='Bob', reservation_date=day, reservation_slot=12)
+        Booking.objects.create(first_name='Cy', reservation_date=day, reservation_slot=13)
+        self.output = os.path.join(tempfile.mkdtemp(), 'double.csv')
+
+    def tearDown(self):
+        self.executor.loader.build_graph()
+        self.executor.migrate(self.executor.loader.graph.leaf_nodes())
+
+    def migrate(self):
+        self.executor.loader.build_graph()
+        self.executor.migrate(self.after)
+
+    def test_refuses_to_drop_bookings_until_told_to(self):
+        with self.assertRaisesMessage(RuntimeError, '1 slots hold more than one booking (2024-05-01 12:00)'):
+            self.migrate()
+
+        call_command('double_bookings', output=self.output, stdout=io.StringIO())
+        with open(self.output) as exported:
+            self.assertEqual(list(csv.reader(exported))[1:],
+                             [[str(self.double.id), 'Bob', '2024-05-01', '12']])
+        with self.assertRaises(RuntimeError):
+            self.migrate()
+
+        call_command('double_bookings', output=self.output, delete=True, stdout=io.StringIO())
+        self.migrate()
+        self.assertEqual(sorted(Booking.objects.values_list('first_name', flat=True)), ['Ann', 'Cy'])
+
+
+class BookingExportTest(TestCase):
+    def setUp(self):
+        Booking.objects.create(first_name='Ann', reservation_date=date(2024, 5, 1), reservation_slot=11)
+        Booking.objects.create(first_name='Bob', reservation_date=date(2024, 6, 1), reservation_slot=12)
+        self.client.force_login(User.objects.create_user('staff', is_staff=True))
+
+    def export(self, query):
+        response = self.client.get('/bookings/export' + query)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv_export(self):
+        lines = self.export('').splitlines()
+        self.assertEqual(lines[0], 'id,first_name,reservation_date,reservation_slot')
+        self.assertEqual([line.split(',')[1] for line in lines[1:]], ['Ann', 'Bob'])
+
+    def test_ndjson_export_filters_dates(self):
+        lines = self.export('?output=ndjson&start=2024-06-01').splitlines()
+        self.assertEqual([json.loads(line)['first_name'] for line in lines], ['Bob'])
+
+    def test_requires_staff(self):
+        self.client.logout()
+        self.assertEqual(self.client.get('/bookings/export').status_code, 302)
+
+
+class CompressionTest(TestCase):
+    def test_menu_page_is_gzipped(self):
+        for number in range(5):
+            Menu.objects.create(name=f'Dish {number}', price=12, menu_item_description='Lemon ' * 20)
+        plain = self.client.get('/menu/')
+        response = self.client.get('/menu/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertLess(len(response.content), len(plain.content))
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+
+    def test_exports_are_gzipped_as_they_stream(self):
+        Booking.objects.create(first_name='Ann', reservation_date=date(2024, 5, 1), reservation_slot=11)
+        self.client.force_login(User.objects.create_user('staff', is_staff=True))
+        response = self.client.get('/bookings/export', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        content = gzip.decompress(b''.join(response.streaming_content)).decode()
+        self.assertEqual(content.splitlines()[1].split(',')[1], 'Ann')
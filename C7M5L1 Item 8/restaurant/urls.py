@@ -10,4 +10,6 @@ urlpatterns = [
     path('menu/', views.menu, name="menu"),
     path('menu_item/<int:pk>/', views.display_menu_item, name="menu_item"),
     path('bookings', views.bookings, name='bookings'),
+    path('bookings/export', views.export_bookings, name='export_bookings'),
+    path('availability', views.slot_availability, name='availability'),
 ]
@@ -2,12 +2,14 @@
 from django.shortcuts import render
 from .forms import BookingForm
 from .models import Menu
-from django.core import serializers
 from .models import Booking
-from datetime import datetime
 import json
 from django.views.decorators.csrf import csrf_exempt
-from django.http import HttpResponse
+from django.http import JsonResponse, StreamingHttpResponse
+from django.db.models import Q
+from .availability import availability, reserve
+from .bookings import BOOKING_FIELDS, EXPORTS, availability_query, booking_payload, booking_query, export_query, export_rows, stream_bookings
+from django.contrib.admin.views.decorators import staff_member_required
 
 
 # Create your views here.
@@ -18,10 +20,8 @@ def about(request):
     return render(request, 'about.html')
 
 def reservations(request):
-    date = request.GET.get('date',datetime.today().date())
-    bookings = Booking.objects.all()
-    booking_json = serializers.serialize('json', bookings)
-    return render(request, 'bookings.html',{"bookings":booking_json})
+    # Bookings are fetched page by page from the bookings endpoint.
+    return render(request, 'bookings.html')
 
 def book(request):
     form = BookingForm()
@@ -49,22 +49,50 @@ def display_menu_item(request, pk=None):
 @csrf_exempt
 def bookings(request):
     if request.method == 'POST':
-        data = json.load(request)
-        exist = Booking.objects.filter(reservation_date=data['reservation_date']).filter(
-            reservation_slot=data['reservation_slot']).exists()
-        if exist==False:
-            booking = Booking(
-                first_name=data['first_name'],
-                reservation_date=data['reservation_date'],
-                reservation_slot=data['reservation_slot'],
-            )
-            booking.save()
-        else:
-            return HttpResponse("{'error':1}", content_type='application/json')
+        try:
+            first_name, reservation_date, reservation_slot = booking_payload(json.load(request))
+        except ValueError as error:
+            # json.JSONDecodeError is a ValueError too.
+            return JsonResponse({'error': str(error)}, status=400)
+        booking = reserve(
+            first_name=first_name,
+            reservation_date=reservation_date,
+            reservation_slot=reservation_slot,
+        )
+        if booking is None:
+            return JsonResponse({'error': 1})
     
-    date = request.GET.get('date',datetime.today().date())
+    try:
+        start, end, after, page_size = booking_query(request.GET)
+    except ValueError as error:
+        return JsonResponse({'error': str(error)}, status=400)
 
-    bookings = Booking.objects.all().filter(reservation_date=date)
-    booking_json = serializers.serialize('json', bookings)
+    rows = (Booking.objects.filter(reservation_date__range=(start, end))
+            .order_by('reservation_date', 'reservation_slot')
+            .values_list(*BOOKING_FIELDS))
+    if after:
+        rows = rows.filter(Q(reservation_date__gt=after[0]) |
+                           Q(reservation_date=after[0], reservation_slot__gt=after[1]))
+    return StreamingHttpResponse(stream_bookings(request, rows, page_size),
+                                 content_type='application/json')
 
-    return HttpResponse(booking_json, content_type='application/json')
\ No newline at end of file
+
+def slot_availability(request):
+    try:
+        date = availability_query(request.GET)
+    except ValueError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+    return JsonResponse({'date': date, 'slots': availability(date)})
+
+
+@staff_member_required
+def export_bookings(request):
+    try:
+        output, start, end = export_query(request.GET)
+    except ValueError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+
+    write, content_type = EXPORTS[output]
+    response = StreamingHttpResponse(write(export_rows(start, end)), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="bookings.{output}"'
+    return response
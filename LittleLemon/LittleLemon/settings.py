@@ -10,6 +10,9 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
+import tempfile
+from importlib.util import find_spec
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -27,6 +30,10 @@ DEBUG = True
 
 ALLOWED_HOSTS = []
 
+# Scrapers read /metrics/ by sending "Authorization: Bearer <token>"; staff
+# sessions need none. Empty, only staff can read it.
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+
 
 # Application definition
 
@@ -46,12 +53,17 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    # Before anything that reads or writes the response body.
+    "LittleLemonAPI.compression.CompressionMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "LittleLemonAPI.middleware.RolesMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    # Last, so its process_view hook measures URL resolution.
+    "LittleLemonAPI.instrumentation.PerformanceMiddleware",
 ]
 
 ROOT_URLCONF = "LittleLemon.urls"
@@ -78,13 +90,91 @@ WSGI_APPLICATION = "LittleLemon.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
+# The profile is driven by the environment so the same settings serve local
+# development (SQLite) and production (any Django backend):
+#   DB_ENGINE, DB_NAME, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT  primary
+#   DB_REPLICA_NAME, DB_REPLICA_HOST                              read replica
+#   DB_CONN_MAX_AGE                                               persistent connections
+# Locally, two SQLite files can stand in for a primary and a replica:
+#   DB_REPLICA_NAME=replica.sqlite3 python manage.py runserver
+
+
+def database(name, host=""):
+    engine = os.environ.get("DB_ENGINE", "django.db.backends.sqlite3")
+    config = {
+        "ENGINE": engine,
+        "NAME": name,
+        "USER": os.environ.get("DB_USER", ""),
+        "PASSWORD": os.environ.get("DB_PASSWORD", ""),
+        "HOST": host,
+        "PORT": os.environ.get("DB_PORT", ""),
+        "CONN_MAX_AGE": int(os.environ.get("DB_CONN_MAX_AGE", 60)),
+        "CONN_HEALTH_CHECKS": True,
+    }
+    if engine == "django.db.backends.sqlite3":
+        config["OPTIONS"] = {
+            # Migration 0014 switches the database to WAL, which lets readers
+            # proceed while checkout writes; writers queue on the busy timeout
+            # instead of failing with "database is locked".
+            "init_command": (
+                "PRAGMA synchronous=NORMAL;"
+                "PRAGMA busy_timeout=5000;"
+            ),
+            "timeout": 5,
+            "transaction_mode": "IMMEDIATE",
+        }
+    return config
+
+
 DATABASES = {
+    "default": database(
+        os.environ.get("DB_NAME", BASE_DIR / "db.sqlite3"),
+        os.environ.get("DB_HOST", ""),
+    ),
+}
+
+if os.environ.get("DB_REPLICA_NAME") or os.environ.get("DB_REPLICA_HOST"):
+    DATABASES["replica"] = database(
+        os.environ.get("DB_REPLICA_NAME", DATABASES["default"]["NAME"]),
+        os.environ.get("DB_REPLICA_HOST", DATABASES["default"]["HOST"]),
+    )
+    DATABASES["replica"]["TEST"] = {"MIRROR": "default"}
+
+DATABASE_ROUTERS = ["LittleLemonAPI.db_routers.ReplicaRouter"]
+
+
+# Caches
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+
+# "shared" holds what every worker process must agree on: throttle counters,
+# role lookups and the catalogue version. Set REDIS_URL to keep it in Redis
+# (pip install redis), which every host can reach and which increments
+# atomically; otherwise it is a directory of files, shared by the processes
+# of one host.
+REDIS_URL = os.environ.get("REDIS_URL")
+
+CACHES = {
     "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
-    }
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "shared": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": REDIS_URL,
+    } if REDIS_URL else {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": os.environ.get(
+            "SHARED_CACHE_DIR", os.path.join(tempfile.gettempdir(), "littlelemon-cache")),
+    },
 }
 
+# Throttle counters live in the shared cache, so counting a request writes
+# nothing to the database. Without Redis, two processes counting the same
+# client at the same instant can lose one increment. Set THROTTLE_STORE to
+# LittleLemonAPI.throttling.DatabaseCounters to keep exact counts in a table
+# instead, at the cost of database writes on every request.
+THROTTLE_STORE = os.environ.get("THROTTLE_STORE", "LittleLemonAPI.throttling.CacheCounters")
+THROTTLE_CACHE_ALIAS = "shared"
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -129,7 +219,7 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'LittleLemonAPI.authentication.CachedTokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_FILTER_BACKENDS': [
@@ -143,15 +233,95 @@ REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 5,
     'DEFAULT_THROTTLE_CLASSES': [
-        'rest_framework.throttling.UserRateThrottle',
-        'rest_framework.throttling.AnonRateThrottle',
+        'LittleLemonAPI.throttling.UserSlidingWindowThrottle',
+        'LittleLemonAPI.throttling.AnonSlidingWindowThrottle',
+        'LittleLemonAPI.throttling.ScopedSlidingWindowThrottle',
     ],
     'DEFAULT_THROTTLE_RATES': {
         'user': '100/hour',
         'anon': '10/minute',
+        'checkout': '10/minute',
+        'menu': '60/minute',
     },
+    'DEFAULT_RENDERER_CLASSES': [
+        'rest_framework.renderers.JSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'rest_framework.parsers.JSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 }
 
+# MessagePack and CBOR (LittleLemonAPI/renderers.py) are negotiated through
+# Accept and Content-Type when their optional packages are installed:
+#   pip install msgpack cbor2
+for package, renderer, parser in [
+    ('msgpack', 'MessagePackRenderer', 'MessagePackParser'),
+    ('cbor2', 'CBORRenderer', 'CBORParser'),
+]:
+    if find_spec(package):
+        REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'].append(f'LittleLemonAPI.renderers.{renderer}')
+        REST_FRAMEWORK['DEFAULT_PARSER_CLASSES'].append(f'LittleLemonAPI.renderers.{parser}')
+
+# JSON, MessagePack, CBOR, exports and event streams are compressed from
+# this many bytes up (LittleLemonAPI/compression.py): gzip or deflate, or
+# zstd with the optional package installed:
+#   pip install zstandard
+COMPRESSION_MIN_SIZE = 1024
+
+# Requests slower than this many seconds are logged with their SQL.
+SLOW_REQUEST_THRESHOLD = 0.5
+
+# Seconds a user's group names stay cached between requests, in the
+# ROLE_CACHE_ALIAS cache. Group changes invalidate the entry right away, so
+# the alias must be shared by every worker: one that is not would keep
+# granting a revoked role until the entry expires.
+ROLE_CACHE_TIMEOUT = 300
+ROLE_CACHE_ALIAS = "shared"
+
+# Seconds a rendered menu page stays cached. Saving or deleting a MenuItem or
+# Category invalidates every cached page immediately, in every worker: pages
+# are keyed by a version kept in the CATALOGUE_VERSION_ALIAS cache, which
+# must be shared by all of them.
+CATALOGUE_CACHE_TIMEOUT = 60 * 60
+CATALOGUE_VERSION_ALIAS = "shared"
+
+# Seconds a read replica may lag behind the primary. For that long after the
+# catalogue changes, cache misses read the menu from the primary, so a page
+# rendered from stale replica rows is never cached under the new version.
+REPLICA_MAX_LAG = 5
+
+# manage.py compact_menu_changes drops menu changes older than this many
+# days; clients that last synced before then get a full snapshot.
+MENU_CHANGES_RETENTION_DAYS = 30
+
+# Token lookups are cached for TOKEN_CACHE_TIMEOUT seconds in a per-process
+# LRU of TOKEN_CACHE_SIZE entries. Running several worker processes, set
+# TOKEN_CACHE_ALIAS to a cache they share, which then replaces the LRU, so
+# that logouts and deactivations reach every worker.
+TOKEN_CACHE_SIZE = 10000
+TOKEN_CACHE_TIMEOUT = 30
+TOKEN_CACHE_ALIAS = None
+
+# The orders/events/ feed sends a keepalive comment after this many idle
+# seconds and tells clients to reconnect after ORDER_EVENTS_RETRY_MS. The
+# default broker only reaches feeds served by the process that saved the
+# order; ORDER_EVENT_BROKER names a LittleLemonAPI.events.Broker subclass
+# to share events between processes.
+ORDER_EVENTS_KEEPALIVE = 15
+ORDER_EVENTS_RETRY_MS = 3000
+ORDER_EVENT_BROKER = None
+
+# Background jobs (manage.py run_jobs) that raise are retried after
+# JOB_RETRY_BACKOFF seconds, doubling each time up to JOB_RETRY_BACKOFF_MAX.
+# A job still running after JOB_LOCK_TIMEOUT seconds is assumed to have lost
+# its worker and is run again.
+JOB_RETRY_BACKOFF = 30
+JOB_RETRY_BACKOFF_MAX = 60 * 60
+JOB_LOCK_TIMEOUT = 10 * 60
+
 DJOSER = {
     "USER_ID_FIELD": "username",
 }
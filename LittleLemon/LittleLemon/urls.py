@@ -17,9 +17,11 @@ Including another URLconf
 
 from django.contrib import admin
 from django.urls import path, include
+from LittleLemonAPI.instrumentation import metrics
 
 urlpatterns = [
     path("admin/", admin.site.urls),
+    path("metrics/", metrics, name="metrics"),
     path('api/', include('LittleLemonAPI.urls')),
     path('auth/', include('djoser.urls')),
     path('auth/', include('djoser.urls.authtoken')),
@@ -1,9 +1,20 @@
 from django.contrib import admin
 from . import models
 
+
+class OrderAdmin(admin.ModelAdmin):
+    list_select_related = ['user']
+
+
+class JobAdmin(admin.ModelAdmin):
+    list_display = ['task', 'status', 'attempts', 'run_at', 'locked_by']
+    list_filter = ['status', 'task']
+
+
 # Register your models here.
 admin.site.register(models.Category)
 admin.site.register(models.MenuItem)
 admin.site.register(models.Cart)
-admin.site.register(models.Order)
+admin.site.register(models.Order, OrderAdmin)
 admin.site.register(models.OrderItem)
+admin.site.register(models.Job, JobAdmin)
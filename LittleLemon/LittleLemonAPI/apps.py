@@ -1,6 +1,12 @@
 from django.apps import AppConfig
+from django.utils.module_loading import autodiscover_modules
 
 
 class LittlelemonapiConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "LittleLemonAPI"
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        # Registers the background tasks of every installed app.
+        autodiscover_modules('tasks')
@@ -0,0 +1,235 @@
+"""
+Async versions of the read-heavy endpoints, for ASGI deployments.
+
+DRF has no async views, so each of these borrows the configuration of the
+DRF view it mirrors. Authentication, permissions, throttling and building
+the filtered queryset touch caches and the database through sync APIs, and
+run together in one worker thread. Rows are then fetched with the async
+ORM, and serialization and JSON rendering happen on the event loop. A slow
+client ties up a coroutine rather than a worker thread.
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import InvalidPage
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.views import View
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.renderers import BrowsableAPIRenderer
+from rest_framework.response import Response
+
+from . import views
+from .catalogue import (
+    CACHED_FORMATS, CatalogueCacheMixin, cached_response, catalogue_cache_key, catalogue_reads,
+    catalogue_version, make_etag,
+)
+from .compression import cache_compressed, compressed_cache_key
+from .db_routers import ReplicaReadMixin, use_replica
+from .events import MANAGERS, crew_channel, customer_channel, format_event, get_broker
+from .pagination import KeysetPagination
+from .row_serializers import RowListMixin
+
+
+class AsyncAPIView(View):
+    """
+    Base for async views that borrow ``view_class``, a DRF view, for its
+    authentication, permission and throttle checks.
+    """
+    view_class = None
+
+    def start(self, request, args, kwargs):
+        """
+        Run the DRF view's checks, then ``started``, in a worker thread.
+        Returns the DRF view and, when a check failed, its error response.
+        """
+        view = self.view_class()
+        view.setup(request, *args, **kwargs)
+        # Browsable API rendering queries the database.
+        view.renderer_classes = [renderer for renderer in view.renderer_classes
+                                 if not issubclass(renderer, BrowsableAPIRenderer)]
+        view.headers = view.default_response_headers
+        request = view.initialize_request(request, *args, **kwargs)
+        view.request = request
+        view.format_kwarg = view.get_format_suffix(**kwargs)
+        try:
+            view.initial(request, *args, **kwargs)
+            self.started(view)
+        except Exception as exc:
+            return view, view.handle_exception(exc)
+        return view, None
+
+    def started(self, view):
+        pass
+
+    def rendered(self, view, response):
+        response = view.finalize_response(view.request, response, *view.args, **view.kwargs)
+        if not isinstance(response, Response):
+            # Already bytes, as compressed_response.
+            return response
+        # Render here so Django does not hop to a thread to do it.
+        response.render()
+        rendered = HttpResponse(response.content, status=response.status_code)
+        for header, value in response.items():
+            rendered[header] = value
+        rendered.compressed_cache = getattr(response, 'compressed_cache', None)
+        return rendered
+
+
+class AsyncReadView(AsyncAPIView):
+    """GET for ``view_class``, which must be a DRF generic view."""
+    detail = False
+    http_method_names = ['get', 'head', 'options']
+
+    def started(self, view):
+        # Everything the DRF view does before it reads rows.
+        queryset = view.get_queryset()
+        self.queryset = queryset if self.detail else view.filter_queryset(queryset)
+        if not self.detail and isinstance(view, RowListMixin):
+            self.queryset = view.get_row_queryset(self.queryset)
+        self.cache_key = self.compressed_key = self.version = None
+        if (issubclass(self.view_class, CatalogueCacheMixin)
+                and view.request.accepted_renderer.format in CACHED_FORMATS):
+            self.version = catalogue_version()
+            self.cache_key = catalogue_cache_key(view.request, self.version)
+            self.compressed_key = compressed_cache_key(view.request, self.cache_key)
+
+    async def get(self, request, *args, **kwargs):
+        if issubclass(self.view_class, ReplicaReadMixin):
+            with use_replica():
+                return await self.respond(request, args, kwargs)
+        return await self.respond(request, args, kwargs)
+
+    async def respond(self, request, args, kwargs):
+        view, response = await sync_to_async(self.start)(request, args, kwargs)
+        if response is None:
+            try:
+                response = await self.read(view, self.queryset, self.cache_key, self.compressed_key)
+            except Exception as exc:
+                response = view.handle_exception(exc)
+        return self.rendered(view, response)
+
+    async def read(self, view, queryset, cache_key, compressed_key):
+        if cache_key is None:
+            return Response(await self.data(view, queryset))
+        # As CatalogueCacheMixin, through the async cache API.
+        found = await cache.aget_many([cache_key, compressed_key] if compressed_key else [cache_key])
+        entry, compressed = found.get(cache_key), found.get(compressed_key)
+        if entry is None:
+            with catalogue_reads(self.version):
+                data = await self.data(view, queryset)
+            entry = (data, make_etag(data, view.request.accepted_renderer))
+            compressed = None
+            await cache.aset(cache_key, entry, settings.CATALOGUE_CACHE_TIMEOUT)
+        response = cached_response(view.request, entry, compressed)
+        if compressed is None:
+            cache_compressed(response, compressed_key, settings.CATALOGUE_CACHE_TIMEOUT)
+        return response
+
+    async def data(self, view, queryset):
+        if self.detail:
+            return await self.retrieve(view, queryset)
+        return await self.list(view, queryset)
+
+    async def list(self, view, queryset):
+        paginator = view.paginator
+        if paginator is None:
+            rows = [row async for row in queryset]
+            return await self.serialize(view, rows)
+        rows = await self.paginate(paginator, queryset, view.request)
+        return paginator.get_paginated_response(await self.serialize(view, rows)).data
+
+    async def serialize(self, view, rows):
+        if isinstance(view, RowListMixin):
+            return await view.get_row_serializer(rows).adata()
+        return view.get_serializer(rows, many=True).data
+
+    async def paginate(self, paginator, queryset, request):
+        if isinstance(paginator, KeysetPagination):
+            return paginator.take_page(
+                [row async for row in paginator.page_queryset(queryset, request)])
+        if not isinstance(paginator, PageNumberPagination):
+            raise TypeError(f'{type(paginator).__name__} has no async support')
+
+        page_size = paginator.get_page_size(request)
+        if not page_size:
+            return [row async for row in queryset]
+        pages = paginator.django_paginator_class(queryset, page_size)
+        # Paginator.count is a cached_property; fill it without a sync query.
+        pages.count = await queryset.acount()
+        page_number = paginator.get_page_number(request, pages)
+        try:
+            page = pages.page(page_number)
+        except InvalidPage as exc:
+            raise NotFound(paginator.invalid_page_message.format(
+                page_number=page_number, message=str(exc)))
+        page.object_list = [row async for row in page.object_list]
+        paginator.page, paginator.request = page, request
+        return list(page)
+
+    async def retrieve(self, view, queryset):
+        lookup = view.lookup_url_kwarg or view.lookup_field
+        try:
+            instance = await queryset.aget(**{view.lookup_field: view.kwargs[lookup]})
+        except queryset.model.DoesNotExist:
+            raise Http404
+        view.check_object_permissions(view.request, instance)
+        return view.get_serializer(instance).data
+
+
+class AsyncMenuItemsView(AsyncReadView):
+    view_class = views.MenuItemsView
+
+
+class AsyncSingleMenuItemView(AsyncReadView):
+    view_class = views.SingleMenuItemView
+    detail = True
+
+
+class AsyncOrdersView(AsyncReadView):
+    view_class = views.OrdersView
+
+
+class OrderEventsView(AsyncAPIView):
+    """
+    Server-sent events for the orders the user can see in OrdersView: the
+    delivery crew member's assignments, the customer's orders, or every
+    order for managers. Resumes after ``Last-Event-ID`` (or
+    ``?last_event_id=``) when the broker still has the missed events.
+    """
+    view_class = views.OrdersView
+    http_method_names = ['get']
+
+    def started(self, view):
+        user, roles = view.request.user, view.request.roles
+        if roles.is_manager:
+            self.channel = MANAGERS
+        elif roles.is_delivery_crew:
+            self.channel = crew_channel(user.pk)
+        else:
+            self.channel = customer_channel(user.pk)
+
+    async def get(self, request, *args, **kwargs):
+        view, response = await sync_to_async(self.start)(request, args, kwargs)
+        if response is not None:
+            return self.rendered(view, response)
+
+        last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+        try:
+            last_event_id = int(last_event_id) if last_event_id else None
+        except ValueError:
+            last_event_id = None
+        response = StreamingHttpResponse(self.stream(last_event_id),
+                                         content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        # Stop nginx from buffering the stream.
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    async def stream(self, last_event_id):
+        yield f'retry: {settings.ORDER_EVENTS_RETRY_MS}\n\n'
+        events = get_broker().subscribe(
+            self.channel, last_event_id, keepalive=settings.ORDER_EVENTS_KEEPALIVE)
+        async for event in events:
+            # A comment line keeps proxies from closing an idle stream.
+            yield ': keepalive\n\n' if event is None else format_event(event)
@@ -0,0 +1,115 @@
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from .roles import Roles, get_roles
+
+
+class TokenCache:
+    """
+    Token -> (user, token, group names) lookups kept with a TTL, either in a
+    bounded in-process LRU or, when TOKEN_CACHE_ALIAS names a cache, only in
+    that shared cache.
+
+    A process cannot reach another's LRU, so with a shared cache configured
+    the LRU is skipped: logging out or deactivating a user then revokes the
+    cached tokens in every worker at once. Without one, each worker keeps
+    its own LRU, which is only safe for a single process.
+    """
+
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    @property
+    def timeout(self):
+        return getattr(settings, 'TOKEN_CACHE_TIMEOUT', 0)
+
+    @property
+    def shared(self):
+        alias = getattr(settings, 'TOKEN_CACHE_ALIAS', None)
+        return caches[alias] if alias else None
+
+    @staticmethod
+    def shared_key(key):
+        # Tokens are credentials, so only their digest leaves the process.
+        return 'LittleLemonAPI:token:' + hashlib.sha256(key.encode()).hexdigest()
+
+    def get(self, key):
+        if not self.timeout:
+            return None
+        if self.shared is not None:
+            return self.shared.get(self.shared_key(key))
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                expires, value = entry
+                if expires > time.monotonic():
+                    self.entries.move_to_end(key)
+                    return value
+                del self.entries[key]
+        return None
+
+    def set(self, key, value):
+        if not self.timeout:
+            return
+        if self.shared is not None:
+            self.shared.set(self.shared_key(key), value, self.timeout)
+            return
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.timeout, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > getattr(settings, 'TOKEN_CACHE_SIZE', 10000):
+                self.entries.popitem(last=False)
+
+    def discard(self, keys):
+        keys = list(keys)
+        with self.lock:
+            for key in keys:
+                self.entries.pop(key, None)
+        if self.shared is not None and keys:
+            self.shared.delete_many([self.shared_key(key) for key in keys])
+
+    def discard_users(self, user_ids):
+        self.discard(Token.objects.filter(user_id__in=list(user_ids))
+                     .values_list('key', flat=True))
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+token_cache = TokenCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Drop-in replacement for TokenAuthentication that serves repeat lookups,
+    including the user's roles, from ``token_cache``.
+    """
+
+    def authenticate_credentials(self, key):
+        if not token_cache.timeout:
+            return super().authenticate_credentials(key)
+
+        cached = token_cache.get(key)
+        if cached is not None:
+            user, token, role_names = cached
+            # Every request gets its own copy to memoize on and mutate.
+            user = copy.copy(user)
+            user._roles = Roles(role_names)
+            return user, token
+
+        user, token = super().authenticate_credentials(key)
+        role_names = tuple(get_roles(user))
+        cached_user = copy.copy(user)
+        cached_user.__dict__.pop('_roles', None)
+        token_cache.set(key, (cached_user, token, role_names))
+        return user, token
@@ -0,0 +1,54 @@
+"""
+The batched backfill that moves OrderItem.order from User to Order.
+
+``OrderItem.order`` used to reference ``auth_user``, so existing rows hold
+their customer's id rather than their order's. Migration 0008 adds a
+nullable ``order_ref`` column; ``manage.py backfill_order_items`` fills it
+in bounded batches, each its own short transaction, so the table is never
+locked for long and a stopped run can be started again. Migration 0009
+fills whatever is left, drops the old column and renames ``order_ref`` to
+``order``.
+
+A legacy row only records its customer, so it gets their earliest order:
+the old unique (customer, menu item) pair kept later checkouts from adding
+rows for the same item anyway.
+"""
+import time
+
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+
+BACKFILL_MIGRATION = ('LittleLemonAPI', '0008_orderitem_order_ref')
+FINAL_MIGRATION = ('LittleLemonAPI', '0009_orderitem_order_fk')
+
+
+def backfill_order_items(apps, using='default', batch_size=1000, pause=0, progress=None):
+    """
+    Fill ``order_ref`` on the rows still missing it, with the models of
+    ``apps`` as of migration 0008. Calls ``progress(done, total, last_id)``
+    after every batch and returns the ids of rows whose customer has no
+    order, which are left unfilled.
+    """
+    OrderItem = apps.get_model('LittleLemonAPI', 'OrderItem')
+    Order = apps.get_model('LittleLemonAPI', 'Order')
+    pending = OrderItem.objects.using(using).filter(order_ref__isnull=True)
+    first_order = Order.objects.using(using).filter(
+        user_id=OuterRef('order_id')).order_by('id').values('id')[:1]
+
+    total = pending.count()
+    done, last_id, unmatched = 0, 0, []
+    while True:
+        # Keyset over the primary key, so unmatched rows are not read twice.
+        ids = list(pending.filter(pk__gt=last_id).order_by('pk')
+                   .values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return unmatched
+        with transaction.atomic(using=using):
+            batch = pending.filter(pk__in=ids)
+            batch.update(order_ref=Subquery(first_order))
+            unmatched.extend(batch.values_list('pk', flat=True))
+        done, last_id = done + len(ids), ids[-1]
+        if progress:
+            progress(done, total, last_id)
+        if pause:
+            time.sleep(pause)
@@ -0,0 +1,633 @@
+"""
+Seed a realistic dataset and measure every LittleLemonAPI route.
+
+Used by ``manage.py benchmark``; the JSON report it produces is meant to be
+committed or archived per revision and diffed between them.
+"""
+import asyncio
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIHandler
+from django.db import connection, connections
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+
+from . import catalogue, urls
+from .compression import CODINGS, compress
+from .menu_sync import record_menu_changes, sync_state
+from .models import Cart, Category, MenuChange, MenuItem, Order, OrderItem
+from .renderers import CBORRenderer, MessagePackRenderer
+from .roles import CUSTOMER, DELIVERY_CREW, MANAGER
+from .rollups import rebuild_rollups
+from .search import search_backend
+from .row_serializers import CartRowSerializer, MenuItemRowSerializer, OrderRowSerializer
+from .serializers import CartSerializer, MenuItemSerializer, OrderSerializer
+from .views import CART_PLAN, MENU_ITEM_PLAN, ORDER_PLAN
+
+
+class Dataset:
+    """Handles on the seeded rows the scenarios need."""
+
+    def __init__(self, categories, menuitems, users, orders):
+        self.categories = categories
+        self.menuitems = menuitems
+        self.users = users
+        self.orders = orders
+        self.tokens = {
+            role: Token.objects.get_or_create(user=user)[0].key
+            for role, user in users.items()
+        }
+
+
+def seed(categories=50, menu_items=2000, customers=1000, delivery_crew=30,
+         managers=5, days=365, orders_per_day=30, items_per_order=3, rng=None):
+    rng = rng or random.Random(0)
+    password = make_password('lemon@123!')
+
+    category_rows = Category.objects.bulk_create(
+        Category(slug=f'category-{i}', title=f'Category {i}') for i in range(categories))
+    menuitem_rows = MenuItem.objects.bulk_create(
+        (MenuItem(title=f'Dish {i}', price=Decimal(rng.randrange(250, 4000)) / 100,
+                  featured=rng.random() < 0.1, category=rng.choice(category_rows))
+         for i in range(menu_items)),
+        batch_size=1000)
+    search_backend().rebuild()
+    record_menu_changes(MenuChange.CATEGORY, [row.pk for row in category_rows])
+    record_menu_changes(MenuChange.MENU_ITEM, [row.pk for row in menuitem_rows])
+
+    def create_users(prefix, count, role=None):
+        rows = User.objects.bulk_create(
+            (User(username=f'{prefix}{i}', password=password) for i in range(count)),
+            batch_size=1000)
+        if role:
+            Group.objects.get_or_create(name=role)[0].user_set.add(*rows)
+        return rows
+
+    customer_rows = create_users('customer', customers, CUSTOMER)
+    crew_rows = create_users('crew', delivery_crew, DELIVERY_CREW)
+    manager_rows = create_users('manager', managers, MANAGER)
+    admin = User.objects.create_superuser('benchmark-admin', password='lemon@123!')
+
+    today = timezone.localdate()
+    orders = Order.objects.bulk_create(
+        (Order(user=rng.choice(customer_rows), delivery_crew=rng.choice(crew_rows),
+               status=rng.random() < 0.8, total=0, date=today - timedelta(days=day))
+         for day in range(days) for _ in range(orders_per_day)),
+        batch_size=1000)
+    items = []
+    for order in orders:
+        for menuitem in rng.sample(menuitem_rows, items_per_order):
+            quantity = rng.randint(1, 4)
+            items.append(OrderItem(order=order, menuitem=menuitem, quantity=quantity,
+                                   unit_price=menuitem.price,
+                                   price=quantity * menuitem.price))
+            order.total += quantity * menuitem.price
+    OrderItem.objects.bulk_create(items, batch_size=1000)
+    Order.objects.bulk_update(orders, ['total'], batch_size=1000)
+    if orders:
+        rebuild_rollups()
+    else:
+        orders = [Order.objects.create(user=customer_rows[0], delivery_crew=crew_rows[0],
+                                       total=0, date=today)]
+
+    # The scenarios act as a crew member with deliveries and a customer with history.
+    crew = orders[0].delivery_crew if orders else crew_rows[0]
+    customer = orders[0].user if orders else customer_rows[0]
+    users = {'admin': admin, 'manager': manager_rows[0], 'crew': crew,
+             'customer': customer}
+    return Dataset(category_rows, menuitem_rows, users,
+                   [order for order in orders if order.user == customer])
+
+
+# What a working route answers, unless its Scenario says otherwise.
+EXPECTED_STATUS = {'get': 200, 'post': 201, 'patch': 200, 'delete': 204}
+
+
+class Scenario:
+    """
+    One request against a route. ``setup`` runs before every timed call to
+    put the data in the state the request needs and is not measured.
+    Responses with a status other than ``status`` are flagged, not timed.
+    """
+
+    def __init__(self, route, method='get', role='customer', kwargs=None,
+                 query='', data=None, setup=None, label=None, headers=None, status=None):
+        self.route = route
+        self.method = method
+        self.status = status or EXPECTED_STATUS[method]
+        self.role = role
+        self.kwargs = kwargs or {}
+        self.query = query
+        self.data = data
+        self.setup = setup
+        self.headers = headers or {}
+        self.label = label or f'{method.upper()} {route}{query}'
+
+    def prepare(self, dataset, iteration):
+        """Run ``setup`` and return the URL, body and headers of the call."""
+        kwargs = self.kwargs(dataset, iteration) if callable(self.kwargs) else self.kwargs
+        query = self.query(dataset, iteration) if callable(self.query) else self.query
+        data = self.data(dataset, iteration) if callable(self.data) else self.data
+        if self.setup:
+            self.setup(dataset, iteration)
+        url = reverse(self.route, kwargs=kwargs) + query
+        return url, data, {'Authorization': f'Token {dataset.tokens[self.role]}', **self.headers}
+
+    def request(self, client, dataset, iteration):
+        url, data, headers = self.prepare(dataset, iteration)
+        request = getattr(client, self.method)
+        extra = {'headers': headers}
+        if data is not None:
+            extra.update(data=data, content_type='application/json')
+
+        def call():
+            response = request(url, **extra)
+            if response.streaming:
+                # Exports are only done once their body has been produced.
+                b''.join(response.streaming_content)
+            return response
+        return call
+
+
+def _fill_cart(dataset, iteration, count=3):
+    customer = dataset.users['customer']
+    Cart.objects.filter(user=customer).delete()
+    Cart.objects.bulk_create(
+        Cart(user=customer, menuitem=menuitem, quantity=1,
+             unit_price=menuitem.price, price=menuitem.price)
+        for menuitem in dataset.menuitems[iteration % 100:][:count])
+
+
+def _menuitem(dataset, iteration):
+    return dataset.menuitems[iteration % len(dataset.menuitems)]
+
+
+def _recent_changes(dataset, iteration):
+    return f'?since={sync_state().version - 10}'
+
+
+def _new_menuitem(dataset, iteration):
+    return MenuItem.objects.create(title=f'Seasonal {iteration}', price='9.99',
+                                   featured=False, category=dataset.categories[0])
+
+
+def _order(dataset, iteration):
+    return dataset.orders[iteration % len(dataset.orders)]
+
+
+def _crew_order(dataset, iteration):
+    return Order.objects.filter(delivery_crew=dataset.users['crew']).first()
+
+
+def _demote(group, role):
+    def setup(dataset, iteration):
+        Group.objects.get_or_create(name=group)[0].user_set.remove(dataset.users[role])
+    return setup
+
+
+def _promote(group, role):
+    def setup(dataset, iteration):
+        Group.objects.get_or_create(name=group)[0].user_set.add(dataset.users[role])
+    return setup
+
+
+SCENARIOS = [
+    Scenario('menu-items'),
+    Scenario('menu-items', query='?search=Dish&ordering=price'),
+    Scenario('menu-items', query='?search=di', label='GET menu-items (type-ahead)'),
+    Scenario('menu-items', query='?pagination=keyset&page_size=50'),
+    Scenario('menu-items', query='?pagination=keyset&page_size=50',
+             headers={'Accept-Encoding': 'gzip'},
+             label='GET menu-items?pagination=keyset&page_size=50 (gzip)'),
+    Scenario('menu-changes', label='GET menu-changes (snapshot)'),
+    Scenario('menu-changes', query=_recent_changes, label='GET menu-changes (10 changes)'),
+    Scenario('menu-items', method='post', role='admin',
+             data=lambda d, i: {'title': f'Special {i}', 'price': '12.50',
+                                'featured': False, 'category': d.categories[0].pk}),
+    Scenario('menu-items-import', method='post', role='admin', status=200,
+             data=lambda d, i: [{'title': f'Dish {n}', 'price': '10.00', 'featured': bool(i % 2),
+                                 'category': d.categories[n % len(d.categories)].slug}
+                                for n in range(500)]),
+    Scenario('single-menu-item', kwargs=lambda d, i: {'pk': _menuitem(d, i).pk}),
+    Scenario('async-menu-items'),
+    Scenario('async-single-menu-item', kwargs=lambda d, i: {'pk': _menuitem(d, i).pk}),
+    Scenario('single-menu-item', method='patch', role='admin',
+             kwargs=lambda d, i: {'pk': _menuitem(d, i).pk}, data={'featured': True}),
+    Scenario('single-menu-item', method='delete', role='admin',
+             kwargs=lambda d, i: {'pk': _new_menuitem(d, i).pk}),
+    Scenario('cart', setup=_fill_cart),
+    Scenario('cart', method='post',
+             setup=lambda d, i: Cart.objects.filter(user=d.users['customer']).delete(),
+             data=lambda d, i: {'menuitem': _menuitem(d, i).pk, 'quantity': 2}),
+    Scenario('cart', method='delete', setup=_fill_cart),
+    Scenario('cart-bulk', method='post', status=200,
+             data=lambda d, i: [{'menuitem': m.pk, 'quantity': 1}
+                                for m in d.menuitems[i % 100:][:10]]),
+    Scenario('orders', role='manager', label='GET orders (manager)'),
+    Scenario('orders', role='manager', query='?pagination=keyset&page_size=50',
+             label='GET orders (manager, keyset)'),
+    Scenario('orders', role='manager', query='?pagination=keyset&page_size=50',
+             headers={'Accept-Encoding': 'gzip'},
+             label='GET orders (manager, keyset, gzip)'),
+    Scenario('orders', role='crew', label='GET orders (delivery crew)'),
+    Scenario('async-orders', role='crew', label='GET async-orders (delivery crew)'),
+    Scenario('orders', label='GET orders (customer)'),
+    # order-events never ends its response; see order_feed.
+    Scenario('orders', method='post', setup=_fill_cart, data={}),
+    Scenario('orders-export', role='manager'),
+    Scenario('orders-export', role='manager', query='?output=ndjson'),
+    Scenario('single-order', kwargs=lambda d, i: {'pk': _order(d, i).pk}),
+    Scenario('single-order', method='patch', role='crew',
+             kwargs=lambda d, i: {'pk': _crew_order(d, i).pk},
+             data=lambda d, i: {'status': bool(i % 2)}),
+    Scenario('single-order', method='delete', role='manager',
+             kwargs=lambda d, i: {'pk': Order.objects.create(
+                 user=d.users['customer'], total=0, date=timezone.localdate()).pk}),
+    Scenario('managers', role='manager'),
+    Scenario('managers', method='post', role='manager',
+             setup=_demote(MANAGER, 'customer'),
+             data=lambda d, i: {'username': d.users['customer'].username}),
+    Scenario('delivery-crew', role='manager'),
+    Scenario('delivery-crew', method='post', role='manager',
+             setup=_demote(DELIVERY_CREW, 'customer'),
+             data=lambda d, i: {'username': d.users['customer'].username}),
+    Scenario('delete-manager', method='delete', role='manager', status=200,
+             setup=_promote(MANAGER, 'admin'),
+             kwargs=lambda d, i: {'pk': d.users['admin'].pk}),
+    Scenario('delete-delivery-crew', method='delete', role='manager', status=200,
+             setup=_promote(DELIVERY_CREW, 'admin'),
+             kwargs=lambda d, i: {'pk': d.users['admin'].pk}),
+    Scenario('report-revenue', role='manager', query='?period=month'),
+    Scenario('report-delivery-crew', role='manager', query='?period=week'),
+    Scenario('report-top-menu-items', role='manager', query='?period=month&limit=5'),
+]
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def uncovered_routes(scenarios=SCENARIOS):
+    covered = {scenario.route for scenario in scenarios} | {'order-events'}
+    return sorted(pattern.name for pattern in urls.urlpatterns
+                  if pattern.name not in covered)
+
+
+def measure(scenario, dataset, requests):
+    """
+    Time ``requests`` sequential calls, counting queries for each. Calls
+    answered with another status than the scenario's are counted under
+    ``unexpected`` and left out of the latencies and query counts.
+    """
+    # Broken routes are reported with their 500 status rather than aborting.
+    client = Client(raise_request_exception=False)
+    latencies, queries, statuses, unexpected = [], [], set(), {}
+    for iteration in range(requests):
+        call = scenario.request(client, dataset, iteration)
+        with CaptureQueriesContext(connection) as captured:
+            start = time.perf_counter()
+            response = call()
+            elapsed = time.perf_counter() - start
+        statuses.add(response.status_code)
+        if response.status_code != scenario.status:
+            unexpected[response.status_code] = unexpected.get(response.status_code, 0) + 1
+            continue
+        latencies.append(elapsed)
+        queries.append(len(captured.captured_queries))
+    result = {
+        'route': scenario.route,
+        'method': scenario.method.upper(),
+        'requests': requests,
+        'statuses': sorted(statuses),
+        'expected_status': scenario.status,
+        'unexpected': {str(status): count for status, count in sorted(unexpected.items())},
+    }
+    if not latencies:
+        return result
+    return {
+        **result,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 3),
+        'queries_min': min(queries),
+        'queries_max': max(queries),
+    }
+
+
+def failures(results):
+    """The labels of ``run`` results with responses of an unexpected status."""
+    return sorted(label for label, result in results.items() if result['unexpected'])
+
+
+def throughput(scenario, dataset, requests, concurrency, client_delay=0):
+    """
+    Requests per second for a read-only scenario issued from
+    ``concurrency`` threads, each with its own client and connection.
+    With ``client_delay``, each thread then stays busy that long, as a WSGI
+    worker thread does while a slow client reads the response.
+    """
+    local = threading.local()
+
+    def worker(iteration):
+        if not hasattr(local, 'client'):
+            local.client = Client(raise_request_exception=False)
+        status = scenario.request(local.client, dataset, iteration)().status_code
+        if client_delay:
+            time.sleep(client_delay)
+        return status
+
+    barrier = threading.Barrier(concurrency)
+
+    def close_connections(_):
+        # The barrier makes every pool thread take exactly one of these.
+        barrier.wait()
+        connections.close_all()
+
+    with ThreadPoolExecutor(concurrency) as pool:
+        start = time.perf_counter()
+        list(pool.map(worker, range(requests)))
+        elapsed = time.perf_counter() - start
+        list(pool.map(close_connections, range(concurrency)))
+    return round(requests / elapsed, 1)
+
+
+def asgi_scope(url, headers):
+    path, _, query = url.partition('?')
+    return {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+        'method': 'GET', 'scheme': 'http', 'path': path,
+        'raw_path': path.encode(), 'query_string': query.encode(),
+        'headers': [(name.lower().encode(), value.encode())
+                    for name, value in headers.items()],
+        'client': ('127.0.0.1', 0), 'server': ('testserver', 80),
+    }
+
+
+def asgi_throughput(scenario, dataset, requests, client_delay):
+    """
+    Requests per second for ``requests`` simultaneous GETs on one ASGI event
+    loop, each client taking ``client_delay`` to read its response.
+    """
+    handler = ASGIHandler()
+
+    async def call(iteration):
+        url, _, headers = scenario.prepare(dataset, iteration)
+        scope = asgi_scope(url, headers)
+        received = False
+        finished = asyncio.Event()
+
+        async def receive():
+            nonlocal received
+            if not received:
+                received = True
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+            # Django listens for a disconnect while the view runs.
+            await finished.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            if message['type'] == 'http.response.body' and not message.get('more_body'):
+                await asyncio.sleep(client_delay)
+                finished.set()
+
+        await handler(scope, receive, send)
+
+    async def main():
+        start = time.perf_counter()
+        await asyncio.gather(*(call(iteration) for iteration in range(requests)))
+        elapsed = time.perf_counter() - start
+        await sync_to_async(connections.close_all)()
+        return elapsed
+
+    return round(requests / asyncio.run(main()), 1)
+
+
+# The same reads served by a WSGI worker with sync views and by an ASGI
+# worker with their async versions.
+SLOW_CLIENT_SCENARIOS = [
+    (Scenario('menu-items'), Scenario('async-menu-items')),
+    (Scenario('single-menu-item', kwargs=lambda d, i: {'pk': _menuitem(d, i).pk}),
+     Scenario('async-single-menu-item', kwargs=lambda d, i: {'pk': _menuitem(d, i).pk})),
+    (Scenario('orders', role='crew'), Scenario('async-orders', role='crew')),
+]
+
+
+def slow_clients(dataset, clients=64, client_delay=0.5, threads=8):
+    """
+    Compare requests per second per worker when every client is slow to
+    read its response: a WSGI worker with ``threads`` threads against an
+    ASGI worker with one event loop.
+    """
+    cache.clear()
+    results = {}
+    for sync_scenario, async_scenario in SLOW_CLIENT_SCENARIOS:
+        results[sync_scenario.label] = {
+            'clients': clients,
+            'client_delay_ms': client_delay * 1000,
+            'wsgi_threads': threads,
+            'wsgi_rps': throughput(sync_scenario, dataset, clients, threads, client_delay),
+            'asgi_rps': asgi_throughput(async_scenario, dataset, clients, client_delay),
+        }
+    return results
+
+
+def order_feed(dataset, subscribers=64, events=20):
+    """
+    Milliseconds from a delivery crew member's order changing status to the
+    event reaching each of ``subscribers`` open order feeds of theirs, all
+    served by one ASGI event loop.
+    """
+    handler = ASGIHandler()
+    scenario = Scenario('order-events', role='crew')
+    order = _crew_order(dataset, 0)
+    arrivals = [[] for _ in range(subscribers)]
+    connected = asyncio.Event()
+    disconnected = asyncio.Event()
+
+    async def subscribe(index):
+        url, _, headers = scenario.prepare(dataset, index)
+        received = False
+
+        async def receive():
+            nonlocal received
+            if not received:
+                received = True
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+            await disconnected.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            body = message.get('body', b'')
+            if body.startswith(b'retry:'):
+                arrivals[index].append(None)
+                if all(arrivals):
+                    connected.set()
+            elif b'event: order.status' in body:
+                arrivals[index].append(time.perf_counter())
+
+        await handler(asgi_scope(url, headers), receive, send)
+
+    def change_status():
+        order.status = not order.status
+        order.save()
+
+    async def main():
+        feeds = [asyncio.create_task(subscribe(index)) for index in range(subscribers)]
+        await connected.wait()
+        latencies = []
+        for event in range(1, events + 1):
+            start = time.perf_counter()
+            await sync_to_async(change_status)()
+            while any(len(times) <= event for times in arrivals):
+                await asyncio.sleep(0.0005)
+            latencies.extend(times[event] - start for times in arrivals)
+        disconnected.set()
+        await asyncio.gather(*feeds)
+        await sync_to_async(connections.close_all)()
+        return latencies
+
+    latencies = asyncio.run(main())
+    return {
+        'subscribers': subscribers,
+        'events': events,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+        'max_ms': round(max(latencies) * 1000, 3),
+    }
+
+
+def _pages(rows):
+    """The first ``rows`` menu items and orders, with their serializers."""
+    return {
+        'menu-items': (MenuItemSerializer, list(
+            MenuItem.objects.select_related('category').order_by('pk')[:rows])),
+        'orders': (OrderSerializer, list(
+            Order.objects.select_related('user', 'delivery_crew')
+            .prefetch_related('orderitem_set__menuitem__category').order_by('pk')[:rows])),
+    }
+
+
+def _serialize(serializer_class, instances, renderer):
+    # What MoneyField looks at to pick the money encoding.
+    request = SimpleNamespace(accepted_renderer=renderer)
+    return serializer_class(instances, many=True, context={'request': request}).data
+
+
+def response_formats(dataset, rows=100, repeat=20):
+    """
+    Payload bytes and render time per page of ``rows`` menu items and
+    orders, in JSON and each binary format that is installed.
+    """
+    renderer_classes = [JSONRenderer] + [renderer for renderer in (MessagePackRenderer, CBORRenderer)
+                                         if renderer.available]
+    results = {}
+    for name, (serializer_class, instances) in _pages(rows).items():
+        results[name] = {}
+        for renderer_class in renderer_classes:
+            renderer = renderer_class()
+            data = _serialize(serializer_class, instances, renderer)
+            start = time.perf_counter()
+            for _ in range(repeat):
+                body = renderer.render(data)
+            results[name][renderer.format] = {
+                'bytes': len(body),
+                'render_ms': round((time.perf_counter() - start) / repeat * 1000, 3),
+            }
+    return results
+
+
+def compression(dataset, rows=100, repeat=20):
+    """
+    Bytes and compression time per coding for JSON pages of ``rows`` menu
+    items and orders, and the latency of a cached menu page sent gzipped:
+    from its compressed copy, and rendered and compressed on every hit.
+    """
+    renderer = JSONRenderer()
+    results = {}
+    for name, (serializer_class, instances) in _pages(rows).items():
+        body = renderer.render(_serialize(serializer_class, instances, renderer))
+        results[name] = {'identity': {'bytes': len(body)}}
+        for coding in CODINGS:
+            start = time.perf_counter()
+            for _ in range(repeat):
+                compressed = compress(coding, body)
+            results[name][coding] = {
+                'bytes': len(compressed),
+                'saved_percent': round((1 - len(compressed) / len(body)) * 100, 1),
+                'compress_ms': round((time.perf_counter() - start) / repeat * 1000, 3),
+            }
+
+    cache.clear()
+    scenario = Scenario('menu-items', query=f'?pagination=keyset&page_size={rows}',
+                        headers={'Accept-Encoding': 'gzip'})
+    results['cached_menu_page'] = {
+        'precompressed': measure(scenario, dataset, repeat),
+    }
+    with mock.patch.object(catalogue, 'compressed_cache_key', return_value=None):
+        results['cached_menu_page']['recompressed'] = measure(scenario, dataset, repeat)
+    return results
+
+
+def serializers(dataset, rows=100, repeat=20):
+    """
+    Time to read and serialize ``rows`` menu items, cart entries and orders,
+    with the ModelSerializers and with the row serializers the lists use.
+    """
+    _fill_cart(dataset, 0, count=rows)
+    request = SimpleNamespace(accepted_renderer=JSONRenderer())
+    pages = {
+        'menu-items': (MenuItemSerializer, MenuItemRowSerializer, MENU_ITEM_PLAN),
+        'cart': (CartSerializer, CartRowSerializer,
+                 CART_PLAN.filter(user=dataset.users['customer'])),
+        'orders': (OrderSerializer, OrderRowSerializer, ORDER_PLAN),
+    }
+    results = {}
+    for name, (serializer_class, row_serializer_class, queryset) in pages.items():
+        queryset = queryset.order_by('pk')[:rows]
+        timings = {}
+        for label, serialize in [
+            ('model_ms', lambda: serializer_class(
+                queryset.all(), many=True, context={'request': request}).data),
+            ('rows_ms', lambda: row_serializer_class(
+                row_serializer_class.values(queryset), context={'request': request}).data),
+        ]:
+            start = time.perf_counter()
+            for _ in range(repeat):
+                serialize()
+            timings[label] = round((time.perf_counter() - start) / repeat * 1000, 3)
+        results[name] = timings
+    Cart.objects.filter(user=dataset.users['customer']).delete()
+    return results
+
+
+def run(dataset, requests=50, concurrency=8, log=None):
+    cache.clear()
+    results = {}
+    for scenario in SCENARIOS:
+        if log:
+            log(scenario.label)
+        result = measure(scenario, dataset, requests)
+        # A setup that rewrites shared rows would race across threads, and
+        # the throughput of a failing route means nothing.
+        if scenario.method == 'get' and scenario.setup is None and not result['unexpected']:
+            result['throughput_rps'] = throughput(
+                scenario, dataset, requests * concurrency, concurrency)
+        results[scenario.label] = result
+    return results
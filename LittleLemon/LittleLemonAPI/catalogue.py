@@ -0,0 +1,115 @@
+import hashlib
+import time
+from contextlib import nullcontext
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.utils.http import parse_etags, quote_etag
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from .compression import cache_compressed, compressed_cache_key, compressed_response
+from .db_routers import use_primary
+
+VERSION_KEY = 'LittleLemonAPI:catalogue:version'
+# Formats whose bytes depend only on the data, so an ETag can be cached.
+CACHED_FORMATS = {'json', 'msgpack', 'cbor'}
+
+
+def version_cache():
+    # Pages are cached per process, but every worker must see a bump.
+    return caches[getattr(settings, 'CATALOGUE_VERSION_ALIAS', 'shared')]
+
+
+def catalogue_version():
+    versions = version_cache()
+    version = versions.get(VERSION_KEY)
+    if version is None:
+        # A fresh token rather than a counter, so entries written under an
+        # evicted version can never be served again.
+        versions.add(VERSION_KEY, time.time_ns(), None)
+        version = versions.get(VERSION_KEY)
+    return version
+
+
+def bump_catalogue_version():
+    version_cache().set(VERSION_KEY, time.time_ns(), None)
+
+
+def catalogue_reads(version):
+    """
+    Where a cache miss under ``version`` reads the menu from: the primary
+    while a replica may not have the change behind the version yet.
+    """
+    # Versions are the time of the change that took them.
+    if time.time_ns() - version < settings.REPLICA_MAX_LAG * 10 ** 9:
+        return use_primary()
+    return nullcontext()
+
+
+def catalogue_cache_key(request, version=None):
+    if version is None:
+        version = catalogue_version()
+    params = sorted(request.query_params.lists())
+    digest = hashlib.sha1(repr(params).encode()).hexdigest()
+    # Money is encoded differently per format, so the data is too.
+    return (f'LittleLemonAPI:catalogue:{version}:'
+            f'{request.accepted_renderer.format}:{request.path}:{digest}')
+
+
+def make_etag(data, renderer=None):
+    renderer = renderer or JSONRenderer()
+    return quote_etag(hashlib.sha256(renderer.render(data)).hexdigest())
+
+
+def cached_response(request, entry, compressed=None):
+    """
+    The response for a cache ``entry``, or its ``compressed`` bytes as
+    cached by CompressionMiddleware.
+    """
+    data, etag = entry
+    headers = {'ETag': etag}
+    # Weak comparison: compressed responses carry the weak form.
+    if etag in {tag.removeprefix('W/') for tag in
+                parse_etags(request.headers.get('If-None-Match', ''))}:
+        return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    if compressed is not None:
+        return compressed_response(compressed)
+    return Response(data, headers=headers)
+
+
+class CatalogueCacheMixin:
+    """
+    Serve GET requests for the menu from the cache, with strong ETags.
+
+    Entries are keyed by path and query parameters (filters, search,
+    ordering, page) under the current catalogue version, which is bumped
+    whenever a MenuItem or Category is saved or deleted. Compressed copies
+    are kept next to them, per coding. Misses right after a bump read from
+    the primary; see ``catalogue_reads``.
+    """
+
+    def get(self, request, *args, **kwargs):
+        # The ETag is a hash of exactly the bytes the renderer produces.
+        if request.accepted_renderer.format not in CACHED_FORMATS:
+            return super().get(request, *args, **kwargs)
+
+        version = catalogue_version()
+        key = catalogue_cache_key(request, version)
+        compressed_key = compressed_cache_key(request, key)
+        found = cache.get_many([key, compressed_key] if compressed_key else [key])
+        entry, compressed = found.get(key), found.get(compressed_key)
+        if entry is None:
+            with catalogue_reads(version):
+                response = super().get(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            entry = (response.data, make_etag(response.data, request.accepted_renderer))
+            compressed = None
+            cache.set(key, entry, settings.CATALOGUE_CACHE_TIMEOUT)
+
+        response = cached_response(request, entry, compressed)
+        if compressed is None:
+            cache_compressed(response, compressed_key, settings.CATALOGUE_CACHE_TIMEOUT)
+        return response
@@ -0,0 +1,70 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Sum
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.exceptions import APIException
+
+from .models import Cart, Order, OrderItem
+from .rollups import ITEM_ROLLUP_FIELDS, defer_order_items, rollup_values
+
+
+class CartChanged(APIException):
+    status_code = 409
+    default_detail = 'Your cart changed during checkout, please try again.'
+    default_code = 'cart_changed'
+
+
+def checkout(user, idempotency_key=None, **order_fields):
+    """
+    Turn the user's cart into an order and return ``(order, created)``.
+
+    The whole pipeline runs in one transaction: the total is summed by the
+    database, the order items are written with a single bulk insert and the
+    cart rows are claimed by deleting exactly the rows that were read, so two
+    concurrent checkouts cannot both bill the same cart. Repeating a request
+    with the same ``idempotency_key`` returns the original order.
+    """
+    if idempotency_key:
+        order = Order.objects.filter(
+            user=user, idempotency_key=idempotency_key).first()
+        if order is not None:
+            return order, False
+
+    try:
+        with transaction.atomic():
+            cart = Cart.objects.select_for_update().filter(user=user)
+            rows = list(cart.values_list(
+                'pk', 'menuitem_id', 'quantity', 'unit_price', 'price'))
+            if not rows:
+                raise serializers.ValidationError("Your cart is empty.")
+
+            cart_ids = [row[0] for row in rows]
+            total = Cart.objects.filter(pk__in=cart_ids).aggregate(
+                total=Sum('price'))['total']
+            # Claiming the rows is the optimistic check: if another checkout
+            # already deleted some of them, roll everything back.
+            deleted, _ = Cart.objects.filter(pk__in=cart_ids).delete()
+            if deleted != len(rows):
+                raise CartChanged()
+
+            order = Order.objects.create(
+                user=user, total=total, date=timezone.localdate(),
+                idempotency_key=idempotency_key or None, **order_fields)
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, menuitem_id=menuitem_id, quantity=quantity,
+                          unit_price=unit_price, price=price)
+                for _, menuitem_id, quantity, unit_price, price in rows
+            ])
+            # bulk_create sends no post_save, so queue their rollups directly.
+            defer_order_items(
+                rollup_values(order, ITEM_ROLLUP_FIELDS),
+                [(menuitem_id, quantity, price) for _, menuitem_id, quantity, _, price in rows])
+    except IntegrityError:
+        # Only the unique key's violation means a concurrent request with the
+        # same key won the race; anything else is a real error.
+        order = idempotency_key and Order.objects.filter(
+            user=user, idempotency_key=idempotency_key).first()
+        if not order:
+            raise
+        return order, False
+    return order, True
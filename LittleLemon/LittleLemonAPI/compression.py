@@ -0,0 +1,217 @@
+"""
+Response compression, negotiated through ``Accept-Encoding``: zstd when
+the optional ``zstandard`` package is installed, then gzip and deflate.
+
+CompressionMiddleware compresses bodies of COMPRESSIBLE_TYPES from
+COMPRESSION_MIN_SIZE bytes up, and streaming responses as they are sent.
+Event streams are flushed after every event so they still arrive live;
+exports are left to fill the compressor's window. HTML is not compressed:
+the browsable API carries CSRF tokens, which compression exposes to
+BREACH.
+
+A view whose response is cached marks it with ``cache_compressed``. The
+middleware then keeps the compressed bytes in the cache too, and later
+hits return them through ``compressed_response`` without rendering or
+compressing anything.
+"""
+import zlib
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSIBLE_TYPES = {
+    'application/json',
+    'application/msgpack',
+    'application/cbor',
+    'application/x-ndjson',
+    'text/csv',
+    'text/event-stream',
+}
+# Streams whose chunks must reach the client as soon as they are sent.
+FLUSHED_TYPES = {'text/event-stream'}
+
+
+class ZlibCompressor:
+    def __init__(self, wbits):
+        self.compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, wbits)
+
+    def compress(self, data, flush=False):
+        chunk = self.compressor.compress(data)
+        return chunk + self.compressor.flush(zlib.Z_SYNC_FLUSH) if flush else chunk
+
+    def finish(self):
+        return self.compressor.flush()
+
+
+class ZstdCompressor:
+    def __init__(self):
+        self.compressor = zstandard.ZstdCompressor().compressobj()
+
+    def compress(self, data, flush=False):
+        chunk = self.compressor.compress(data)
+        if flush:
+            chunk += self.compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+        return chunk
+
+    def finish(self):
+        return self.compressor.flush()
+
+
+# In order of preference, for clients that accept several equally.
+CODINGS = {
+    'gzip': lambda: ZlibCompressor(16 + zlib.MAX_WBITS),
+    'deflate': lambda: ZlibCompressor(zlib.MAX_WBITS),
+}
+if zstandard is not None:
+    CODINGS = {'zstd': ZstdCompressor, **CODINGS}
+
+
+def negotiate(accept_encoding):
+    """The coding in CODINGS the client prefers, or None for identity."""
+    weights = {}
+    for part in accept_encoding.split(','):
+        coding, *params = part.split(';')
+        weight = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        weights[coding.strip().lower()] = weight
+
+    default = weights.get('*', 0.0)
+    best, best_weight = None, 0.0
+    for coding in CODINGS:
+        weight = weights.get(coding, default)
+        if weight > best_weight:
+            best, best_weight = coding, weight
+    return best
+
+
+def compress(coding, data):
+    compressor = CODINGS[coding]()
+    return compressor.compress(data) + compressor.finish()
+
+
+def compress_stream(coding, chunks, flush):
+    compressor = CODINGS[coding]()
+    for chunk in chunks:
+        yield compressor.compress(chunk, flush)
+    yield compressor.finish()
+
+
+async def acompress_stream(coding, chunks, flush):
+    compressor = CODINGS[coding]()
+    async for chunk in chunks:
+        yield compressor.compress(chunk, flush)
+    yield compressor.finish()
+
+
+def compressed_cache_key(request, key):
+    """
+    Where the compressed bytes of the response cached under ``key`` are
+    kept for this request's coding, or None when it takes none.
+    """
+    coding = negotiate(request.headers.get('Accept-Encoding', ''))
+    return f'{key}:{coding}' if coding else None
+
+
+def cache_compressed(response, compressed_key, timeout):
+    """Have the middleware cache ``response`` once compressed."""
+    if compressed_key and response.status_code == 200:
+        response.compressed_cache = (compressed_key, timeout)
+
+
+def compressed_response(entry):
+    """The response for a cache entry written by the middleware."""
+    content, content_type, etag, coding = entry
+    response = HttpResponse(content, content_type=content_type)
+    response['Content-Encoding'] = coding
+    if etag:
+        response['ETag'] = etag
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
+
+
+class CompressionMiddleware:
+    """
+    Install near the top of MIDDLEWARE, so it compresses what every
+    middleware below it produces.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        response = self.get_response(request)
+        entry = self.compress(request, response)
+        if entry is not None:
+            cache.set(*entry)
+        return response
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        entry = self.compress(request, response)
+        if entry is not None:
+            await cache.aset(*entry)
+        return response
+
+    def compress(self, request, response):
+        """
+        Compress ``response`` in place. Returns the ``(key, value, timeout)``
+        to cache when the view asked for it with ``cache_compressed``.
+        """
+        content_type = response.get('Content-Type', '').partition(';')[0].strip()
+        if (response.has_header('Content-Encoding')
+                or content_type not in COMPRESSIBLE_TYPES
+                or response.status_code < 200
+                or response.status_code in (204, 304)):
+            return None
+        if not response.streaming and len(response.content) < settings.COMPRESSION_MIN_SIZE:
+            return None
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        coding = negotiate(request.headers.get('Accept-Encoding', ''))
+        if coding is None:
+            return None
+
+        if response.streaming:
+            stream = acompress_stream if response.is_async else compress_stream
+            response.streaming_content = stream(
+                coding, response.streaming_content, content_type in FLUSHED_TYPES)
+            response.headers.pop('Content-Length', None)
+        else:
+            content = compress(coding, response.content)
+            if len(content) >= len(response.content):
+                return None
+            response.content = content
+            response['Content-Length'] = str(len(content))
+
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            # The bytes differ from the identity response's.
+            response['ETag'] = etag = 'W/' + etag
+        response['Content-Encoding'] = coding
+
+        cached = getattr(response, 'compressed_cache', None)
+        if cached is None or response.streaming:
+            return None
+        key, timeout = cached
+        return key, (response.content, response['Content-Type'], etag, coding), timeout
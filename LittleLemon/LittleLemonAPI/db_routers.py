@@ -0,0 +1,56 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import connections
+from rest_framework.permissions import SAFE_METHODS
+
+REPLICA = 'replica'
+
+_reading_from_replica = ContextVar('reading_from_replica', default=False)
+
+
+@contextmanager
+def use_replica():
+    token = _reading_from_replica.set(True)
+    try:
+        yield
+    finally:
+        _reading_from_replica.reset(token)
+
+
+@contextmanager
+def use_primary():
+    """Undo ``use_replica()`` for reads that must see the latest writes."""
+    token = _reading_from_replica.set(False)
+    try:
+        yield
+    finally:
+        _reading_from_replica.reset(token)
+
+
+class ReplicaRouter:
+    """
+    Send LittleLemonAPI reads made inside ``use_replica()`` to the replica
+    alias, when one is configured. Everything else, including auth lookups
+    that must see freshly issued tokens, stays on the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        if (_reading_from_replica.get()
+                and model._meta.app_label == 'LittleLemonAPI'
+                and REPLICA in connections):
+            return REPLICA
+        return None
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+
+class ReplicaReadMixin:
+    """Serve a view's safe requests from the replica."""
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in SAFE_METHODS:
+            return super().dispatch(request, *args, **kwargs)
+        with use_replica():
+            return super().dispatch(request, *args, **kwargs)
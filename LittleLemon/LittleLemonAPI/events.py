@@ -0,0 +1,161 @@
+"""
+Order events for the server-sent event feed.
+
+Saving an Order publishes ``order.assigned``, ``order.unassigned`` and
+``order.status`` events, once the transaction commits, to the channels of
+the delivery crew member, the customer and the managers concerned. The
+feed subscribes to one of those channels through the broker, which keeps
+a short history so a client can resume from the ``Last-Event-ID`` it last
+saw.
+
+``InProcessBroker`` only reaches subscribers in the process that saved
+the order, which suits a single ASGI deployment. ``ORDER_EVENT_BROKER``
+names a ``Broker`` subclass to use instead (one backed by Redis, say).
+"""
+import asyncio
+import functools
+import itertools
+import json
+import threading
+from collections import defaultdict, deque, namedtuple
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+Event = namedtuple('Event', ['id', 'type', 'data'])
+
+# Sent instead of the missed events when they are no longer in the
+# history; the client should refetch its orders.
+RESET = 'reset'
+MANAGERS = 'managers'
+
+
+def crew_channel(user_id):
+    return f'crew:{user_id}'
+
+
+def customer_channel(user_id):
+    return f'customer:{user_id}'
+
+
+class Broker:
+    def publish(self, channels, type, data):
+        """Send an event to every subscriber of any of ``channels``."""
+        raise NotImplementedError
+
+    async def subscribe(self, channel, last_event_id=None, keepalive=None):
+        """
+        Yield the events of ``channel`` after ``last_event_id``, then new
+        ones as they are published. ``None`` is yielded whenever
+        ``keepalive`` seconds pass without an event.
+        """
+        raise NotImplementedError
+        yield
+
+
+class InProcessBroker(Broker):
+    def __init__(self, history=1000):
+        self.lock = threading.Lock()
+        self.ids = itertools.count(1)
+        self.history = deque(maxlen=history)
+        self.subscribers = defaultdict(set)
+
+    def publish(self, channels, type, data):
+        # Called from request threads; subscribers wait on event loops.
+        with self.lock:
+            event = Event(next(self.ids), type, data)
+            self.history.append((frozenset(channels), event))
+            targets = set().union(*(self.subscribers[channel] for channel in channels))
+        for loop, queue in targets:
+            loop.call_soon_threadsafe(queue.put_nowait, event)
+        return event
+
+    def missed(self, channel, last_event_id):
+        if last_event_id is None:
+            return []
+        newest = self.history[-1][1].id if self.history else 0
+        oldest = self.history[0][1].id if self.history else 1
+        if not oldest - 1 <= last_event_id <= newest:
+            # Too old, or from before a restart: the gap cannot be filled.
+            return [Event(None, RESET, {})]
+        return [event for channels, event in self.history
+                if event.id > last_event_id and channel in channels]
+
+    async def subscribe(self, channel, last_event_id=None, keepalive=None):
+        subscriber = (asyncio.get_running_loop(), asyncio.Queue())
+        with self.lock:
+            # Under the publish lock: every event is either in ``missed`` or
+            # queued for this subscriber, never both or neither.
+            self.subscribers[channel].add(subscriber)
+            missed = self.missed(channel, last_event_id)
+        try:
+            for event in missed:
+                yield event
+            while True:
+                try:
+                    yield await asyncio.wait_for(subscriber[1].get(), keepalive)
+                except asyncio.TimeoutError:
+                    yield None
+        finally:
+            with self.lock:
+                self.subscribers[channel].discard(subscriber)
+
+
+@functools.cache
+def get_broker():
+    path = getattr(settings, 'ORDER_EVENT_BROKER', None)
+    return import_string(path)() if path else InProcessBroker()
+
+
+def order_data(order):
+    return {
+        'order': order.pk,
+        'user': order.user_id,
+        'delivery_crew': order.delivery_crew_id,
+        'status': order.status,
+        'date': order.date,
+    }
+
+
+def order_events(order, previous):
+    """
+    The (channels, type) pairs for a saved order, given the
+    ``delivery_crew_id`` and ``status`` it had before (None when created).
+    """
+    events = []
+    crew = order.delivery_crew_id
+    old_crew = previous['delivery_crew_id'] if previous else None
+    watchers = [customer_channel(order.user_id), MANAGERS]
+    if crew != old_crew:
+        if old_crew is not None:
+            events.append(([crew_channel(old_crew), *watchers], 'order.unassigned'))
+        if crew is not None:
+            events.append(([crew_channel(crew), *watchers], 'order.assigned'))
+    if previous and order.status != previous['status']:
+        channels = [crew_channel(crew)] if crew is not None else []
+        events.append((channels + watchers, 'order.status'))
+    return events
+
+
+def publish_order_events(order, previous):
+    """Publish the events of a saved order when the transaction commits."""
+    events = order_events(order, previous)
+    data = order_data(order)
+
+    def publish():
+        broker = get_broker()
+        for channels, type in events:
+            broker.publish(channels, type, data)
+
+    if events:
+        transaction.on_commit(publish)
+
+
+def format_event(event):
+    """An event in the text/event-stream format."""
+    lines = [f'id: {event.id}'] if event.id is not None else []
+    lines.append(f'event: {event.type}')
+    lines.append(f'data: {json.dumps(event.data, cls=DjangoJSONEncoder)}')
+    return '\n'.join(lines) + '\n\n'
@@ -0,0 +1,65 @@
+"""
+Streaming CSV and NDJSON exports of order history.
+
+Rows are read with ``QuerySet.iterator()`` (a server-side cursor where the
+backend has one) and encoded one at a time, so memory stays flat however
+many orders are exported.
+"""
+import csv
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import Order
+
+CHUNK_SIZE = 2000
+
+# One row per order item; orders without items get a single row with the
+# item columns empty.
+ORDER_COLUMNS = {
+    'order': 'id',
+    'date': 'date',
+    'user': 'user__username',
+    'delivery_crew': 'delivery_crew__username',
+    'status': 'status',
+    'total': 'total',
+    'menuitem': 'orderitem__menuitem__title',
+    'quantity': 'orderitem__quantity',
+    'unit_price': 'orderitem__unit_price',
+    'price': 'orderitem__price',
+}
+
+
+def order_rows(start=None, end=None):
+    queryset = Order.objects.all()
+    if start is not None:
+        queryset = queryset.filter(date__gte=start)
+    if end is not None:
+        queryset = queryset.filter(date__lte=end)
+    return queryset.order_by('date', 'id', 'orderitem__id').values_list(
+        *ORDER_COLUMNS.values())
+
+
+class _Line:
+    """A file-like object whose write() hands the line back to csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def write_csv(rows, columns):
+    writer = csv.writer(_Line())
+    yield writer.writerow(columns)
+    for row in rows.iterator(chunk_size=CHUNK_SIZE):
+        yield writer.writerow(row)
+
+
+def write_ndjson(rows, columns):
+    encoder = DjangoJSONEncoder()
+    for row in rows.iterator(chunk_size=CHUNK_SIZE):
+        yield encoder.encode(dict(zip(columns, row))) + '\n'
+
+
+WRITERS = {
+    'csv': (write_csv, 'text/csv'),
+    'ndjson': (write_ndjson, 'application/x-ndjson'),
+}
@@ -0,0 +1,255 @@
+"""
+Per-request phase timing.
+
+``PerformanceMiddleware`` times URL resolution, database queries and the
+whole request; ``InstrumentedViewMixin`` adds the DRF phases
+(authentication, permissions, throttling, serialization and rendering).
+Each response gets a ``Server-Timing`` header, slow requests are logged with
+their SQL, and durations are aggregated per view into histograms served in
+Prometheus text format by ``metrics``.
+"""
+import bisect
+import logging
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+
+logger = logging.getLogger(__name__)
+
+PHASES = ('url', 'auth', 'permissions', 'throttle', 'db', 'serialize', 'render', 'total')
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class Histograms:
+    """Cumulative Prometheus-style histograms keyed by (view, phase)."""
+
+    name = 'littlelemon_request_phase_seconds'
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        self.series = {}
+
+    def observe(self, view, phase, seconds):
+        with self.lock:
+            series = self.series.setdefault(
+                (view, phase), {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0})
+            index = bisect.bisect_left(self.buckets, seconds)
+            if index < len(self.buckets):
+                series['buckets'][index] += 1
+            series['sum'] += seconds
+            series['count'] += 1
+
+    def clear(self):
+        with self.lock:
+            self.series.clear()
+
+    def render(self):
+        lines = [
+            f'# HELP {self.name} Time spent per request phase, by view.',
+            f'# TYPE {self.name} histogram',
+        ]
+        with self.lock:
+            for (view, phase), series in sorted(self.series.items()):
+                labels = f'view="{view}",phase="{phase}"'
+                cumulative = 0
+                for bound, count in zip(self.buckets, series['buckets']):
+                    cumulative += count
+                    lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'{self.name}_bucket{{{labels},le="+Inf"}} {series["count"]}')
+                lines.append(f'{self.name}_sum{{{labels}}} {series["sum"]:.6f}')
+                lines.append(f'{self.name}_count{{{labels}}} {series["count"]}')
+        return '\n'.join(lines) + '\n'
+
+
+histograms = Histograms()
+
+
+class RequestTimings:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = {}
+        self.queries = []
+
+    def add(self, phase, seconds):
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    @contextmanager
+    def phase(self, phase):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(phase, time.perf_counter() - start)
+
+    def __call__(self, execute, sql, params, many, context):
+        # Installed with connection.execute_wrapper() for every query.
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.add('db', duration)
+            self.queries.append((duration, sql))
+
+    def server_timing(self):
+        entries = []
+        for phase in PHASES:
+            if phase not in self.phases:
+                continue
+            entry = f'{phase};dur={self.phases[phase] * 1000:.2f}'
+            if phase == 'db':
+                entry += f';desc="{len(self.queries)} queries"'
+            entries.append(entry)
+        return ', '.join(entries)
+
+
+def get_timings(request):
+    # DRF requests proxy unknown attributes to the wrapped HttpRequest.
+    return getattr(request, 'timings', None)
+
+
+def view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unresolved'
+    view = getattr(match.func, 'view_class', match.func)
+    return view.__name__
+
+
+class PerformanceMiddleware:
+    """
+    Install last in MIDDLEWARE, so the time between ``__call__`` and
+    ``process_view`` is the URL resolution.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        request.timings = timings = RequestTimings()
+        with self.wrap_queries(timings):
+            response = self.get_response(request)
+        return self.finish(request, timings, response)
+
+    async def __acall__(self, request):
+        request.timings = timings = RequestTimings()
+        with self.wrap_queries(timings):
+            response = await self.get_response(request)
+        return self.finish(request, timings, response)
+
+    def wrap_queries(self, timings):
+        stack = ExitStack()
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(timings))
+        return stack
+
+    def finish(self, request, timings, response):
+        timings.add('total', time.perf_counter() - timings.started)
+        response['Server-Timing'] = timings.server_timing()
+
+        view = view_name(request)
+        for phase, seconds in timings.phases.items():
+            histograms.observe(view, phase, seconds)
+
+        threshold = getattr(settings, 'SLOW_REQUEST_THRESHOLD', None)
+        if threshold is not None and timings.phases['total'] >= threshold:
+            logger.warning(
+                'Slow request: %s %s (%s) took %.1fms, %d queries:\n%s',
+                request.method, request.get_full_path(), view,
+                timings.phases['total'] * 1000, len(timings.queries),
+                '\n'.join(f'  {duration * 1000:.2f}ms {sql}'
+                          for duration, sql in timings.queries))
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.timings.add('url', time.perf_counter() - request.timings.started)
+
+
+class InstrumentedViewMixin:
+    """Time the DRF phases of a view into the request's timings."""
+
+    def perform_authentication(self, request):
+        with self.timed('auth'):
+            super().perform_authentication(request)
+
+    def check_permissions(self, request):
+        with self.timed('permissions'):
+            super().check_permissions(request)
+
+    def check_object_permissions(self, request, obj):
+        with self.timed('permissions'):
+            super().check_object_permissions(request, obj)
+
+    def check_throttles(self, request):
+        with self.timed('throttle'):
+            super().check_throttles(request)
+
+    def get_serializer(self, *args, **kwargs):
+        self.start_serializing()
+        return super().get_serializer(*args, **kwargs)
+
+    def get_row_serializer(self, *args, **kwargs):
+        # For views with row_serializers.RowListMixin.
+        self.start_serializing()
+        return super().get_row_serializer(*args, **kwargs)
+
+    def start_serializing(self):
+        """
+        Start the serialize phase, which runs from the first serializer
+        the view asks for to ``finalize_response``.
+        """
+        timings = get_timings(getattr(self, 'request', None))
+        if timings is not None and not hasattr(self, 'serializing_since'):
+            self.serializing_since = (time.perf_counter(), timings.phases.get('db', 0.0))
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        timings = get_timings(request)
+        if timings is not None and hasattr(self, 'serializing_since'):
+            started, db = self.serializing_since
+            # Queries run meanwhile already count under db.
+            timings.add('serialize', time.perf_counter() - started
+                        - (timings.phases.get('db', 0.0) - db))
+        if timings is not None and hasattr(response, 'add_post_render_callback'):
+            # Django renders the response after the view returns.
+            started = time.perf_counter()
+            response.add_post_render_callback(
+                lambda rendered: timings.add('render', time.perf_counter() - started))
+        return response
+
+    @contextmanager
+    def timed(self, phase):
+        timings = get_timings(self.request)
+        if timings is None:
+            yield
+            return
+        with timings.phase(phase):
+            yield
+
+
+def metrics(request):
+    """
+    Prometheus scrape endpoint, for staff sessions and for scrapers that
+    send METRICS_TOKEN as a bearer token.
+    """
+    token = settings.METRICS_TOKEN
+    scheme, _, credentials = request.headers.get('Authorization', '').partition(' ')
+    scraper = bool(token) and scheme.lower() == 'bearer' and constant_time_compare(credentials, token)
+    if not (scraper or request.user.is_staff):
+        return HttpResponseForbidden()
+    return HttpResponse(histograms.render(),
+                        content_type='text/plain; version=0.0.4; charset=utf-8')
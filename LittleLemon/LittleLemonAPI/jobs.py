@@ -0,0 +1,126 @@
+"""
+A database-backed job queue for work that should not hold up a request.
+
+Tasks are functions registered with ``@task``. ``enqueue`` adds a Job row
+in the caller's transaction, so a job exists exactly when the change that
+asked for it commits, and ``manage.py run_jobs`` claims due jobs, runs
+them and deletes the ones that succeed. A job that raises is retried with
+exponential backoff until it has used ``max_attempts``, then kept as
+failed with its traceback.
+
+Hooks name events, such as ``order.created``, that tasks subscribe to with
+``@task(hooks=[...])``; ``fire`` enqueues one job per subscriber. The
+``tasks`` module of every installed app is imported at startup, so that is
+where tasks go::
+
+    @task(hooks=[ORDER_CREATED])
+    def print_kitchen_ticket(order):
+        ...
+"""
+import traceback
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Job
+
+ORDER_CREATED = 'order.created'
+ORDER_STATUS_CHANGED = 'order.status_changed'
+
+TASKS = {}
+HOOKS = defaultdict(list)
+
+
+def task(func=None, *, name=None, hooks=(), max_attempts=5):
+    """Register ``func`` as a task, called with the job payload as kwargs."""
+    def register(func):
+        func.task_name = name or f'{func.__module__}.{func.__qualname__}'
+        func.max_attempts = max_attempts
+        TASKS[func.task_name] = func
+        for hook in hooks:
+            HOOKS[hook].append(func.task_name)
+        return func
+    return register(func) if func else register
+
+
+def _job(name, payload, delay=0):
+    if name not in TASKS:
+        raise LookupError(f"No task named '{name}'.")
+    return Job(task=name, payload=payload, max_attempts=TASKS[name].max_attempts,
+               run_at=timezone.now() + timedelta(seconds=delay))
+
+
+def enqueue(task, payload=None, delay=0):
+    """Queue ``task`` (the function or its name) to run after ``delay`` seconds."""
+    job = _job(getattr(task, 'task_name', task), payload or {}, delay)
+    job.save()
+    return job
+
+
+def fire(hook, **payload):
+    """Queue a job for every task subscribed to ``hook``."""
+    if HOOKS[hook]:
+        Job.objects.bulk_create(_job(name, payload) for name in HOOKS[hook])
+
+
+def backoff(attempts):
+    """Seconds to wait before retrying a job that has failed ``attempts`` times."""
+    return min(settings.JOB_RETRY_BACKOFF * 2 ** (attempts - 1), settings.JOB_RETRY_BACKOFF_MAX)
+
+
+def claim(worker, limit=10):
+    """
+    Lock up to ``limit`` due jobs for ``worker``. Jobs left running longer
+    than JOB_LOCK_TIMEOUT belonged to a worker that died and are due again.
+    """
+    now = timezone.now()
+    stale = now - timedelta(seconds=settings.JOB_LOCK_TIMEOUT)
+    due = Job.objects.filter(
+        Q(status=Job.QUEUED, run_at__lte=now) | Q(status=Job.RUNNING, locked_at__lt=stale))
+    claimed = []
+    for job in due.order_by('run_at', 'id')[:limit]:
+        # Only the worker whose update still finds the job as it was read
+        # gets it, which needs no row locks and works on every database.
+        won = Job.objects.filter(pk=job.pk, status=job.status, locked_at=job.locked_at).update(
+            status=Job.RUNNING, locked_by=worker, locked_at=now, attempts=F('attempts') + 1)
+        if won:
+            job.status, job.locked_by, job.locked_at = Job.RUNNING, worker, now
+            job.attempts += 1
+            claimed.append(job)
+    return claimed
+
+
+def run_job(job):
+    """Run a claimed job; returns whether it succeeded."""
+    try:
+        if job.task not in TASKS:
+            raise LookupError(f"No task named '{job.task}'.")
+        # A failing task leaves none of its database writes behind.
+        with transaction.atomic():
+            TASKS[job.task](**job.payload)
+    except Exception:
+        mine = Job.objects.filter(pk=job.pk, locked_by=job.locked_by)
+        if job.attempts < job.max_attempts:
+            mine.update(status=Job.QUEUED, locked_by='', locked_at=None,
+                        run_at=timezone.now() + timedelta(seconds=backoff(job.attempts)),
+                        last_error=traceback.format_exc())
+        else:
+            mine.update(status=Job.FAILED, last_error=traceback.format_exc())
+        return False
+    Job.objects.filter(pk=job.pk).delete()
+    return True
+
+
+def work(worker, limit=10):
+    """Claim and run one batch of due jobs; returns (succeeded, failed)."""
+    succeeded = failed = 0
+    for job in claim(worker, limit):
+        if run_job(job):
+            succeeded += 1
+        else:
+            failed += 1
+    return succeeded, failed
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.migrations.loader import MigrationLoader
+
+from LittleLemonAPI.backfill import BACKFILL_MIGRATION, FINAL_MIGRATION, backfill_order_items
+
+
+class Command(BaseCommand):
+    help = (
+        "Point existing order items at their order in batches, between "
+        "'migrate LittleLemonAPI 0008' and 'migrate'. Safe to stop and run again."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="Rows updated per transaction.")
+        parser.add_argument('--pause', type=float, default=0,
+                            help="Seconds to sleep between batches to spare the database.")
+        parser.add_argument('--delete-unmatched', action='store_true',
+                            help="Delete items whose customer has no order instead of reporting them.")
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        loader = MigrationLoader(connections[options['database']])
+        if FINAL_MIGRATION in loader.applied_migrations:
+            self.stdout.write("Nothing to do: order items already reference orders.")
+            return
+        if BACKFILL_MIGRATION not in loader.applied_migrations:
+            raise CommandError(f"Run 'manage.py migrate LittleLemonAPI {BACKFILL_MIGRATION[1][:4]}' first.")
+
+        apps = loader.project_state(BACKFILL_MIGRATION).apps
+        unmatched = backfill_order_items(
+            apps, using=options['database'], batch_size=options['batch_size'],
+            pause=options['pause'], progress=self.progress)
+
+        if unmatched and options['delete_unmatched']:
+            OrderItem = apps.get_model('LittleLemonAPI', 'OrderItem')
+            OrderItem.objects.using(options['database']).filter(pk__in=unmatched).delete()
+            self.stdout.write(f"Deleted {len(unmatched)} order items whose customer has no order.")
+        elif unmatched:
+            self.stdout.write(self.style.WARNING(
+                f"{len(unmatched)} order items belong to customers without orders and were left "
+                "as they are; rerun with --delete-unmatched to remove them."))
+            return
+        self.stdout.write(self.style.SUCCESS(
+            "Order items backfilled; run 'manage.py migrate' to finish."))
+
+    def progress(self, done, total, last_id):
+        self.stdout.write(f"{done}/{total} order items (up to id {last_id})")
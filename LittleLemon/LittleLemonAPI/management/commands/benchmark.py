@@ -0,0 +1,124 @@
+import json
+import logging
+import subprocess
+from unittest import mock
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import (
+    setup_databases, setup_test_environment, teardown_databases,
+    teardown_test_environment,
+)
+from django.utils import timezone
+from rest_framework.views import APIView
+
+from LittleLemonAPI import benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a throwaway database with a realistic dataset and report "
+        "latency percentiles, throughput and query counts for every "
+        "LittleLemonAPI route, payload sizes per format, compression "
+        "savings and serializer costs as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default='-',
+                            help="Report path, '-' for stdout.")
+        parser.add_argument('--requests', type=int, default=50,
+                            help="Timed requests per scenario.")
+        parser.add_argument('--concurrency', type=int, default=8,
+                            help="Threads used for the throughput runs.")
+        parser.add_argument('--slow-clients', type=int, default=64,
+                            help="Simultaneous slow clients in the WSGI/ASGI comparison, 0 to skip it.")
+        parser.add_argument('--client-delay', type=float, default=0.5,
+                            help="Seconds each slow client takes to read a response (default: a slow mobile link).")
+        parser.add_argument('--feed-subscribers', type=int, default=64,
+                            help="Open order feeds when timing event delivery, 0 to skip it.")
+        parser.add_argument('--menu-items', type=int, default=2000)
+        parser.add_argument('--categories', type=int, default=50)
+        parser.add_argument('--customers', type=int, default=1000)
+        parser.add_argument('--days', type=int, default=365)
+        parser.add_argument('--orders-per-day', type=int, default=30)
+
+    def handle(self, *args, **options):
+        # Threads need a database file they can share, not an in-memory one.
+        test_settings = connection.settings_dict['TEST']
+        if connection.vendor == 'sqlite' and not test_settings['NAME']:
+            test_settings['NAME'] = str(settings.BASE_DIR / 'benchmark.sqlite3')
+
+        setup_test_environment()
+        databases = setup_databases(verbosity=0, interactive=False, aliases={'default'})
+        try:
+            # Throttles would turn most of the timed requests into 429s, and
+            # failing routes are reported once the report is written.
+            with mock.patch.object(APIView, 'get_throttles', lambda view: []), \
+                    mock.patch.object(logging.getLogger('django.request'), 'disabled', True):
+                self.stderr.write("Seeding dataset...")
+                dataset = benchmark.seed(
+                    categories=options['categories'],
+                    menu_items=options['menu_items'],
+                    customers=options['customers'],
+                    days=options['days'],
+                    orders_per_day=options['orders_per_day'],
+                )
+                results = benchmark.run(
+                    dataset, requests=options['requests'],
+                    concurrency=options['concurrency'],
+                    log=lambda label: self.stderr.write(f"  {label}"))
+                slow_clients = None
+                if options['slow_clients']:
+                    self.stderr.write("Comparing WSGI and ASGI with slow clients...")
+                    slow_clients = benchmark.slow_clients(
+                        dataset, clients=options['slow_clients'],
+                        client_delay=options['client_delay'],
+                        threads=options['concurrency'])
+                formats = benchmark.response_formats(dataset)
+                compression = benchmark.compression(dataset)
+                serializers = benchmark.serializers(dataset)
+                order_feed = None
+                if options['feed_subscribers']:
+                    self.stderr.write("Timing order feed events...")
+                    order_feed = benchmark.order_feed(
+                        dataset, subscribers=options['feed_subscribers'])
+        finally:
+            teardown_databases(databases, verbosity=0)
+            teardown_test_environment()
+
+        report = {
+            'revision': self.revision(),
+            'created': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'options': {key: options[key] for key in (
+                'requests', 'concurrency', 'slow_clients', 'client_delay', 'feed_subscribers',
+                'menu_items', 'categories', 'customers', 'days', 'orders_per_day')},
+            'uncovered_routes': benchmark.uncovered_routes(),
+            'results': results,
+            'failures': benchmark.failures(results),
+            'slow_clients': slow_clients,
+            'order_feed': order_feed,
+            'formats': formats,
+            'compression': compression,
+            'serializers': serializers,
+        }
+        output = json.dumps(report, indent=2, sort_keys=True)
+        if options['output'] == '-':
+            self.stdout.write(output)
+        else:
+            with open(options['output'], 'w') as report_file:
+                report_file.write(output + '\n')
+            self.stderr.write(self.style.SUCCESS(f"Report written to {options['output']}"))
+        if report['failures']:
+            raise CommandError('Unexpected response statuses: ' + '; '.join(
+                f"{label} ({', '.join(results[label]['unexpected'])} instead of "
+                f"{results[label]['expected_status']})" for label in report['failures']))
+
+    def revision(self):
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                cwd=settings.BASE_DIR, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
@@ -0,0 +1,24 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from LittleLemonAPI.menu_sync import compact_menu_changes, sync_state
+
+
+class Command(BaseCommand):
+    help = (
+        "Compact the menu change log: drop superseded changes, then those older "
+        "than the retention period. Meant to run periodically, e.g. daily from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int,
+                            help="Days of changes to keep (default: MENU_CHANGES_RETENTION_DAYS).")
+
+    def handle(self, *args, **options):
+        retention = timedelta(days=options['days']) if options['days'] is not None else None
+        deleted = compact_menu_changes(retention)
+        state = sync_state()
+        self.stdout.write(self.style.SUCCESS(
+            f"Deleted {deleted} menu changes; clients behind version {state.floor} "
+            f"of {state.version} will get a snapshot."))
@@ -0,0 +1,37 @@
+from argparse import ArgumentTypeError
+
+from django.core.management.base import BaseCommand
+from django.utils.dateparse import parse_date
+
+from LittleLemonAPI.exports import ORDER_COLUMNS, WRITERS, order_rows
+
+
+def date_argument(value):
+    try:
+        date = parse_date(value)
+    except ValueError:
+        date = None
+    if date is None:
+        raise ArgumentTypeError(f"invalid date '{value}', expected YYYY-MM-DD")
+    return date
+
+
+class Command(BaseCommand):
+    help = "Stream the order history, one row per order item, as CSV or NDJSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=list(WRITERS), default='csv',
+                            help="Output format (default: csv).")
+        parser.add_argument('--start', type=date_argument, help="First order date, YYYY-MM-DD.")
+        parser.add_argument('--end', type=date_argument, help="Last order date, YYYY-MM-DD.")
+        parser.add_argument('--output', help="File to write to instead of stdout.")
+
+    def handle(self, *args, **options):
+        write, _ = WRITERS[options['format']]
+        lines = write(order_rows(options['start'], options['end']), list(ORDER_COLUMNS))
+        if options['output'] is None:
+            for line in lines:
+                self.stdout.write(line, ending='')
+            return
+        with open(options['output'], 'w', newline='', encoding='utf-8') as out:
+            out.writelines(lines)
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.exceptions import ValidationError
+
+from LittleLemonAPI.menu_import import BATCH_SIZE, MenuImport, read_rows
+
+
+class Command(BaseCommand):
+    help = "Upsert menu items by title from a CSV or JSON file; categories are given by slug."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV (with a header line) or JSON file.")
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                            help=f"Rows validated and written per batch (default: {BATCH_SIZE}).")
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['path'], 'rb') as source:
+                data = source.read()
+        except OSError as error:
+            raise CommandError(error)
+        try:
+            rows = read_rows(data, options['path'])
+        except ValidationError as error:
+            raise CommandError(f"Could not read {options['path']}: {error.detail[0]}")
+
+        report = MenuImport(options['batch_size']).run(rows)
+        for error in report['errors']:
+            self.stderr.write(f"Row {error['row']}: {error['errors']}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {report['imported']} menu items, {len(report['errors'])} rows rejected."))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from LittleLemonAPI.models import DailyMenuItemRollup, DailyOrderRollup
+from LittleLemonAPI.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = "Recompute the daily reporting rollups from the Order and OrderItem tables."
+
+    def handle(self, *args, **options):
+        rebuild_rollups()
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {DailyOrderRollup.objects.count()} order rollups and "
+            f"{DailyMenuItemRollup.objects.count()} menu item rollups."))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from LittleLemonAPI.search import search_backend
+
+
+class Command(BaseCommand):
+    help = "Reindex every menu item for search."
+
+    def handle(self, *args, **options):
+        search_backend().rebuild()
+        self.stdout.write(self.style.SUCCESS("Rebuilt the menu search index."))
@@ -0,0 +1,51 @@
+import os
+import signal
+import socket
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from LittleLemonAPI.jobs import work
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs until stopped, or until the queue is drained with --once."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help="Exit when no job is due instead of waiting for more.")
+        parser.add_argument('--batch', type=int, default=10,
+                            help="Jobs claimed at a time.")
+        parser.add_argument('--interval', type=float, default=1.0,
+                            help="Seconds to wait before polling an empty queue again.")
+        parser.add_argument('--worker', default=f'{socket.gethostname()}:{os.getpid()}',
+                            help="Name recorded on the jobs this worker claims.")
+
+    def handle(self, *args, **options):
+        self.stopping = False
+        # Finish the job in hand before exiting.
+        handlers = {signum: signal.signal(signum, self.stop)
+                    for signum in (signal.SIGTERM, signal.SIGINT)}
+        try:
+            succeeded, failed = self.run(options)
+        finally:
+            for signum, handler in handlers.items():
+                signal.signal(signum, handler)
+        self.stdout.write(f"Ran {succeeded + failed} jobs: {succeeded} succeeded, {failed} failed.")
+
+    def run(self, options):
+        succeeded = failed = 0
+        while not self.stopping:
+            close_old_connections()
+            done, errors = work(options['worker'], options['batch'])
+            succeeded += done
+            failed += errors
+            if not done + errors:
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
+        return succeeded, failed
+
+    def stop(self, signum, frame):
+        self.stopping = True
@@ -0,0 +1,121 @@
+"""
+Bulk menu import: CSV or JSON rows of ``title, price, featured, category``
+(the category slug) and ``description`` are validated and upserted by
+title in batches.
+"""
+import csv
+import io
+import json
+
+from django.db import transaction
+from rest_framework import serializers
+
+from .catalogue import bump_catalogue_version
+from .menu_sync import record_menu_changes
+from .models import Category, MenuChange, MenuItem
+from .search import search_backend
+
+BATCH_SIZE = 500
+COLUMNS = ['title', 'price', 'featured', 'category', 'description']
+
+
+class MenuImportRowSerializer(serializers.Serializer):
+    """Field checks only; categories are resolved for a whole batch at once."""
+    title = serializers.CharField(max_length=255)
+    price = serializers.DecimalField(max_digits=6, decimal_places=2, min_value=0)
+    featured = serializers.BooleanField(default=False)
+    category = serializers.SlugField()
+    description = serializers.CharField(default='', allow_blank=True)
+
+
+def read_rows(data, filename=''):
+    """
+    Parse an uploaded file (bytes) or an already decoded JSON body into
+    row dicts. CSV needs a header line; anything else must be a JSON list.
+    """
+    if isinstance(data, (bytes, str)):
+        try:
+            text = data.decode('utf-8-sig') if isinstance(data, bytes) else data
+        except UnicodeDecodeError:
+            raise serializers.ValidationError("Files must be UTF-8 encoded.")
+        if filename.lower().endswith('.csv'):
+            return csv.DictReader(io.StringIO(text))
+        try:
+            data = json.loads(text)
+        except ValueError as error:
+            raise serializers.ValidationError(f"Not a CSV or JSON file: {error}")
+    if not isinstance(data, list):
+        raise serializers.ValidationError("Expected a list of menu items.")
+    return data
+
+
+class MenuImport:
+    """
+    Upsert menu items batch by batch, keeping a per-row error report.
+    Rows are numbered from 1 in the order they were read.
+    """
+
+    def __init__(self, batch_size=BATCH_SIZE):
+        self.batch_size = batch_size
+        self.categories = {}
+        self.imported = 0
+        self.errors = []
+
+    def run(self, rows):
+        batch = []
+        for number, row in enumerate(rows, start=1):
+            batch.append((number, row))
+            if len(batch) == self.batch_size:
+                self.import_batch(batch)
+                batch = []
+        if batch:
+            self.import_batch(batch)
+        if self.imported:
+            # bulk_create sends no post_save, so the search index and change
+            # log are updated per batch and the menu cache is refreshed here.
+            bump_catalogue_version()
+        return self.report()
+
+    def report(self):
+        return {'imported': self.imported, 'errors': self.errors}
+
+    def import_batch(self, batch):
+        valid = []
+        for number, row in batch:
+            if not isinstance(row, dict):
+                self.errors.append({'row': number, 'errors': {'non_field_errors': ["Expected an object."]}})
+                continue
+            serializer = MenuImportRowSerializer(data=row)
+            if serializer.is_valid():
+                valid.append((number, serializer.validated_data))
+            else:
+                self.errors.append({'row': number, 'errors': serializer.errors})
+
+        self.resolve_categories({data['category'] for _, data in valid})
+        items = {}
+        for number, data in valid:
+            category = self.categories.get(data['category'])
+            if category is None:
+                self.errors.append({'row': number, 'errors': {
+                    'category': [f"Unknown category '{data['category']}'."]}})
+                continue
+            # A title repeated within the batch keeps its last row.
+            items[data['title']] = MenuItem(
+                title=data['title'], price=data['price'],
+                featured=data['featured'], category=category,
+                description=data['description'])
+
+        with transaction.atomic():
+            MenuItem.objects.bulk_create(
+                items.values(), update_conflicts=True, unique_fields=['title'],
+                update_fields=['price', 'featured', 'category', 'description'])
+            ids = list(MenuItem.objects.filter(
+                title__in=list(items)).values_list('pk', flat=True))
+            search_backend().index(ids)
+            record_menu_changes(MenuChange.MENU_ITEM, ids)
+        self.imported += len(items)
+
+    def resolve_categories(self, slugs):
+        missing = slugs - self.categories.keys()
+        if missing:
+            self.categories.update(Category.objects.in_bulk(missing, field_name='slug'))
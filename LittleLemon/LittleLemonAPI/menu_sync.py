@@ -0,0 +1,98 @@
+"""
+The menu change log behind ``menu-items/changes/``.
+
+Every save or delete of a MenuItem or Category takes the next catalogue
+version and records a MenuChange row, a tombstone for deletes. A client
+sends back the version of its last sync and gets only what changed since;
+without one, or from before the log was last compacted, it gets a full
+snapshot instead.
+
+Versions come from the MenuSyncState row, which the recording transaction
+updates first. Its row lock makes concurrent writers take versions in
+commit order, so a client never skips a change that commits late.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, F, Max, OuterRef
+from django.utils import timezone
+
+from .catalogue import bump_catalogue_version
+from .models import Category, MenuChange, MenuItem, MenuSyncState
+
+MENU_ITEM_PLAN = MenuItem.objects.select_related('category')
+
+
+def record_menu_changes(kind, ids, deleted=False):
+    """Record a change of each ``kind`` object in ``ids``, one version each."""
+    ids = list(ids)
+    if not ids:
+        return
+    with transaction.atomic(savepoint=False):
+        state = MenuSyncState.objects.filter(pk=1)
+        if not state.update(version=F('version') + len(ids)):
+            # Only after a flush; the migration creates the row.
+            MenuSyncState.objects.create(pk=1, version=len(ids))
+        version = state.values_list('version', flat=True).get()
+        first = version - len(ids) + 1
+        MenuChange.objects.bulk_create(
+            MenuChange(version=first + offset, kind=kind, object_id=pk, deleted=deleted)
+            for offset, pk in enumerate(ids))
+
+
+def sync_state():
+    return MenuSyncState.objects.get_or_create(pk=1)[0]
+
+
+def menu_delta(since=None):
+    """
+    The changes after version ``since`` as ``(version, snapshot, changed,
+    deleted)``, where ``changed`` maps each kind to a queryset and
+    ``deleted`` to a list of ids. A snapshot lists everything instead.
+    """
+    # Read the version first: rows changed after it are sent again next time.
+    state = sync_state()
+    querysets = {MenuChange.MENU_ITEM: MENU_ITEM_PLAN, MenuChange.CATEGORY: Category.objects}
+    if since is None or not state.floor <= since <= state.version:
+        changed = {kind: queryset.order_by('pk') for kind, queryset in querysets.items()}
+        return state.version, True, changed, {kind: [] for kind in querysets}
+
+    latest = {kind: {} for kind in querysets}
+    changes = MenuChange.objects.filter(version__gt=since, version__lte=state.version)
+    for kind, object_id, deleted in changes.order_by('version').values_list(
+            'kind', 'object_id', 'deleted'):
+        latest[kind][object_id] = deleted
+    changed = {kind: querysets[kind].filter(
+        pk__in=[pk for pk, deleted in objects.items() if not deleted]).order_by('pk')
+        for kind, objects in latest.items()}
+    deleted = {kind: sorted(pk for pk, deleted in objects.items() if deleted)
+               for kind, objects in latest.items()}
+    return state.version, False, changed, deleted
+
+
+@transaction.atomic
+def compact_menu_changes(retention=None):
+    """
+    Drop changes superseded by a later one for the same object, which no
+    client needs, then everything older than ``retention`` (a timedelta,
+    MENU_CHANGES_RETENTION_DAYS by default). Clients that synced before
+    the dropped versions get a snapshot. Returns the rows deleted.
+    """
+    if retention is None:
+        retention = timedelta(days=settings.MENU_CHANGES_RETENTION_DAYS)
+    superseded, _ = MenuChange.objects.filter(Exists(MenuChange.objects.filter(
+        kind=OuterRef('kind'), object_id=OuterRef('object_id'),
+        version__gt=OuterRef('version')))).delete()
+
+    expired = MenuChange.objects.filter(created__lt=timezone.now() - retention)
+    floor = expired.aggregate(floor=Max('version'))['floor']
+    if floor is None:
+        return superseded
+    # Raise the floor before deleting, under the same row lock as writers.
+    sync_state()
+    MenuSyncState.objects.filter(pk=1, floor__lt=floor).update(floor=floor)
+    removed, _ = MenuChange.objects.filter(version__lte=floor).delete()
+    # Cached deltas from below the new floor must become snapshots.
+    bump_catalogue_version()
+    return superseded + removed
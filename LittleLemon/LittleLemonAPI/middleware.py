@@ -0,0 +1,27 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.utils.functional import SimpleLazyObject
+
+from .roles import get_roles
+
+
+class RolesMiddleware:
+    """
+    Expose the authenticated user's roles as ``request.roles``.
+
+    Resolution is lazy, so DRF views see the user set by their own
+    authentication classes (token users included) rather than the session
+    user known when the middleware runs.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        request.roles = SimpleLazyObject(lambda: get_roles(request.user))
+        # Under ASGI this returns the coroutine for the caller to await.
+        return self.get_response(request)
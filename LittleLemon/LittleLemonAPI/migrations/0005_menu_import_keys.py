@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:33
+
+from django.db import migrations, models
+
+
+def check_duplicate_keys(apps, schema_editor):
+    # Which duplicate to keep is the restaurant's call, so stop and say which.
+    using = schema_editor.connection.alias
+    problems = []
+    for model, field in [('Category', 'slug'), ('MenuItem', 'title')]:
+        rows = apps.get_model('LittleLemonAPI', model).objects.using(using)
+        duplicates = list(rows.values(field).annotate(rows=models.Count('id')).filter(rows__gt=1)
+                          .order_by(field).values_list(field, flat=True))
+        if duplicates:
+            names = ', '.join(repr(value) for value in duplicates[:10])
+            problems.append(f"{model} {field}s used more than once: {names}")
+    if problems:
+        raise RuntimeError(
+            f"{'; '.join(problems)}. Rename or merge them in the admin, moving menu items "
+            "and order items onto the one kept, then migrate again.")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('LittleLemonAPI', '0004_daily_rollups'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_duplicate_keys, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='category',
+            name='slug',
+            field=models.SlugField(unique=True),
+        ),
+        migrations.AlterField(
+            model_name='menuitem',
+            name='title',
+            field=models.CharField(max_length=255, unique=True),
+        ),
+    ]
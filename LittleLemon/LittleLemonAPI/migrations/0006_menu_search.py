@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:35
+
+from django.db import migrations, models
+
+# Frozen copies of what LittleLemonAPI.search.SQLiteFTS5Backend expects.
+FTS_TABLE = 'LittleLemonAPI_menuitem_fts'
+
+
+def install_search_index(apps, schema_editor):
+    # Other vendors fall back to icontains search and need no index.
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+        "title, category, description, "
+        "prefix='2 3', tokenize='unicode61 remove_diacritics 2')")
+    MenuItem = apps.get_model('LittleLemonAPI', 'MenuItem')
+    rows = MenuItem.objects.using(schema_editor.connection.alias).values_list(
+        'id', 'title', 'category__title', 'description')
+    with schema_editor.connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {FTS_TABLE} (rowid, title, category, description) VALUES (%s, %s, %s, %s)',
+            list(rows))
+
+
+def uninstall_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('LittleLemonAPI', '0005_menu_import_keys'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='menuitem',
+            name='description',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.RunPython(install_search_index, uninstall_search_index),
+    ]
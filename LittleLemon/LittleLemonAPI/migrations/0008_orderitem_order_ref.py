@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """
+    Adds the nullable column that LittleLemonAPI.backfill fills in before
+    0009 swaps it in for OrderItem.order. Adding it takes no table rewrite;
+    its index comes with 0009's unique constraint.
+    """
+
+    dependencies = [
+        ('LittleLemonAPI', '0007_job_queue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitem',
+            name='order_ref',
+            field=models.ForeignKey(
+                db_index=False, null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                to='LittleLemonAPI.order'),
+        ),
+    ]
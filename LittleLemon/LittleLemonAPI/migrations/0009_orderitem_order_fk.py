@@ -0,0 +1,120 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.migrations.exceptions import IrreversibleError
+
+from LittleLemonAPI.backfill import backfill_order_items
+
+
+def finish_backfill(apps, schema_editor):
+    # Normally a no-op: manage.py backfill_order_items has done the work.
+    unmatched = backfill_order_items(apps, using=schema_editor.connection.alias)
+    if unmatched:
+        raise RuntimeError(
+            f"{len(unmatched)} order items belong to customers without orders. "
+            "Run 'manage.py backfill_order_items --delete-unmatched', then migrate again.")
+
+
+def refuse_with_items(apps, schema_editor):
+    # The old column only held customer ids, which the swap threw away.
+    OrderItem = apps.get_model('LittleLemonAPI', 'OrderItem')
+    if OrderItem.objects.using(schema_editor.connection.alias).exists():
+        raise IrreversibleError("Order items cannot be pointed back at their customers.")
+
+
+class SetNotNull(migrations.AlterField):
+    """
+    AlterField to NOT NULL. On PostgreSQL a NOT VALID check constraint is
+    validated first, which scans the table without blocking writes, so SET
+    NOT NULL can skip its own scan under the exclusive lock and the foreign
+    key is left alone rather than dropped and validated again.
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != 'postgresql':
+            return super().database_forwards(app_label, schema_editor, from_state, to_state)
+        model = to_state.apps.get_model(app_label, self.model_name)
+        quote = schema_editor.quote_name
+        table = quote(model._meta.db_table)
+        column = model._meta.get_field(self.name).column
+        check = quote(f'{model._meta.db_table}_{column}_not_null')
+        schema_editor.execute(
+            f'ALTER TABLE {table} ADD CONSTRAINT {check} CHECK ({quote(column)} IS NOT NULL) NOT VALID')
+        schema_editor.execute(f'ALTER TABLE {table} VALIDATE CONSTRAINT {check}')
+        schema_editor.execute(f'ALTER TABLE {table} ALTER COLUMN {quote(column)} SET NOT NULL')
+        schema_editor.execute(f'ALTER TABLE {table} DROP CONSTRAINT {check}')
+
+
+class AddUniqueTogetherConcurrently(migrations.AlterUniqueTogether):
+    """
+    AlterUniqueTogether from nothing to one unique set. On PostgreSQL its
+    index is built CONCURRENTLY, without blocking writes, and then attached
+    as the constraint, which only takes a brief lock.
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != 'postgresql':
+            return super().database_forwards(app_label, schema_editor, from_state, to_state)
+        model = to_state.apps.get_model(app_label, self.name)
+        (fields,) = self.unique_together
+        quote = schema_editor.quote_name
+        table = model._meta.db_table
+        columns = [model._meta.get_field(field).column for field in fields]
+        name = quote(schema_editor._create_index_name(table, columns, suffix='_uniq'))
+        schema_editor.execute(
+            f'CREATE UNIQUE INDEX CONCURRENTLY {name} ON {quote(table)} '
+            f'({", ".join(map(quote, columns))})')
+        schema_editor.execute(
+            f'ALTER TABLE {quote(table)} ADD CONSTRAINT {name} UNIQUE USING INDEX {name}')
+
+
+class Migration(migrations.Migration):
+    """
+    Swaps order_ref in for OrderItem.order once LittleLemonAPI.backfill has
+    filled it. Not atomic, so on PostgreSQL every step commits on its own
+    and releases its locks: dropping the old column and renaming the new
+    one only touch the catalogue, NOT NULL is checked by a validated
+    constraint and the unique index is built concurrently. What still
+    takes ACCESS EXCLUSIVE there are those brief catalogue changes.
+
+    SQLite cannot alter a column in place, so there every step rebuilds the
+    whole table under the database's single write lock; take the site down
+    for it.
+    """
+
+    atomic = False
+
+    dependencies = [
+        ('LittleLemonAPI', '0008_orderitem_order_ref'),
+    ]
+
+    operations = [
+        migrations.RunPython(finish_backfill, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='orderitem',
+            unique_together=set(),
+        ),
+        migrations.RemoveField(
+            model_name='orderitem',
+            name='order',
+        ),
+        migrations.RenameField(
+            model_name='orderitem',
+            old_name='order_ref',
+            new_name='order',
+        ),
+        SetNotNull(
+            model_name='orderitem',
+            name='order',
+            field=models.ForeignKey(
+                db_index=False, on_delete=django.db.models.deletion.CASCADE,
+                to='LittleLemonAPI.order'),
+        ),
+        AddUniqueTogetherConcurrently(
+            name='orderitem',
+            unique_together={('order', 'menuitem')},
+        ),
+        # Only reversible while there are no order items.
+        migrations.RunPython(migrations.RunPython.noop, refuse_with_items),
+    ]
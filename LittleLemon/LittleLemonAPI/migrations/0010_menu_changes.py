@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:50
+
+from django.db import migrations, models
+
+
+def create_sync_state(apps, schema_editor):
+    MenuSyncState = apps.get_model('LittleLemonAPI', 'MenuSyncState')
+    MenuSyncState.objects.using(schema_editor.connection.alias).create(pk=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('LittleLemonAPI', '0009_orderitem_order_fk'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MenuSyncState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.BigIntegerField(default=0)),
+                ('floor', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='MenuChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.BigIntegerField(unique=True)),
+                ('kind', models.CharField(choices=[('menuitem', 'Menu item'), ('category', 'Category')], max_length=10)),
+                ('object_id', models.BigIntegerField()),
+                ('deleted', models.BooleanField(default=False)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['kind', 'object_id', 'version'], name='menuchange_object_idx')],
+            },
+        ),
+        migrations.RunPython(create_sync_state, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:20
+
+from django.db import migrations, models
+from django.db.models import F, Sum
+
+
+def rebuild(apps, group_by):
+    DailyMenuItemRollup = apps.get_model('LittleLemonAPI', 'DailyMenuItemRollup')
+    OrderItem = apps.get_model('LittleLemonAPI', 'OrderItem')
+    DailyMenuItemRollup.objects.all().delete()
+    DailyMenuItemRollup.objects.bulk_create(
+        DailyMenuItemRollup(**row)
+        for row in OrderItem.objects.order_by()
+        .values('menuitem_id', **group_by)
+        .annotate(quantity=Sum('quantity'), revenue=Sum('price'))
+    )
+
+
+def split_by_status(apps, schema_editor):
+    rebuild(apps, {'date': F('order__date'), 'status': F('order__status')})
+
+
+def merge_statuses(apps, schema_editor):
+    rebuild(apps, {'date': F('order__date')})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('LittleLemonAPI', '0011_throttle_counters'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='dailymenuitemrollup',
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name='dailymenuitemrollup',
+            name='status',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(split_by_status, merge_statuses),
+        migrations.AlterUniqueTogether(
+            name='dailymenuitemrollup',
+            unique_together={('date', 'menuitem', 'status')},
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:02
+
+from django.db import migrations
+
+
+def journal_mode(mode):
+    def set_mode(apps, schema_editor):
+        # The journal mode is stored in the database file, so once is enough.
+        if schema_editor.connection.vendor == 'sqlite':
+            with schema_editor.connection.cursor() as cursor:
+                cursor.execute(f'PRAGMA journal_mode={mode}')
+    return set_mode
+
+
+class Migration(migrations.Migration):
+    # SQLite cannot change the journal mode inside a transaction.
+    atomic = False
+
+    dependencies = [
+        ('LittleLemonAPI', '0013_menu_search_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(journal_mode('WAL'), journal_mode('DELETE')),
+    ]
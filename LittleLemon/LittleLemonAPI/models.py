@@ -4,8 +4,37 @@ from django.contrib.auth.models import User
 # Create your models here.
 
 
+class LoadedValuesMixin(models.Model):
+    """
+    Remembers the column values an instance was loaded or last saved with,
+    so save signals can tell what changed without reading the row again.
+    """
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._loaded_values = {
+            field.attname: getattr(self, field.attname) for field in self._meta.concrete_fields}
+
+    def loaded_values(self, fields):
+        """The values of ``fields`` before this save, or None for a new row."""
+        loaded = getattr(self, '_loaded_values', {})
+        if all(field in loaded for field in fields):
+            return tuple(loaded[field] for field in fields)
+        # Built by bulk_create, or loaded with some of the fields deferred.
+        return type(self)._base_manager.filter(pk=self.pk).values_list(*fields).first()
+
+
 class Category(models.Model):
-    slug = models.SlugField()
+    slug = models.SlugField(unique=True)
     title = models.CharField(max_length=255, db_index=True)
 
     def __str__(self):
@@ -13,15 +42,36 @@ class Category(models.Model):
 
 
 class MenuItem(models.Model):
-    title = models.CharField(max_length=255, db_index=True)
+    title = models.CharField(max_length=255, unique=True)
     price = models.DecimalField(max_digits=6, decimal_places=2, db_index=True)
     featured = models.BooleanField(db_index=True)
     category = models.ForeignKey(Category, on_delete=models.PROTECT)
+    description = models.TextField(blank=True, default='')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['price', 'id'], name='menuitem_price_id_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
 
+class MenuItemSearchIndex(models.Model):
+    """
+    The FTS5 table search.SQLiteFTS5Backend keeps, mapped only so searches
+    can join it; its rowid is the menu item's id. Migration 0006 creates
+    it, on SQLite only.
+    """
+    menuitem = models.OneToOneField(
+        MenuItem, models.DO_NOTHING, primary_key=True, db_column='rowid',
+        related_name='search_index')
+
+    class Meta:
+        managed = False
+        db_table = 'LittleLemonAPI_menuitem_fts'
+
+
 class Cart(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     menuitem = models.ForeignKey(MenuItem, on_delete=models.CASCADE)
@@ -33,20 +83,31 @@ class Cart(models.Model):
         unique_together = ('menuitem', 'user')
 
 
-class Order(models.Model):
+class Order(LoadedValuesMixin, models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     delivery_crew = models.ForeignKey(
         User, on_delete=models.SET_NULL, related_name="delivery_crew", null=True)
     status = models.BooleanField(db_index=True, default=0)
     total = models.DecimalField(max_digits=6, decimal_places=2)
     date = models.DateField(db_index=True)
+    idempotency_key = models.CharField(max_length=255, null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'idempotency_key'], name='unique_order_idempotency_key'),
+        ]
+        indexes = [
+            models.Index(fields=['date', 'id'], name='order_date_id_idx'),
+        ]
 
     def __str__(self):
         return f"Order n°{self.id} made by {self.user.username}"
 
 
-class OrderItem(models.Model):
-    order = models.ForeignKey(User, on_delete=models.CASCADE)
+class OrderItem(LoadedValuesMixin, models.Model):
+    # The (order, menuitem) unique index also serves lookups by order.
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, db_index=False)
     menuitem = models.ForeignKey(MenuItem, on_delete=models.CASCADE)
     quantity = models.SmallIntegerField()
     unit_price = models.DecimalField(max_digits=6, decimal_places=2)
@@ -54,3 +115,90 @@ class OrderItem(models.Model):
 
     class Meta:
         unique_together = ('order', 'menuitem')
+
+
+class DailyOrderRollup(models.Model):
+    date = models.DateField()
+    delivery_crew = models.ForeignKey(
+        User, on_delete=models.SET_NULL, related_name="+", null=True)
+    status = models.BooleanField()
+    order_count = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ('date', 'delivery_crew', 'status')
+
+
+class DailyMenuItemRollup(models.Model):
+    date = models.DateField()
+    menuitem = models.ForeignKey(MenuItem, on_delete=models.CASCADE)
+    # The status of the orders counted, for the reports' status filter.
+    status = models.BooleanField(default=False)
+    quantity = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ('date', 'menuitem', 'status')
+
+
+class Job(models.Model):
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    FAILED = 'failed'
+    STATUS_CHOICES = [(QUEUED, 'Queued'), (RUNNING, 'Running'), (FAILED, 'Failed')]
+
+    task = models.CharField(max_length=255)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    run_at = models.DateTimeField()
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    locked_by = models.CharField(max_length=255, blank=True, default='')
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True, default='')
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_at'], name='job_status_run_at_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.task} #{self.id} ({self.status})"
+
+
+class MenuSyncState(models.Model):
+    """
+    A single row. ``version`` is the catalogue version of the latest
+    MenuChange; changes at or below ``floor`` have been compacted away.
+    """
+    version = models.BigIntegerField(default=0)
+    floor = models.BigIntegerField(default=0)
+
+
+class MenuChange(models.Model):
+    MENU_ITEM = 'menuitem'
+    CATEGORY = 'category'
+    KIND_CHOICES = [(MENU_ITEM, 'Menu item'), (CATEGORY, 'Category')]
+
+    version = models.BigIntegerField(unique=True)
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    deleted = models.BooleanField(default=False)
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['kind', 'object_id', 'version'], name='menuchange_object_idx'),
+        ]
+
+
+class ThrottleCounter(models.Model):
+    """Requests by one client in one throttle window; see throttling.py."""
+    key = models.CharField(max_length=255)
+    window = models.BigIntegerField()
+    count = models.PositiveIntegerField(default=0)
+    expires = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('key', 'window')
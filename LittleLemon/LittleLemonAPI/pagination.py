@@ -0,0 +1,131 @@
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.utils.encoding import force_str
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Seek-based pagination on an indexed, unique ordering.
+
+    Instead of COUNT(*) and OFFSET, the cursor stores the ordering values of
+    the last row served and the next page starts strictly after them, so
+    every page costs the same and rows inserted meanwhile never shift it.
+    The last field of ``ordering`` must be unique (normally ``id``).
+    """
+    ordering = ('id',)
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.take_page(list(self.page_queryset(queryset, request)))
+
+    def page_queryset(self, queryset, request):
+        """The unevaluated query for the page, plus one row to detect a next page."""
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.fields = [
+            queryset.model._meta.get_field(name.lstrip('-')) for name in self.ordering]
+
+        queryset = queryset.order_by(*self.ordering)
+        position = self.decode_cursor(request)
+        if position is not None:
+            queryset = queryset.filter(self.after(position))
+        return queryset[:self.page_size + 1]
+
+    def take_page(self, rows):
+        self.has_next = len(rows) > self.page_size
+        del rows[self.page_size:]
+        self.last = rows[-1] if rows else None
+        return rows
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def after(self, position):
+        # (a, b, c) > (x, y, z) spelled out for the ordering's directions.
+        condition = Q()
+        for index, name in enumerate(self.ordering):
+            lookup = 'lt' if name.startswith('-') else 'gt'
+            step = Q(**{f'{name.lstrip("-")}__{lookup}': position[index]})
+            for previous, value in zip(self.ordering[:index], position):
+                step &= Q(**{previous.lstrip('-'): value})
+            condition |= step
+        return condition
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            values = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            if len(values) != len(self.fields):
+                raise ValueError
+            return [field.to_python(value) for field, value in zip(self.fields, values)]
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, row):
+        values = [force_str(field.value_from_object(row)) for field in self.fields]
+        encoded = base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+        return replace_query_param(
+            self.request.build_absolute_uri(), self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(self.last)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class OrderKeysetPagination(KeysetPagination):
+    ordering = ('-date', '-id')
+
+
+class MenuItemKeysetPagination(KeysetPagination):
+    ordering = ('price', 'id')
+
+
+class SelectablePaginationMixin:
+    """
+    Let clients opt into ``keyset_pagination_class`` with
+    ``?pagination=keyset``; the default page-number pagination is used
+    otherwise.
+    """
+    keyset_pagination_class = None
+
+    @property
+    def paginator(self):
+        if (not hasattr(self, '_paginator')
+                and self.request.query_params.get('pagination') == 'keyset'):
+            self._paginator = self.keyset_pagination_class()
+        return super().paginator
@@ -3,9 +3,9 @@ from rest_framework import permissions
 
 class IsManager(permissions.BasePermission):
     def has_permission(self, request, view):
-        return request.user.groups.filter(name='Manager').exists()
+        return request.roles.is_manager
 
 
 class IsCustomer(permissions.BasePermission):
     def has_permission(self, request, view):
-        return request.user.groups.filter(name='Customer').exists()
+        return request.roles.is_customer
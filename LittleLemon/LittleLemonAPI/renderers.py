@@ -0,0 +1,139 @@
+"""
+MessagePack and CBOR, negotiated through ``Accept`` and ``Content-Type``
+alongside JSON. Each needs its optional package (``msgpack``, ``cbor2``);
+settings only offer the formats whose package is installed.
+
+Money goes out as an exact decimal rather than JSON's string, through
+serializers.MoneyField, normalized so ``12.00`` costs as little as ``12``:
+
+- CBOR uses the standard decimal fraction, tag 4 ``[exponent, mantissa]``.
+- MessagePack uses extension type 1: a signed exponent byte, then the
+  mantissa as a signed big-endian integer, padded to a fixext size.
+
+Both parsers read these back as ``Decimal``.
+"""
+import datetime
+import functools
+import uuid
+from decimal import Decimal
+
+from django.utils.functional import Promise
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+from rest_framework.renderers import BaseRenderer
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+
+DECIMAL_EXT = 1
+FIXEXT_SIZES = (1, 2, 4, 8, 16)
+
+
+def encode_decimal_ext(value):
+    sign, digits, exponent = value.as_tuple()
+    mantissa = int(''.join(map(str, digits)) or 0) * (-1 if sign else 1)
+    length = (mantissa.bit_length() + 8) // 8 + 1
+    size = next((size for size in FIXEXT_SIZES if size >= length), length)
+    return (exponent.to_bytes(1, 'big', signed=True)
+            + mantissa.to_bytes(size - 1, 'big', signed=True))
+
+
+def decode_decimal_ext(data):
+    exponent = int.from_bytes(data[:1], 'big', signed=True)
+    return Decimal(int.from_bytes(data[1:], 'big', signed=True)).scaleb(exponent)
+
+
+def default(value):
+    """Types msgpack and cbor2 leave to the caller."""
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, (uuid.UUID, Promise)):
+        return str(value)
+    if hasattr(value, '__iter__'):
+        return list(value)
+    raise TypeError(f'Cannot encode {type(value).__name__}')
+
+
+@functools.lru_cache(maxsize=4096)
+def decimal_ext(value):
+    # Menus repeat a few hundred prices, so most encodings are cache hits.
+    if value.is_finite() and -128 <= value.as_tuple().exponent <= 127:
+        return msgpack.ExtType(DECIMAL_EXT, encode_decimal_ext(value))
+    return str(value)
+
+
+def msgpack_default(value):
+    if isinstance(value, Decimal):
+        return decimal_ext(value)
+    return default(value)
+
+
+def msgpack_ext_hook(code, data):
+    if code == DECIMAL_EXT:
+        return decode_decimal_ext(data)
+    return msgpack.ExtType(code, data)
+
+
+class BinaryRenderer(BaseRenderer):
+    charset = None
+    render_style = 'binary'
+    available = False
+
+    def money(self, value):
+        """What serializers.MoneyField hands this renderer for ``value``."""
+        return value
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return self.dumps(data)
+
+
+class MessagePackRenderer(BinaryRenderer):
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    available = msgpack is not None
+
+    def money(self, value):
+        return decimal_ext(value)
+
+    def dumps(self, data):
+        return msgpack.packb(data, default=msgpack_default)
+
+
+class CBORRenderer(BinaryRenderer):
+    media_type = 'application/cbor'
+    format = 'cbor'
+    available = cbor2 is not None
+
+    def dumps(self, data):
+        # cbor2 encodes Decimal itself, as a decimal fraction. That is
+        # slower than strings; see the benchmark's formats report.
+        return cbor2.dumps(data, default=lambda encoder, value: encoder.encode(default(value)))
+
+
+class MessagePackParser(BaseParser):
+    media_type = 'application/msgpack'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return msgpack.unpackb(stream.read(), ext_hook=msgpack_ext_hook)
+        except ValueError as error:
+            raise ParseError(f'MessagePack parse error - {error}')
+
+
+class CBORParser(BaseParser):
+    media_type = 'application/cbor'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return cbor2.loads(stream.read())
+        except (ValueError, cbor2.CBORDecodeError) as error:
+            raise ParseError(f'CBOR parse error - {error}')
@@ -0,0 +1,55 @@
+from django.conf import settings
+from django.core.cache import caches
+
+MANAGER = 'Manager'
+DELIVERY_CREW = 'Delivery Crew'
+CUSTOMER = 'Customer'
+
+
+class Roles(frozenset):
+    """The group names of a user, resolved once per request."""
+
+    @property
+    def is_manager(self):
+        return MANAGER in self
+
+    @property
+    def is_delivery_crew(self):
+        return DELIVERY_CREW in self
+
+    @property
+    def is_customer(self):
+        return CUSTOMER in self
+
+
+def _cache_key(user_id):
+    return f'LittleLemonAPI:roles:{user_id}'
+
+
+def _cache():
+    # Shared by every worker, so a revoked role is revoked everywhere.
+    return caches[getattr(settings, 'ROLE_CACHE_ALIAS', 'shared')]
+
+
+def get_roles(user):
+    # Memoized on the user instance, which lives for a single request, and
+    # optionally shared across requests through the cache for
+    # ROLE_CACHE_TIMEOUT seconds.
+    if not user.is_authenticated:
+        return Roles()
+    roles = getattr(user, '_roles', None)
+    if roles is not None:
+        return roles
+
+    timeout = getattr(settings, 'ROLE_CACHE_TIMEOUT', 0)
+    names = _cache().get(_cache_key(user.pk)) if timeout else None
+    if names is None:
+        names = list(user.groups.values_list('name', flat=True))
+        if timeout:
+            _cache().set(_cache_key(user.pk), names, timeout)
+    user._roles = Roles(names)
+    return user._roles
+
+
+def invalidate_roles(user_ids):
+    _cache().delete_many([_cache_key(user_id) for user_id in user_ids])
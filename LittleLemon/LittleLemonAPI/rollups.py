@@ -0,0 +1,166 @@
+import functools
+import operator
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, Count, F, Q, Sum, Value, When
+
+from .jobs import enqueue, task
+from .models import DailyMenuItemRollup, DailyOrderRollup, Job, Order, OrderItem
+
+# Order fields that decide which DailyOrderRollup row an order counts in.
+ROLLUP_FIELDS = ('date', 'delivery_crew_id', 'status', 'total')
+# Order fields that decide which DailyMenuItemRollup rows its items count in.
+ITEM_ROLLUP_FIELDS = ('date', 'status')
+# OrderItem fields a DailyMenuItemRollup row adds up.
+ITEM_FIELDS = ('menuitem_id', 'quantity', 'price')
+
+
+def _bump(model, deltas):
+    """
+    Add ``deltas``, ``{key: {field: delta}}`` keyed by the values of
+    ``model``'s unique fields, whatever their number in at most three
+    queries: the missing rows are created, then one UPDATE adds to all.
+    """
+    deltas = {key: fields for key, fields in deltas.items() if any(fields.values())}
+    if not deltas:
+        return
+    names = [model._meta.get_field(name).attname for name in model._meta.unique_together[0]]
+    matches = {key: Q(**dict(zip(names, key))) for key in deltas}
+    rows = model.objects.filter(functools.reduce(operator.or_, matches.values()))
+
+    # Nullable keys are never unique to the database, so look before inserting.
+    existing = set(rows.values_list(*names))
+    model.objects.bulk_create(
+        [model(**dict(zip(names, key))) for key in deltas if key not in existing],
+        ignore_conflicts=True)
+
+    fields = {field for changes in deltas.values() for field in changes}
+    rows.update(**{
+        field: F(field) + Case(
+            *(When(matches[key], then=Value(changes.get(field, 0)))
+              for key, changes in deltas.items()),
+            default=Value(0), output_field=model._meta.get_field(field))
+        for field in fields
+    })
+
+
+def order_deltas(values, sign=1, deltas=None):
+    """
+    Collect into ``deltas`` the change adding (or with ``sign=-1``
+    removing) an order with ``ROLLUP_FIELDS`` values ``values`` makes.
+    """
+    if deltas is None:
+        deltas = defaultdict(lambda: {'order_count': 0, 'revenue': 0})
+    date, delivery_crew_id, status, total = values
+    changes = deltas[date, delivery_crew_id, status]
+    changes['order_count'] += sign
+    changes['revenue'] += sign * Decimal(total)
+    return deltas
+
+
+def record_order(values, sign=1):
+    """Add (or with ``sign=-1`` remove) one order's ``ROLLUP_FIELDS`` values."""
+    _bump(DailyOrderRollup, order_deltas(values, sign))
+
+
+def move_order(previous, current):
+    """Move one order from its ``previous`` values' rollup row to ``current``'s."""
+    _bump(DailyOrderRollup, order_deltas(current, deltas=order_deltas(previous, sign=-1)))
+
+
+def item_deltas(order_values, items, sign=1, deltas=None):
+    """
+    Collect into ``deltas`` the changes adding (or with ``sign=-1``
+    removing) ``items``, ``ITEM_FIELDS`` tuples, makes to the rollups of an
+    order with ``ITEM_ROLLUP_FIELDS`` values ``order_values``.
+    """
+    if deltas is None:
+        deltas = defaultdict(lambda: {'quantity': 0, 'revenue': 0})
+    date, status = order_values
+    for menuitem_id, quantity, price in items:
+        changes = deltas[date, menuitem_id, status]
+        changes['quantity'] += sign * quantity
+        # Decimal() as well, for instances saved with string prices.
+        changes['revenue'] += sign * Decimal(price)
+    return deltas
+
+
+def record_order_items(order_values, items, sign=1):
+    _bump(DailyMenuItemRollup, item_deltas(order_values, items, sign))
+
+
+def move_order_items(previous, current, items):
+    """Move ``items`` from the rollups of ``previous`` order values to ``current``'s."""
+    deltas = item_deltas(previous, items, sign=-1)
+    _bump(DailyMenuItemRollup, item_deltas(current, items, deltas=deltas))
+
+
+def replace_order_item(previous, current):
+    """
+    Swap one item's rollup contribution: both are ``(order_values, item)``
+    pairs, ``previous`` None for a new item.
+    """
+    deltas = item_deltas(previous[0], [previous[1]], sign=-1) if previous else None
+    _bump(DailyMenuItemRollup, item_deltas(current[0], [current[1]], deltas=deltas))
+
+
+def rollup_values(instance, fields=ROLLUP_FIELDS):
+    return tuple(getattr(instance, field) for field in fields)
+
+
+# New orders are counted by a job rather than in the request that places
+# them, so concurrent checkouts do not queue on the lock of the day's
+# rollup rows. Rollups are only ever added to, so changes made to the order
+# before the job runs may be counted first.
+
+@task
+def count_new_order(values):
+    day, delivery_crew_id, status, total = values
+    record_order((date.fromisoformat(day), delivery_crew_id, status, total))
+
+
+@task
+def count_new_order_items(order_values, items):
+    day, status = order_values
+    record_order_items((date.fromisoformat(day), status), items)
+
+
+def defer_order(values):
+    """Queue the count of a new order with ``ROLLUP_FIELDS`` values ``values``."""
+    day, delivery_crew_id, status, total = values
+    enqueue(count_new_order, {'values': [str(day), delivery_crew_id, status, str(total)]})
+
+
+def defer_order_items(order_values, items):
+    """Queue the count of ``items``, ``ITEM_FIELDS`` tuples, added to a new order."""
+    day, status = order_values
+    enqueue(count_new_order_items, {
+        'order_values': [str(day), status],
+        'items': [[menuitem_id, quantity, str(price)] for menuitem_id, quantity, price in items],
+    })
+
+
+@transaction.atomic
+def rebuild_rollups():
+    """Recompute both rollup tables from the live Order and OrderItem rows."""
+    # The rebuild counts the orders these were queued for.
+    Job.objects.filter(task__in=[count_new_order.task_name, count_new_order_items.task_name]).exclude(
+        status=Job.RUNNING).delete()
+    DailyOrderRollup.objects.all().delete()
+    DailyMenuItemRollup.objects.all().delete()
+
+    DailyOrderRollup.objects.bulk_create(
+        DailyOrderRollup(**row)
+        for row in Order.objects.order_by()
+        .values('date', 'delivery_crew_id', 'status')
+        .annotate(order_count=Count('id'), revenue=Sum('total'))
+    )
+    DailyMenuItemRollup.objects.bulk_create(
+        DailyMenuItemRollup(**row)
+        for row in OrderItem.objects.order_by()
+        .values('menuitem_id', date=F('order__date'), status=F('order__status'))
+        .annotate(quantity=Sum('quantity'), revenue=Sum('price'))
+    )
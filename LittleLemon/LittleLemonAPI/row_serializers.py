@@ -0,0 +1,183 @@
+"""
+Read-only serializers for the menu, cart and order lists.
+
+Their ModelSerializers build a model instance per row and then call every
+field's ``to_representation``, nested serializers included, which made
+serialization the top frame of list requests. These read the
+``values_list()`` rows of exactly the columns the output needs and turn
+each into a dict in one function, compiled once per response with its
+money formatters. The output matches the ModelSerializers' byte for byte;
+those still serve writes and single objects.
+"""
+import functools
+from collections import defaultdict
+
+from rest_framework.response import Response
+
+from .models import OrderItem
+from .serializers import CartSerializer, MenuItemSerializer, OrderItemSerializer, OrderSerializer
+
+
+@functools.cache
+def declared_fields(serializer_class):
+    return serializer_class().fields
+
+
+class RowSerializer:
+    """
+    Serializes the rows of ``values(queryset)`` as ``serializer_class``
+    serializes model instances; ``data`` is the list.
+    """
+    serializer_class = None
+    columns = ()
+
+    def __init__(self, rows, context=None):
+        self.rows = rows
+        self.context = context or {}
+        self.renderer = getattr(self.context.get('request'), 'accepted_renderer', None)
+        self.row = self.compile()
+
+    @classmethod
+    def values(cls, queryset):
+        # Named, so KeysetPagination reads its cursor off rows as off instances.
+        return queryset.values_list(*cls.columns, named=True)
+
+    def money(self, name):
+        """The formatter of ``serializer_class``'s MoneyField ``name``."""
+        return declared_fields(self.serializer_class)[name].formatter(self.renderer)
+
+    def compile(self):
+        """The function that turns one row into its dict."""
+        raise NotImplementedError
+
+    def related(self, rows):
+        """The queryset of other rows ``serialize`` needs, or None."""
+        return None
+
+    def serialize(self, rows, related):
+        return list(map(self.row, rows))
+
+    @property
+    def data(self):
+        rows = list(self.rows)
+        related = self.related(rows)
+        return self.serialize(rows, None if related is None else list(related))
+
+    async def adata(self):
+        rows = list(self.rows)
+        related = self.related(rows)
+        return self.serialize(rows, None if related is None else [row async for row in related])
+
+
+class MenuItemRowSerializer(RowSerializer):
+    serializer_class = MenuItemSerializer
+    columns = ('id', 'title', 'price', 'featured', 'category_id',
+               'category__slug', 'category__title', 'description')
+
+    def compile(self):
+        price = self.money('price')
+
+        def row(row):
+            id, title, amount, featured, category, slug, category_title, description = row
+            return {
+                'id': id,
+                'title': title,
+                'price': price(amount),
+                'featured': featured,
+                'category': category,
+                'category_details': {'id': category, 'slug': slug, 'title': category_title},
+                'description': description,
+            }
+        return row
+
+
+class CartRowSerializer(RowSerializer):
+    serializer_class = CartSerializer
+    columns = ('id', 'user_id', 'quantity', 'unit_price', *(
+        f'menuitem__{column}' for column in MenuItemRowSerializer.columns))
+
+    def compile(self):
+        unit_price = self.money('unit_price')
+        menuitem = MenuItemRowSerializer((), self.context).row
+
+        def row(row):
+            id, user, quantity, amount, *details = row
+            return {
+                'id': id,
+                'user': user,
+                'menuitem': details[0],
+                'menuitem_details': menuitem(details),
+                'quantity': quantity,
+                'unit_price': unit_price(amount),
+                # CartSerializer.calculate_price, which is not formatted.
+                'price': quantity * amount,
+            }
+        return row
+
+
+class OrderRowSerializer(RowSerializer):
+    serializer_class = OrderSerializer
+    columns = ('id', 'user_id', 'delivery_crew_id', 'status', 'total', 'date')
+    item_columns = ('order_id', 'id', 'menuitem_id', 'menuitem__title',
+                    'menuitem__category__title', 'quantity', 'unit_price', 'price')
+
+    def compile(self):
+        total = self.money('total')
+        date = declared_fields(OrderSerializer)['date'].to_representation
+
+        def row(row, items):
+            id, user, delivery_crew, status, amount, day = row
+            return {
+                'id': id,
+                'user': user,
+                'delivery_crew': delivery_crew,
+                'status': status,
+                'total': total(amount),
+                'date': date(day),
+                'items': items.get(id, []),
+            }
+        return row
+
+    def related(self, rows):
+        if not rows:
+            return None
+        # The rows views.ORDER_PLAN prefetches, in the same order.
+        return OrderItem.objects.filter(order_id__in=[row[0] for row in rows]).order_by(
+            'pk').values_list(*self.item_columns)
+
+    def serialize(self, rows, related):
+        unit_price = declared_fields(OrderItemSerializer)['unit_price'].formatter(self.renderer)
+        price = declared_fields(OrderItemSerializer)['price'].formatter(self.renderer)
+        items = defaultdict(list)
+        for order, id, menuitem, title, category, quantity, amount, subtotal in related or ():
+            items[order].append({
+                'id': id,
+                'menuitem': menuitem,
+                'menuitem_details': {'title': title, 'category': category},
+                'quantity': quantity,
+                'unit_price': unit_price(amount),
+                'price': price(subtotal),
+            })
+        row = self.row
+        return [row(order, items) for order in rows]
+
+
+class RowListMixin:
+    """
+    List through ``row_serializer_class``; everything else, writes
+    included, keeps ``serializer_class``.
+    """
+    row_serializer_class = None
+
+    def get_row_queryset(self, queryset):
+        return self.row_serializer_class.values(queryset)
+
+    def get_row_serializer(self, rows):
+        return self.row_serializer_class(rows, context=self.get_serializer_context())
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.get_row_queryset(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(self.get_row_serializer(page).data)
+        return Response(self.get_row_serializer(queryset).data)
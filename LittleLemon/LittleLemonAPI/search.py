@@ -0,0 +1,122 @@
+"""
+Menu item search.
+
+Each database vendor can have a backend that keeps a full-text index over
+the item title, category title and description. SQLite uses an FTS5
+table; vendors without a backend fall back to DRF's ``icontains`` search
+over ``search_fields``. ``MENU_SEARCH_BACKEND`` can name a backend class
+to use instead.
+"""
+import re
+
+from django.conf import settings
+from django.db import connections, router
+from django.db.models import BooleanField, FloatField
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+from rest_framework.filters import SearchFilter
+
+from .models import MenuItem, MenuItemSearchIndex
+
+MENU_ITEM_TABLE = MenuItem._meta.db_table
+CATEGORY_TABLE = MenuItem._meta.get_field('category').related_model._meta.db_table
+
+
+def search_tokens(terms):
+    return re.findall(r'\w+', ' '.join(terms).lower())
+
+
+class SearchBackend:
+    """No index: ``search`` returns None and the caller falls back."""
+
+    def index(self, ids, using=None):
+        pass
+
+    def remove(self, ids, using=None):
+        pass
+
+    def rebuild(self, using=None):
+        pass
+
+    def search(self, queryset, terms):
+        return None
+
+
+class SQLiteFTS5Backend(SearchBackend):
+    """
+    An FTS5 table keyed by menu item id. Every token of the query must
+    match, each as a prefix so partial words work for type-ahead, and
+    results are ranked by bm25 with title matches weighted highest.
+    Migration 0006 creates and fills the table; searches join it through
+    MenuItemSearchIndex.
+    """
+    table = MenuItemSearchIndex._meta.db_table
+    weights = (10.0, 2.0, 1.0)  # title, category, description
+    batch_size = 500
+
+    def _rows_sql(self, where=''):
+        return (f'INSERT INTO {self.table} (rowid, title, category, description) '
+                f'SELECT m.id, m.title, c.title, m.description '
+                f'FROM {MENU_ITEM_TABLE} m JOIN {CATEGORY_TABLE} c ON c.id = m.category_id {where}')
+
+    def _batches(self, ids):
+        ids = list(ids)
+        for start in range(0, len(ids), self.batch_size):
+            batch = ids[start:start + self.batch_size]
+            yield batch, ', '.join(['%s'] * len(batch))
+
+    def index(self, ids, using=None):
+        with connections[using or router.db_for_write(MenuItem)].cursor() as cursor:
+            for batch, placeholders in self._batches(ids):
+                cursor.execute(f'DELETE FROM {self.table} WHERE rowid IN ({placeholders})', batch)
+                cursor.execute(self._rows_sql(f'WHERE m.id IN ({placeholders})'), batch)
+
+    def remove(self, ids, using=None):
+        with connections[using or router.db_for_write(MenuItem)].cursor() as cursor:
+            for batch, placeholders in self._batches(ids):
+                cursor.execute(f'DELETE FROM {self.table} WHERE rowid IN ({placeholders})', batch)
+
+    def rebuild(self, using=None):
+        with connections[using or router.db_for_write(MenuItem)].cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table}')
+            cursor.execute(self._rows_sql())
+
+    def search(self, queryset, terms):
+        tokens = search_tokens(terms)
+        if not tokens:
+            return queryset
+        # Quoting each token keeps FTS5 operators in user input literal.
+        match = ' '.join(f'"{token}"*' for token in tokens)
+        weights = ', '.join(str(weight) for weight in self.weights)
+        # A join, so FTS5 evaluates the query once rather than per row.
+        return queryset.filter(search_index__isnull=False).filter(
+            RawSQL(f'"{self.table}" MATCH %s', [match], output_field=BooleanField())
+        ).annotate(search_rank=RawSQL(f'bm25("{self.table}", {weights})', (),
+                                      output_field=FloatField()))
+
+BACKENDS = {'sqlite': SQLiteFTS5Backend}
+
+
+def search_backend(using=None):
+    if getattr(settings, 'MENU_SEARCH_BACKEND', None):
+        return import_string(settings.MENU_SEARCH_BACKEND)()
+    vendor = connections[using or router.db_for_read(MenuItem)].vendor
+    return BACKENDS.get(vendor, SearchBackend)()
+
+
+class MenuSearchFilter(SearchFilter):
+    """
+    ``?search=`` through the full-text index when the database has one,
+    best match first. Placed before OrderingFilter so ``?ordering=`` wins.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if not terms:
+            return queryset
+        results = search_backend(queryset.db).search(queryset, terms)
+        if results is None:
+            return super().filter_queryset(request, queryset, view)
+        if 'search_rank' in results.query.annotations:
+            results = results.order_by('search_rank', 'id')
+        return results
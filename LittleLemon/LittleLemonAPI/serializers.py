@@ -1,6 +1,54 @@
+import decimal
+import functools
+from decimal import Decimal
+
 from rest_framework import serializers
+from rest_framework.settings import api_settings
 from .models import Category, MenuItem, Cart, Order, OrderItem
 from django.contrib.auth.models import User
+from django.db import models
+
+
+class MoneyField(serializers.DecimalField):
+    """
+    A string in JSON as usual. Renderers with a ``money`` method, which
+    encode decimals exactly (see renderers.py), get it applied to the
+    normalized Decimal instead.
+    """
+
+    def to_representation(self, value):
+        renderer = getattr(self.context.get('request'), 'accepted_renderer', None)
+        money = getattr(renderer, 'money', None)
+        if value is None or money is None:
+            return super().to_representation(value)
+        if not isinstance(value, Decimal):
+            value = Decimal(str(value).strip())
+        return money(self.quantize(value).normalize())
+
+    def formatter(self, renderer=None):
+        """
+        ``to_representation`` of non-null Decimals for ``renderer``, with the
+        field's settings worked out once rather than for every value.
+        """
+        context = decimal.getcontext().copy()
+        if self.max_digits is not None:
+            context.prec = self.max_digits
+        exponent = Decimal('.1') ** self.decimal_places
+        rounding = self.rounding
+        money = getattr(renderer, 'money', None)
+        if money is not None:
+            return lambda value: money(value.quantize(exponent, rounding, context).normalize())
+        if self.localize or self.normalize_output or not getattr(
+                self, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING):
+            return functools.partial(serializers.DecimalField.to_representation, self)
+        return lambda value: f'{value.quantize(exponent, rounding, context):f}'
+
+
+class MoneyModelSerializer(serializers.ModelSerializer):
+    serializer_field_mapping = {
+        **serializers.ModelSerializer.serializer_field_mapping,
+        models.DecimalField: MoneyField,
+    }
 
 
 class ManagerGetSerializer(serializers.ModelSerializer):
@@ -41,7 +89,7 @@ class CategorySerializer (serializers.ModelSerializer):
         fields = ['id', 'slug', 'title']
 
 
-class MenuItemSerializer(serializers.ModelSerializer):
+class MenuItemSerializer(MoneyModelSerializer):
     category = serializers.PrimaryKeyRelatedField(
         queryset=Category.objects.all())
     category_details = CategorySerializer(source='category', read_only=True)
@@ -49,13 +97,13 @@ class MenuItemSerializer(serializers.ModelSerializer):
     class Meta:
         model = MenuItem
         fields = ['id', 'title', 'price', 'featured',
-                  'category', 'category_details']
+                  'category', 'category_details', 'description']
         depth = 1
 
 
-class CartSerializer(serializers.ModelSerializer):
+class CartSerializer(MoneyModelSerializer):
     price = serializers.SerializerMethodField(method_name='calculate_price')
-    unit_price = serializers.DecimalField(
+    unit_price = MoneyField(
         max_digits=6, decimal_places=2, read_only=True)
     menuitem = serializers.PrimaryKeyRelatedField(
         queryset=MenuItem.objects.all())
@@ -77,7 +125,53 @@ class CartSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 
-class OrderItemSerializer(serializers.ModelSerializer):
+class CartBulkSerializer(serializers.ListSerializer):
+    def validate(self, attrs):
+        # Merge repeated menu items, then resolve them all in one query.
+        quantities = {}
+        for entry in attrs:
+            quantities[entry['menuitem']] = (
+                quantities.get(entry['menuitem'], 0) + entry['quantity'])
+        # Each entry was checked alone; their sum must fit the column too.
+        limit = self.child.fields['quantity'].max_value
+        too_many = sorted(pk for pk, quantity in quantities.items() if quantity > limit)
+        if too_many:
+            raise serializers.ValidationError(
+                f"Menu items {too_many} add up to more than {limit}.")
+        menuitems = MenuItem.objects.only('price').in_bulk(quantities)
+        missing = sorted(set(quantities) - set(menuitems))
+        if missing:
+            raise serializers.ValidationError(
+                f"Menu items {missing} do not exist.")
+        return [
+            {'menuitem': menuitems[pk], 'quantity': quantity}
+            for pk, quantity in quantities.items()
+        ]
+
+    def create(self, validated_data):
+        return Cart.objects.bulk_create(
+            [
+                Cart(user=entry['user'], menuitem=entry['menuitem'],
+                     quantity=entry['quantity'],
+                     unit_price=entry['menuitem'].price,
+                     price=entry['quantity'] * entry['menuitem'].price)
+                for entry in validated_data
+            ],
+            update_conflicts=True,
+            unique_fields=['menuitem', 'user'],
+            update_fields=['quantity', 'unit_price', 'price'],
+        )
+
+
+class CartEntrySerializer(serializers.Serializer):
+    menuitem = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1, max_value=32767)
+
+    class Meta:
+        list_serializer_class = CartBulkSerializer
+
+
+class OrderItemSerializer(MoneyModelSerializer):
     menuitem_details = serializers.SerializerMethodField()
 
     class Meta:
@@ -86,10 +180,11 @@ class OrderItemSerializer(serializers.ModelSerializer):
                   'quantity', 'unit_price', 'price']
 
     def get_menuitem_details(self, obj):
-        return {"name": obj.menuitem.name, "description": obj.menuitem.description}
+        # Relies on the view selecting menuitem__category with the items.
+        return {"title": obj.menuitem.title, "category": obj.menuitem.category.title}
 
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(MoneyModelSerializer):
     items = OrderItemSerializer(
         many=True, read_only=True, source='orderitem_set')
 
@@ -98,3 +193,40 @@ class OrderSerializer(serializers.ModelSerializer):
         fields = ['id', 'user', 'delivery_crew',
                   'status', 'total', 'date', 'items']
         read_only_fields = ['user', 'total', 'date']
+
+
+class ReportQuerySerializer(serializers.Serializer):
+    period = serializers.ChoiceField(
+        choices=['day', 'week', 'month'], default='day')
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+    status = serializers.BooleanField(required=False, allow_null=True, default=None)
+    limit = serializers.IntegerField(min_value=1, max_value=100, default=10)
+
+
+class MenuChangesQuerySerializer(serializers.Serializer):
+    since = serializers.IntegerField(min_value=0, required=False)
+
+
+class ExportQuerySerializer(serializers.Serializer):
+    output = serializers.ChoiceField(choices=['csv', 'ndjson'], default='csv')
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+
+
+class RevenueReportSerializer(serializers.Serializer):
+    period = serializers.DateField()
+    orders = serializers.IntegerField()
+    revenue = MoneyField(max_digits=12, decimal_places=2)
+
+
+class DeliveryCrewReportSerializer(RevenueReportSerializer):
+    delivery_crew = serializers.IntegerField(allow_null=True)
+
+
+class TopMenuItemReportSerializer(serializers.Serializer):
+    period = serializers.DateField()
+    menuitem = serializers.IntegerField()
+    title = serializers.CharField()
+    quantity = serializers.IntegerField()
+    revenue = MoneyField(max_digits=12, decimal_places=2)
@@ -0,0 +1,193 @@
+from django.contrib.auth.models import User
+from rest_framework.authtoken.models import Token
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .authentication import token_cache
+from .catalogue import bump_catalogue_version
+from .events import publish_order_events
+from .jobs import ORDER_CREATED, ORDER_STATUS_CHANGED, fire
+from .menu_sync import record_menu_changes
+from .models import Category, MenuChange, MenuItem, Order, OrderItem
+from .roles import invalidate_roles
+from .search import search_backend
+from .rollups import (
+    ITEM_FIELDS, ITEM_ROLLUP_FIELDS, ROLLUP_FIELDS, defer_order, move_order, move_order_items,
+    record_order, record_order_items, replace_order_item, rollup_values,
+)
+
+MENU_CHANGE_KINDS = {MenuItem: MenuChange.MENU_ITEM, Category: MenuChange.CATEGORY}
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def group_membership_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and reverse:
+        # The members are gone by post_clear, so collect them beforehand.
+        instance._cleared_user_ids = list(
+            instance.user_set.values_list('pk', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if not reverse:
+        user_ids = [instance.pk]
+    elif action == 'post_clear':
+        user_ids = getattr(instance, '_cleared_user_ids', [])
+    else:
+        user_ids = pk_set
+    invalidate_roles(user_ids)
+    token_cache.discard_users(user_ids)
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    # djoser's token/logout/ deletes the token.
+    token_cache.discard([instance.key])
+
+
+# User fields that decide whether, and as whom, a cached token authenticates.
+CREDENTIAL_FIELDS = ('is_active', 'password', 'is_staff', 'is_superuser')
+
+
+def credentials(user):
+    # From __dict__, so deferred fields are not loaded for this.
+    return tuple(user.__dict__.get(field) for field in CREDENTIAL_FIELDS)
+
+
+@receiver(post_init, sender=User)
+def remember_credentials(sender, instance, **kwargs):
+    instance._loaded_credentials = credentials(instance)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, **kwargs):
+    # Covers deactivation and password changes; other saves, like the
+    # last_login update of every login, leave the cached tokens alone.
+    current = credentials(instance)
+    if not created and current != instance._loaded_credentials:
+        token_cache.discard_users([instance.pk])
+    instance._loaded_credentials = current
+
+
+@receiver(post_save, sender=MenuItem)
+@receiver(post_save, sender=Category)
+def record_menu_save(sender, instance, **kwargs):
+    # Before the cache version bump, so a cached delta never lags a change.
+    record_menu_changes(MENU_CHANGE_KINDS[sender], [instance.pk])
+
+
+@receiver(post_delete, sender=MenuItem)
+@receiver(post_delete, sender=Category)
+def record_menu_delete(sender, instance, **kwargs):
+    record_menu_changes(MENU_CHANGE_KINDS[sender], [instance.pk], deleted=True)
+
+
+@receiver(post_save, sender=MenuItem)
+@receiver(post_delete, sender=MenuItem)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def catalogue_changed(sender, **kwargs):
+    bump_catalogue_version()
+
+
+@receiver(post_save, sender=MenuItem)
+def menu_item_saved(sender, instance, **kwargs):
+    search_backend().index([instance.pk])
+
+
+@receiver(post_delete, sender=MenuItem)
+def menu_item_deleted(sender, instance, **kwargs):
+    search_backend().remove([instance.pk])
+
+
+@receiver(post_save, sender=Category)
+def category_saved(sender, instance, created, **kwargs):
+    # Items carry their category title in the index.
+    if not created:
+        search_backend().index(instance.menuitem_set.values_list('pk', flat=True))
+
+
+@receiver(pre_save, sender=Order)
+def remember_order_rollup(sender, instance, **kwargs):
+    # Also read by publish_order_changes and fire_order_hooks. Orders remember
+    # the values they were loaded with, so this reads nothing from the database.
+    instance._rollup_previous = (
+        None if instance._state.adding else instance.loaded_values(ROLLUP_FIELDS))
+
+
+def order_items(order):
+    """The ``ITEM_FIELDS`` of ``order``'s items, from its prefetched ones if any."""
+    if 'orderitem_set' in getattr(order, '_prefetched_objects_cache', {}):
+        return [rollup_values(item, ITEM_FIELDS) for item in order.orderitem_set.all()]
+    return order.orderitem_set.values_list(*ITEM_FIELDS)
+
+
+@receiver(post_save, sender=Order)
+def update_order_rollup(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_rollup_previous', None)
+    current = rollup_values(instance)
+    if previous == current:
+        return
+    if previous is None:
+        defer_order(current)
+    else:
+        move_order(previous, current)
+        previous = dict(zip(ROLLUP_FIELDS, previous))
+        previous = tuple(previous[field] for field in ITEM_ROLLUP_FIELDS)
+        current = rollup_values(instance, ITEM_ROLLUP_FIELDS)
+        if previous != current:
+            move_order_items(previous, current, order_items(instance))
+
+
+@receiver(post_save, sender=Order)
+def publish_order_changes(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_rollup_previous', None)
+    if previous is not None:
+        previous = dict(zip(ROLLUP_FIELDS, previous))
+    publish_order_events(instance, previous)
+
+
+@receiver(post_save, sender=Order)
+def fire_order_hooks(sender, instance, created, **kwargs):
+    # The jobs commit or roll back with the order.
+    if created:
+        fire(ORDER_CREATED, order=instance.pk)
+        return
+    previous = getattr(instance, '_rollup_previous', None)
+    if previous is not None and instance.status != previous[ROLLUP_FIELDS.index('status')]:
+        fire(ORDER_STATUS_CHANGED, order=instance.pk, status=instance.status)
+
+
+@receiver(pre_delete, sender=Order)
+def remove_order_rollup(sender, instance, **kwargs):
+    record_order(rollup_values(instance), sign=-1)
+    # All at once here; its items' own post_delete leaves them alone.
+    record_order_items(rollup_values(instance, ITEM_ROLLUP_FIELDS), order_items(instance), sign=-1)
+
+
+def item_rollup(item, values):
+    return rollup_values(item.order, ITEM_ROLLUP_FIELDS), values
+
+
+@receiver(post_save, sender=OrderItem)
+def update_item_rollup(sender, instance, created, **kwargs):
+    # checkout() bulk creates its items and queues their rollups itself.
+    current = rollup_values(instance, ITEM_FIELDS)
+    if created:
+        replace_order_item(None, item_rollup(instance, current))
+        return
+    previous_order, *previous = instance.loaded_values(('order_id', *ITEM_FIELDS))
+    if previous_order == instance.order_id:
+        if tuple(previous) == current:
+            return
+        previous = item_rollup(instance, previous)
+    else:
+        previous = Order.objects.values_list(*ITEM_ROLLUP_FIELDS).get(pk=previous_order), previous
+    replace_order_item(previous, item_rollup(instance, current))
+
+
+@receiver(post_delete, sender=OrderItem)
+def remove_item_rollup(sender, instance, origin, **kwargs):
+    if isinstance(origin, Order) or getattr(origin, 'model', None) is Order:
+        return
+    record_order_items(*item_rollup(instance, [rollup_values(instance, ITEM_FIELDS)]), sign=-1)
@@ -1,3 +1,1512 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import io
+import json
+import time
+import zlib
+from datetime import date, timedelta
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User, Group
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import IntegrityError, connection, connections
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models import Prefetch, QuerySet
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+
+from .models import (
+    Category, MenuItem, Cart, Order, OrderItem, Job, DailyMenuItemRollup, DailyOrderRollup, MenuChange,
+    ThrottleCounter,
+)
+from . import benchmark
+from .authentication import TokenCache, token_cache
+from .backfill import FINAL_MIGRATION, backfill_order_items
+from .catalogue import VERSION_KEY, bump_catalogue_version
+from .compression import CODINGS, compress, negotiate
+from .db_routers import REPLICA
+from .events import RESET, crew_channel, customer_channel, get_broker
+from .instrumentation import RequestTimings, histograms
+from .menu_import import MenuImport
+from .jobs import HOOKS, ORDER_CREATED, ORDER_STATUS_CHANGED, claim, enqueue, task, work
+from .pagination import MenuItemKeysetPagination
+from .renderers import (
+    CBORRenderer, MessagePackRenderer, cbor2, decode_decimal_ext, encode_decimal_ext, msgpack,
+    msgpack_ext_hook,
+)
+from .row_serializers import CartRowSerializer, MenuItemRowSerializer, OrderRowSerializer
+from .serializers import CartSerializer, MenuItemSerializer, OrderSerializer
+from .throttling import (
+    CacheCounters, DatabaseCounters, ScopedSlidingWindowThrottle, UserSlidingWindowThrottle,
+    get_counters,
+)
+from .roles import MANAGER, DELIVERY_CREW, CUSTOMER, get_roles
+from .search import search_backend
+
+
+# Throttles keep the shipped store, counters in the shared cache, so query
+# counts measure what production runs; ThrottleStoreTests cover the
+# database store.
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class APITestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        caches['shared'].clear()
+        token_cache.clear()
+        get_broker.cache_clear()
+        get_counters.cache_clear()
+        self.category = Category.objects.create(slug='mains', title='Mains')
+
+    def create_user(self, username, *roles):
+        user = User.objects.create_user(username, password='lemon@123!')
+        for role in roles:
+            Group.objects.get_or_create(name=role)[0].user_set.add(user)
+        return user
+
+    def authenticate(self, user):
+        token, _ = Token.objects.get_or_create(user=user)
+        self.client.defaults['HTTP_AUTHORIZATION'] = f'Token {token.key}'
+
+    def create_menu_items(self, count, featured=False):
+        return [
+            MenuItem.objects.create(
+                title=f'Dish {MenuItem.objects.count()}', price='9.50',
+                featured=featured, category=self.category)
+            for _ in range(count)
+        ]
+
+
+# Token and role lookups are left uncached so every request pays for them
+# exactly once.
+@override_settings(ROLE_CACHE_TIMEOUT=0, TOKEN_CACHE_TIMEOUT=0)
+class QueryCountTests(APITestCase):
+    """
+    Every endpoint must run a fixed number of queries whatever the number of
+    rows it lists: token lookup, role lookup where the view checks roles, then
+    the view's own plan.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.manager = self.create_user('adrian', MANAGER)
+        self.customer = self.create_user('sana', CUSTOMER)
+
+    def assertQueriesStable(self, url, queries, grow):
+        with self.assertNumQueries(queries):
+            self.assertEqual(self.client.get(url).status_code, 200)
+        grow()
+        with self.assertNumQueries(queries):
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_menu_items(self):
+        self.authenticate(self.customer)
+        self.create_menu_items(1)
+        self.assertQueriesStable('/api/menu-items/', 3,
+                                 lambda: self.create_menu_items(4))
+
+    def test_single_menu_item(self):
+        self.authenticate(self.customer)
+        item = self.create_menu_items(1)[0]
+        with self.assertNumQueries(2):
+            self.client.get(f'/api/menu-items/{item.pk}/')
+
+    def test_cart(self):
+        self.authenticate(self.customer)
+
+        def add_to_cart():
+            for item in self.create_menu_items(4):
+                Cart.objects.create(user=self.customer, menuitem=item,
+                                    quantity=1, unit_price=item.price,
+                                    price=item.price)
+
+        add_to_cart()
+        self.assertQueriesStable('/api/cart/menu-items/', 4, add_to_cart)
+
+    def test_managers(self):
+        self.authenticate(self.manager)
+        self.assertQueriesStable(
+            '/api/groups/manager/users/', 4,
+            lambda: [self.create_user(f'manager{i}', MANAGER) for i in range(4)])
+
+    def test_delivery_crew(self):
+        self.authenticate(self.manager)
+        self.create_user('mario', DELIVERY_CREW)
+        self.assertQueriesStable(
+            '/api/groups/delivery-crew/users/', 4,
+            lambda: [self.create_user(f'crew{i}', DELIVERY_CREW) for i in range(4)])
+
+    def test_adding_to_a_group(self):
+        self.authenticate(self.manager)
+        for i in range(2):
+            self.create_user(f'crew{i}', DELIVERY_CREW)
+
+        def add(url, username, queries):
+            self.create_user(username)
+            with self.assertNumQueries(queries):
+                self.assertEqual(self.client.post(url, {'username': username}).status_code, 201)
+
+        # Token, roles, username check, user, group, membership check, the
+        # insert with its existing-rows check, then the token revocation
+        # lookup, whatever the group's size.
+        add('/api/groups/delivery-crew/users/', 'mario', 9)
+        self.create_user('crew2', DELIVERY_CREW)
+        add('/api/groups/delivery-crew/users/', 'luigi', 9)
+        add('/api/groups/manager/users/', 'sofia', 9)
+
+    def test_orders_without_history(self):
+        self.authenticate(self.customer)
+        with self.assertNumQueries(3):
+            self.client.get('/api/orders/')
+
+    def test_orders_with_items(self):
+        self.authenticate(self.customer)
+
+        def place_orders():
+            for item in self.create_menu_items(2):
+                order = Order.objects.create(user=self.customer, total='9.50', date=date(2024, 5, 1))
+                OrderItem.objects.create(order=order, menuitem=item, quantity=1,
+                                         unit_price='9.50', price='9.50')
+
+        place_orders()
+        # Token, roles, count, orders, their items with menu item and category.
+        self.assertQueriesStable('/api/orders/', 5, place_orders)
+
+    def test_checkout(self):
+        self.authenticate(self.customer)
+
+        def checkout(count, key, queries):
+            for item in self.create_menu_items(count):
+                Cart.objects.create(user=self.customer, menuitem=item, quantity=1,
+                                    unit_price=item.price, price=item.price)
+            with self.assertNumQueries(queries):
+                response = self.client.post('/api/orders/', {}, headers={'Idempotency-Key': key})
+            self.assertEqual(response.status_code, 201)
+
+        # Whatever the number of items, the rollups are left to two queued jobs.
+        checkout(2, 'abc', 13)
+        checkout(5, 'def', 13)
+        # A replay only looks the order up and serializes it.
+        with self.assertNumQueries(4):
+            self.assertEqual(self.client.post(
+                '/api/orders/', {}, headers={'Idempotency-Key': 'abc'}).status_code, 200)
+
+
+    def test_updating_an_order(self):
+        self.authenticate(self.manager)
+
+        def update(count, day, queries):
+            order = Order.objects.create(user=self.customer, total='9.50', date=date(2024, 5, day))
+            for item in self.create_menu_items(count):
+                OrderItem.objects.create(order=order, menuitem=item, quantity=1,
+                                         unit_price='9.50', price='9.50')
+            with self.assertNumQueries(queries):
+                response = self.client.patch(f'/api/orders/{order.pk}/', {'status': True},
+                                             content_type='application/json')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.json()['items']), count)
+
+        # Token, roles, the order and its items, the update, a lookup, an
+        # insert and an update per rollup table, then the order read back.
+        # Each day's delivered rollup rows are new, so both insert.
+        update(2, 1, 13)
+        update(5, 2, 13)
+
+
+class GroupManagementTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.manager = self.create_user('adrian', MANAGER)
+        self.newcomer = self.create_user('sana', CUSTOMER)
+
+    def test_new_managers_get_the_role_at_once(self):
+        self.authenticate(self.newcomer)
+        # Caches the newcomer's roles.
+        self.assertEqual(self.client.get('/api/groups/manager/users/').status_code, 403)
+
+        self.authenticate(self.manager)
+        response = self.client.post('/api/groups/manager/users/', {'username': 'sana'})
+        self.assertEqual(response.status_code, 201)
+        response = self.client.post('/api/groups/manager/users/', {'username': 'sana'})
+        self.assertEqual(response.status_code, 200)
+
+        self.assertTrue(get_roles(User.objects.get(pk=self.newcomer.pk)).is_manager)
+        self.authenticate(self.newcomer)
+        self.assertEqual(self.client.get('/api/groups/manager/users/').status_code, 200)
+
+    def test_new_delivery_crew_get_the_role_at_once(self):
+        order = Order.objects.create(user=self.manager, total='9.50', date=date(2024, 5, 1),
+                                     delivery_crew=self.newcomer)
+        self.authenticate(self.newcomer)
+        self.assertEqual(self.client.patch(
+            f'/api/orders/{order.pk}/', {'status': True}, content_type='application/json').status_code, 404)
+
+        self.authenticate(self.manager)
+        response = self.client.post('/api/groups/delivery-crew/users/', {'username': 'sana'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([user['username'] for user in
+                          self.client.get('/api/groups/delivery-crew/users/').json()['results']],
+                         ['sana'])
+
+        self.assertTrue(get_roles(User.objects.get(pk=self.newcomer.pk)).is_delivery_crew)
+        self.authenticate(self.newcomer)
+        self.assertEqual(self.client.patch(
+            f'/api/orders/{order.pk}/', {'status': True}, content_type='application/json').status_code, 200)
+
+    def test_removing_from_a_group(self):
+        self.authenticate(self.manager)
+        self.client.post('/api/groups/delivery-crew/users/', {'username': 'sana'})
+        url = f'/api/groups/delivery-crew/users/{self.newcomer.pk}/'
+        self.assertEqual(self.client.delete(url).status_code, 200)
+        self.assertEqual(self.client.delete(url).status_code, 400)
+        self.assertFalse(get_roles(User.objects.get(pk=self.newcomer.pk)).is_delivery_crew)
+
+    def test_roles_are_revoked_in_the_cache_every_worker_reads(self):
+        key = f'LittleLemonAPI:roles:{self.manager.pk}'
+        self.authenticate(self.manager)
+        self.assertEqual(self.client.get('/api/groups/manager/users/').status_code, 200)
+        self.assertEqual(caches['shared'].get(key), [MANAGER])
+
+        self.authenticate(self.create_user('sofia', MANAGER))
+        self.assertEqual(self.client.delete(f'/api/groups/manager/users/{self.manager.pk}/').status_code, 200)
+        self.assertIsNone(caches['shared'].get(key))
+        # What another worker's local cache holds makes no difference.
+        cache.clear()
+        self.authenticate(self.manager)
+        self.assertEqual(self.client.get('/api/groups/manager/users/').status_code, 403)
+
+
+class CatalogueCacheTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.authenticate(self.create_user('sana', CUSTOMER))
+        self.create_menu_items(2)
+
+    def test_repeat_requests_are_served_from_cache(self):
+        first = self.client.get('/api/menu-items/')
+        # With the shipped settings token, roles, throttle counters and page
+        # all come from caches.
+        self.assertIsInstance(get_counters(), CacheCounters)
+        with self.assertNumQueries(0):
+            second = self.client.get('/api/menu-items/')
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(first['ETag'], second['ETag'])
+
+    def test_if_none_match_returns_not_modified(self):
+        etag = self.client.get('/api/menu-items/')['ETag']
+        response = self.client.get('/api/menu-items/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+    def test_saving_a_menu_item_invalidates_the_cache(self):
+        etag = self.client.get('/api/menu-items/')['ETag']
+        self.create_menu_items(1)
+        response = self.client.get('/api/menu-items/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_a_change_made_by_another_worker_invalidates_the_cache(self):
+        etag = self.client.get('/api/menu-items/')['ETag']
+        # Another worker, with a local cache of its own, saves the change.
+        with mock.patch('LittleLemonAPI.catalogue.cache', LocMemCache('other-worker', {})):
+            self.create_menu_items(1)
+        response = self.client.get('/api/menu-items/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['count'], 3)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ReplicaRoutingTests(TransactionTestCase):
+    """
+    A second connection to the test database stands in for the replica, as
+    settings.py sets one up under test. Rows must be committed for it to
+    see them, hence TransactionTestCase.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Added after the test runner has set up and checked its databases.
+        connections.settings[REPLICA] = {
+            **connections['default'].settings_dict, 'TEST': {'MIRROR': 'default'}}
+        cls.databases = {'default', REPLICA}
+
+    @classmethod
+    def tearDownClass(cls):
+        connections[REPLICA].close()
+        del connections[REPLICA]
+        del connections.settings[REPLICA]
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        caches['shared'].clear()
+        token_cache.clear()
+        get_counters.cache_clear()
+        category = Category.objects.create(slug='mains', title='Mains')
+        MenuItem.objects.create(title='Dish', price='9.50', featured=False, category=category)
+        self.user = User.objects.create_superuser('adrian', password='lemon@123!')
+        Group.objects.create(name=MANAGER).user_set.add(self.user)
+        self.client.defaults['HTTP_AUTHORIZATION'] = f'Token {Token.objects.create(user=self.user).key}'
+
+    def queries(self, *args, **kwargs):
+        """
+        Send ``client.generic(*args, **kwargs)``; the LittleLemonAPI tables
+        each side then queried.
+        """
+        with CaptureQueriesContext(connections['default']) as primary, \
+                CaptureQueriesContext(connections[REPLICA]) as replica:
+            response = self.client.generic(*args, **kwargs)
+        self.assertLess(response.status_code, 300, response.content)
+        return [[query['sql'] for query in side if '"LittleLemonAPI_' in query['sql']]
+                for side in (primary, replica)]
+
+    @override_settings(REPLICA_MAX_LAG=0)
+    def test_safe_requests_read_from_the_replica(self):
+        for url in ('/api/menu-items/', '/api/reports/revenue/'):
+            primary, replica = self.queries('GET', url)
+            self.assertEqual(primary, [])
+            self.assertNotEqual(replica, [])
+
+    @override_settings(REPLICA_MAX_LAG=0)
+    def test_writes_stay_on_the_primary(self):
+        body = json.dumps({'title': 'Soup', 'price': '4.50', 'featured': False,
+                           'category': Category.objects.get().pk})
+        primary, replica = self.queries('POST', '/api/menu-items/', body,
+                                        content_type='application/json')
+        self.assertNotEqual(primary, [])
+        self.assertEqual(replica, [])
+
+    def test_cache_misses_read_the_primary_while_the_replica_may_lag(self):
+        self.client.get('/api/menu-items/')
+        # A replica behind this save would cache the old price under the new version.
+        MenuItem.objects.update(price='8.00')
+        bump_catalogue_version()
+        primary, replica = self.queries('GET', '/api/menu-items/')
+        self.assertNotEqual(primary, [])
+        self.assertEqual(replica, [])
+
+        # Once the replica has had time to catch up, misses go back to it.
+        caches['shared'].set(VERSION_KEY, time.time_ns() - (settings.REPLICA_MAX_LAG + 1) * 10 ** 9, None)
+        primary, replica = self.queries('GET', '/api/menu-items/')
+        self.assertEqual(primary, [])
+        self.assertNotEqual(replica, [])
+
+
+class BinaryFormatTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.customer = self.create_user('sana', CUSTOMER)
+        self.authenticate(self.customer)
+        self.items = self.create_menu_items(2)
+
+    def test_decimal_extension_round_trips(self):
+        for value in ['9.5', '12', '-3.25', '0', '0.01', '123456789.12']:
+            encoded = encode_decimal_ext(Decimal(value))
+            self.assertIn(len(encoded), (1, 2, 4, 8, 16))
+            self.assertEqual(decode_decimal_ext(encoded), Decimal(value))
+
+    @skipUnless(msgpack, 'msgpack is not installed')
+    def test_menu_items_as_messagepack(self):
+        json_page = self.client.get('/api/menu-items/').json()
+        response = self.client.get('/api/menu-items/', HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        page = msgpack.unpackb(response.content, ext_hook=msgpack_ext_hook)
+        self.assertEqual(page['results'][0]['price'], Decimal('9.5'))
+        self.assertEqual(json_page['results'][0]['price'], '9.50')
+        page['results'][0]['price'] = '9.50'
+        self.assertEqual(page['results'][0], json_page['results'][0])
+
+        # Cached with its own ETag, apart from the JSON page.
+        with self.assertNumQueries(0):
+            again = self.client.get('/api/menu-items/', HTTP_ACCEPT='application/msgpack',
+                                    HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(again.status_code, 304)
+
+    @skipUnless(cbor2, 'cbor2 is not installed')
+    def test_orders_as_cbor(self):
+        order = Order.objects.create(user=self.customer, total='19.00', date=date(2024, 5, 1))
+        OrderItem.objects.create(order=order, menuitem=self.items[0], quantity=2,
+                                 unit_price='9.50', price='19.00')
+        response = self.client.get('/api/orders/', HTTP_ACCEPT='application/cbor')
+        order = cbor2.loads(response.content)['results'][0]
+        self.assertEqual(order['total'], Decimal('19'))
+        self.assertEqual(order['items'][0]['unit_price'], Decimal('9.5'))
+
+    @skipUnless(msgpack, 'msgpack is not installed')
+    def test_messagepack_requests(self):
+        self.authenticate(User.objects.create_superuser('admin', password='lemon@123!'))
+        body = msgpack.packb({'title': 'Pie', 'price': Decimal('4.25'), 'featured': False,
+                              'category': self.category.pk},
+                             default=lambda value: msgpack.ExtType(1, encode_decimal_ext(value)))
+        response = self.client.post('/api/menu-items/', body, content_type='application/msgpack')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(MenuItem.objects.get(title='Pie').price, Decimal('4.25'))
+
+        response = self.client.post('/api/menu-items/', b'\xc1', content_type='application/msgpack')
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(COMPRESSION_MIN_SIZE=200)
+class CompressionTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.manager = self.create_user('adrian', MANAGER)
+        self.authenticate(self.manager)
+        self.create_menu_items(5)
+
+    def test_negotiation(self):
+        preferred = next(iter(CODINGS))
+        self.assertEqual(negotiate('gzip, deflate'), 'gzip')
+        self.assertEqual(negotiate('deflate;q=1, gzip;q=0.5'), 'deflate')
+        self.assertEqual(negotiate('br, *;q=0.1'), preferred)
+        self.assertEqual(negotiate('gzip;q=0, deflate;q=0'), None)
+        self.assertEqual(negotiate('identity, br'), None)
+        self.assertEqual(negotiate(''), None)
+
+    def test_menu_page_is_compressed_and_cached_compressed(self):
+        plain = self.client.get('/api/menu-items/')
+        self.assertFalse(plain.has_header('Content-Encoding'))
+        self.assertIn('Accept-Encoding', plain['Vary'])
+
+        with mock.patch('LittleLemonAPI.compression.compress', wraps=compress) as compressing:
+            first = self.client.get('/api/menu-items/', HTTP_ACCEPT_ENCODING='gzip')
+            with self.assertNumQueries(0):
+                second = self.client.get('/api/menu-items/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(compressing.call_count, 1)
+        self.assertEqual(first['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(first.content), plain.content)
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second['Content-Type'], plain['Content-Type'])
+        self.assertEqual(second['ETag'], 'W/' + plain['ETag'])
+
+        # Either form of the ETag revalidates.
+        for etag in (plain['ETag'], second['ETag']):
+            response = self.client.get('/api/menu-items/', HTTP_ACCEPT_ENCODING='gzip',
+                                       HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+
+        deflated = self.client.get('/api/menu-items/', HTTP_ACCEPT_ENCODING='deflate')
+        self.assertEqual(zlib.decompress(deflated.content), plain.content)
+
+    def test_small_and_html_responses_are_left_alone(self):
+        with self.settings(COMPRESSION_MIN_SIZE=10 ** 6):
+            response = self.client.get('/api/menu-items/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        response = self.client.get('/api/menu-items/', HTTP_ACCEPT='text/html',
+                                   HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_exports_are_compressed_as_they_stream(self):
+        order = Order.objects.create(user=self.manager, total='9.50', date=date(2024, 5, 1))
+        for item in MenuItem.objects.all():
+            OrderItem.objects.create(order=order, menuitem=item, quantity=1,
+                                     unit_price='9.50', price='9.50')
+        plain = b''.join(self.client.get('/api/orders/export/?output=csv').streaming_content)
+        response = self.client.get('/api/orders/export/?output=csv', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), plain)
+
+    async def test_event_stream_is_flushed_per_event(self):
+        response = await self.async_client.get('/api/orders/events/', headers={
+            'Authorization': self.client.defaults['HTTP_AUTHORIZATION'],
+            'Accept-Encoding': 'deflate'})
+        self.assertEqual(response['Content-Encoding'], 'deflate')
+        decompressor = zlib.decompressobj()
+        stream = aiter(response.streaming_content)
+        self.assertTrue(decompressor.decompress(await anext(stream)).startswith(b'retry:'))
+        await stream.aclose()
+
+    async def test_async_menu_page_is_cached_compressed(self):
+        headers = {'Authorization': self.client.defaults['HTTP_AUTHORIZATION'],
+                   'Accept-Encoding': 'gzip'}
+        first = await self.async_client.get('/api/async/menu-items/', headers=headers)
+        with mock.patch('LittleLemonAPI.compression.compress') as compressing:
+            second = await self.async_client.get('/api/async/menu-items/', headers=headers)
+        compressing.assert_not_called()
+        self.assertEqual(second['Content-Encoding'], 'gzip')
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(json.loads(gzip.decompress(second.content))['count'], 5)
+
+
+class RowSerializerTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.customer = self.create_user('sana', CUSTOMER)
+        self.crew = self.create_user('mario', DELIVERY_CREW)
+        desserts = Category.objects.create(slug='desserts', title='Desserts')
+        self.items = [
+            MenuItem.objects.create(title='Pie', price='4.5', featured=True, category=desserts,
+                                    description='With "cream"'),
+            MenuItem.objects.create(title='Soup', price='12.00', featured=False,
+                                    category=self.category),
+            MenuItem.objects.create(title='Tart', price='0.99', featured=False, category=desserts),
+        ]
+        for quantity, item in enumerate(self.items, start=1):
+            Cart.objects.create(user=self.customer, menuitem=item, quantity=quantity,
+                                unit_price=item.price, price=quantity * Decimal(item.price))
+        first = Order.objects.create(user=self.customer, total='21.00', date=date(2024, 5, 1),
+                                     delivery_crew=self.crew, status=True)
+        Order.objects.create(user=self.customer, total='0.00', date=date(2024, 5, 2))
+        last = Order.objects.create(user=self.customer, total='9.99', date=date(2024, 5, 3))
+        for order, item, quantity in [(last, self.items[2], 1), (first, self.items[1], 1),
+                                      (first, self.items[0], 2), (last, self.items[0], 2)]:
+            OrderItem.objects.create(order=order, menuitem=item, quantity=quantity,
+                                     unit_price=item.price, price=quantity * Decimal(item.price))
+
+    def assertSameBytes(self, serializer_class, row_serializer_class, queryset):
+        renderers = [JSONRenderer()] + [renderer() for renderer in (MessagePackRenderer, CBORRenderer)
+                                        if renderer.available]
+        for renderer in renderers:
+            context = {'request': SimpleNamespace(accepted_renderer=renderer)}
+            with self.subTest(renderer=renderer.format):
+                expected = serializer_class(queryset.order_by('pk'), many=True, context=context).data
+                rows = row_serializer_class.values(queryset.order_by('pk'))
+                self.assertEqual(renderer.render(row_serializer_class(rows, context=context).data),
+                                 renderer.render(expected))
+
+    def test_menu_items_match_the_model_serializer(self):
+        self.assertSameBytes(MenuItemSerializer, MenuItemRowSerializer,
+                             MenuItem.objects.select_related('category'))
+
+    def test_cart_matches_the_model_serializer(self):
+        self.assertSameBytes(CartSerializer, CartRowSerializer,
+                             Cart.objects.select_related('menuitem__category'))
+
+    def test_orders_match_the_model_serializer(self):
+        self.assertSameBytes(OrderSerializer, OrderRowSerializer, Order.objects.prefetch_related(
+            Prefetch('orderitem_set', queryset=OrderItem.objects.select_related(
+                'menuitem__category').order_by('pk'))))
+
+    def test_lists_match_single_objects(self):
+        self.authenticate(self.customer)
+        cart = self.client.get('/api/cart/menu-items/').json()['results']
+        self.assertEqual(cart[0]['price'], 4.5)
+        self.assertEqual(cart[1]['menuitem_details']['price'], '12.00')
+        orders = self.client.get('/api/orders/').json()['results']
+        for order in orders:
+            self.assertEqual(order, self.client.get(f'/api/orders/{order["id"]}/').json())
+        self.assertEqual([item['price'] for item in orders[2]['items']], ['0.99', '9.00'])
+        self.assertEqual(orders[1]['items'], [])
+
+
+class BulkCartTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.customer = self.create_user('sana', CUSTOMER)
+        self.authenticate(self.customer)
+        self.items = self.create_menu_items(3)
+
+    def post(self, entries):
+        return self.client.post('/api/cart/menu-items/bulk/', entries,
+                                content_type='application/json')
+
+    def test_upserts_entries_in_one_statement(self):
+        Cart.objects.create(user=self.customer, menuitem=self.items[0],
+                            quantity=5, unit_price='9.50', price='47.50')
+        entries = [{'menuitem': item.pk, 'quantity': 2} for item in self.items]
+        # Token, roles, menu item lookup, upsert, cart listing.
+        with self.assertNumQueries(5):
+            response = self.post(entries)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 3)
+        self.assertEqual(
+            sorted(Cart.objects.values_list('quantity', 'price')),
+            [(2, Decimal('19.00'))] * 3)
+
+    def test_rejects_repeated_entries_adding_up_past_the_limit(self):
+        entries = [{'menuitem': self.items[0].pk, 'quantity': 32767},
+                   {'menuitem': self.items[0].pk, 'quantity': 1}]
+        response = self.post(entries)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'non_field_errors': [
+            f'Menu items [{self.items[0].pk}] add up to more than 32767.']})
+        self.assertFalse(Cart.objects.exists())
+
+    def test_rejects_unknown_menu_items(self):
+        response = self.post([{'menuitem': 999, 'quantity': 1}])
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Cart.objects.exists())
+
+
+class MenuImportTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.authenticate(User.objects.create_superuser('admin', password='lemon@123!'))
+        Category.objects.create(slug='desserts', title='Desserts')
+
+    def test_upserts_by_title_and_reports_bad_rows(self):
+        MenuItem.objects.create(title='Greek Salad', price='5.00', featured=False,
+                                category=self.category)
+        rows = [{'title': f'Dish {i}', 'price': '8.00', 'category': 'mains'} for i in range(50)]
+        rows += [
+            {'title': 'Greek Salad', 'price': '12.50', 'featured': True, 'category': 'desserts'},
+            {'title': 'Soup', 'price': 'cheap', 'category': 'mains'},
+            {'title': 'Pie', 'price': '4.00', 'category': 'pies'},
+        ]
+        # Token, roles, categories by slug, then the upsert, its search
+        # reindex (ids, delete, insert) and change log (version bump, read,
+        # insert) in a savepoint.
+        with self.assertNumQueries(12):
+            response = self.client.post('/api/menu-items/import/', rows,
+                                        content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['imported'], 51)
+        self.assertEqual([error['row'] for error in response.json()['errors']], [52, 53])
+        salad = MenuItem.objects.get(title='Greek Salad')
+        self.assertEqual((salad.price, salad.featured, salad.category.slug),
+                         (Decimal('12.50'), True, 'desserts'))
+
+    def test_imports_csv_uploads(self):
+        upload = SimpleUploadedFile('menu.csv', b'title,price,featured,category\nPie,4.00,true,desserts\n')
+        response = self.client.post('/api/menu-items/import/', {'file': upload})
+        self.assertEqual(response.json(), {'imported': 1, 'errors': []})
+        self.assertTrue(MenuItem.objects.filter(title='Pie', featured=True).exists())
+
+    def test_requires_menu_permissions(self):
+        self.authenticate(self.create_user('sana', CUSTOMER))
+        response = self.client.post('/api/menu-items/import/', [], content_type='application/json')
+        self.assertEqual(response.status_code, 403)
+
+
+class MenuChangesTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.authenticate(self.create_user('sana', CUSTOMER))
+        self.items = self.create_menu_items(3)
+
+    def sync(self, since=None):
+        query = '' if since is None else f'?since={since}'
+        response = self.client.get(f'/api/menu-items/changes/{query}')
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_returns_only_what_changed_since_the_last_sync(self):
+        snapshot = self.sync()
+        self.assertTrue(snapshot['snapshot'])
+        self.assertEqual(len(snapshot['menu_items']), 3)
+        self.assertEqual(len(snapshot['categories']), 1)
+
+        self.items[0].price = '11.00'
+        self.items[0].save()
+        deleted_pk = self.items[1].pk
+        self.items[1].delete()
+        drinks = Category.objects.create(slug='drinks', title='Drinks')
+        # Sync state, changes, then the changed items and categories.
+        with self.assertNumQueries(4):
+            delta = self.sync(snapshot['version'])
+        self.assertFalse(delta['snapshot'])
+        self.assertEqual(delta['version'], snapshot['version'] + 3)
+        self.assertEqual([(item['id'], item['price']) for item in delta['menu_items']],
+                         [(self.items[0].pk, '11.00')])
+        self.assertEqual([category['id'] for category in delta['categories']], [drinks.pk])
+        self.assertEqual(delta['deleted'], {'menu_items': [deleted_pk], 'categories': []})
+
+        self.assertEqual(self.sync(delta['version'])['menu_items'], [])
+
+    def test_imports_are_recorded(self):
+        version = self.sync()['version']
+        MenuImport().run([{'title': 'Lemonade', 'price': '3.00', 'category': 'mains'}])
+        self.assertEqual([item['title'] for item in self.sync(version)['menu_items']], ['Lemonade'])
+
+    def test_compaction_sends_clients_that_are_too_far_behind_a_snapshot(self):
+        version = self.sync()['version']
+        for price in ['10.00', '10.50', '11.00']:
+            self.items[0].price = price
+            self.items[0].save()
+        self.assertEqual(self.compact(),
+                         f"Deleted 3 menu changes; clients behind version 0 of {version + 3} "
+                         "will get a snapshot.\n")
+        self.assertEqual(self.sync(version)['menu_items'][0]['price'], '11.00')
+
+        MenuChange.objects.update(created=timezone.now() - timedelta(days=31))
+        self.compact()
+        self.assertFalse(MenuChange.objects.exists())
+        self.assertTrue(self.sync(version)['snapshot'])
+        self.assertFalse(self.sync(version + 3)['snapshot'])
+
+    def compact(self):
+        out = io.StringIO()
+        call_command('compact_menu_changes', stdout=out)
+        return out.getvalue()
+
+    def test_rejects_bad_versions(self):
+        response = self.client.get('/api/menu-items/changes/?since=-1')
+        self.assertEqual(response.status_code, 400)
+
+
+class MenuSearchTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.authenticate(self.create_user('sana', CUSTOMER))
+        self.salad = MenuItem.objects.create(
+            title='Greek Salad', price='8.00', featured=False, category=self.category,
+            description='Crispy lettuce, peppers, olives and feta.')
+        self.bruschetta = MenuItem.objects.create(
+            title='Bruschetta', price='6.00', featured=False, category=self.category,
+            description='Grilled bread with a greek olive tapenade.')
+
+    def search(self, query, **params):
+        response = self.client.get('/api/menu-items/', {'search': query, **params})
+        return [row['title'] for row in response.json()['results']]
+
+    def test_ranks_title_matches_first(self):
+        self.assertEqual(self.search('greek'), ['Greek Salad', 'Bruschetta'])
+
+    def test_matches_prefixes_of_every_word(self):
+        self.assertEqual(self.search('gre sal'), ['Greek Salad'])
+        self.assertEqual(self.search('main'), ['Greek Salad', 'Bruschetta'])
+
+    def test_explicit_ordering_wins(self):
+        self.assertEqual(self.search('greek', ordering='price'), ['Bruschetta', 'Greek Salad'])
+
+    def test_operators_are_searched_literally(self):
+        self.assertEqual(self.search('"greek" OR NOT*'), [])
+
+    def test_index_follows_changes(self):
+        self.salad.title = 'Horiatiki'
+        self.salad.save()
+        self.assertEqual(self.search('hori'), ['Horiatiki'])
+        self.category.title = 'Starters'
+        self.category.save()
+        self.assertEqual(self.search('start'), ['Horiatiki', 'Bruschetta'])
+        self.bruschetta.delete()
+        self.assertEqual(self.search('greek'), [])
+
+    def test_type_ahead_latency_budget(self):
+        Category.objects.bulk_create(Category(slug=f'c{i}', title=f'Category {i}') for i in range(20))
+        categories = list(Category.objects.all())
+        words = ['lemon', 'olive', 'feta', 'basil', 'tomato', 'garlic', 'honey', 'mint']
+        MenuItem.objects.bulk_create(
+            MenuItem(title=f'{words[i % 8].title()} {words[i // 8 % 8]} {i}', price='9.00',
+                     featured=False, category=categories[i % 20],
+                     description=' '.join(words[(i + n) % 8] for n in range(4)))
+            for i in range(5000))
+        search_backend().rebuild()
+
+        timings = []
+        for query in ['l', 'le', 'lem', 'lemo', 'lemon', 'lemon o', 'lemon ol', 'olive fe']:
+            start = time.perf_counter()
+            self.assertEqual(self.client.get('/api/menu-items/', {'search': query}).status_code, 200)
+            timings.append(time.perf_counter() - start)
+        # Per keystroke, with headroom for slow machines (~15ms locally).
+        self.assertLess(max(timings), 0.1, timings)
+
+
+class KeysetPaginationTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.authenticate(self.create_user('sana', CUSTOMER))
+        for i, price in enumerate(['5.00', '3.00', '5.00', '1.00', '5.00', '2.00', '5.00']):
+            MenuItem.objects.create(title=f'Dish {i}', price=price,
+                                    featured=False, category=self.category)
+
+    def test_walks_every_row_in_key_order(self):
+        url = '/api/menu-items/?pagination=keyset&page_size=2'
+        seen = []
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                page = self.client.get(url).json()
+            self.assertFalse(any('COUNT(' in query['sql'] or 'OFFSET' in query['sql']
+                                 for query in queries.captured_queries))
+            seen += [(Decimal(row['price']), row['id']) for row in page['results']]
+            url = page['next']
+        self.assertEqual(seen, sorted(MenuItem.objects.values_list('price', 'id')))
+
+    @mock.patch.object(MenuItemKeysetPagination, 'max_page_size', 3)
+    def test_page_size_is_capped(self):
+        page = self.client.get('/api/menu-items/?pagination=keyset&page_size=50').json()
+        self.assertEqual(len(page['results']), 3)
+
+    def test_rejects_tampered_cursor(self):
+        response = self.client.get('/api/menu-items/?pagination=keyset&cursor=bogus')
+        self.assertEqual(response.status_code, 404)
+
+
+class AsyncReadViewTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.authenticate(self.create_user('sana', CUSTOMER))
+        self.items = self.create_menu_items(7)
+
+    async def aget(self, url, **extra):
+        return await self.async_client.get(url, headers={
+            'Authorization': self.client.defaults['HTTP_AUTHORIZATION'], **extra})
+
+    async def test_menu_list_matches_the_sync_view(self):
+        for query in ['', '?page=2', '?search=dish&ordering=-price', '?pagination=keyset&page_size=3']:
+            expected = (await sync_to_async(self.client.get)('/api/menu-items/' + query)).json()
+            response = await self.aget('/api/async/menu-items/' + query)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(self.strip_urls(response.json()), self.strip_urls(expected))
+
+    def strip_urls(self, page):
+        # Next/previous links name the route they came from.
+        return {key: value for key, value in page.items() if key not in ('next', 'previous')}
+
+    async def test_menu_detail_is_cached_with_an_etag(self):
+        url = f'/api/async/menu-items/{self.items[0].pk}/'
+        first = await self.aget(url)
+        self.assertEqual(first.json()['title'], self.items[0].title)
+        second = await self.aget(url, **{'If-None-Match': first['ETag']})
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual((await self.aget('/api/async/menu-items/999/')).status_code, 404)
+
+    async def test_errors_come_from_the_drf_view(self):
+        response = await self.async_client.get('/api/async/menu-items/')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual((await self.aget('/api/async/menu-items/?page=9')).status_code, 404)
+
+
+class OrderEventTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.customer = self.create_user('sana', CUSTOMER)
+        self.crew = self.create_user('mario', DELIVERY_CREW)
+        self.other_crew = self.create_user('luigi', DELIVERY_CREW)
+
+    def save_order(self, order=None, **changes):
+        with self.captureOnCommitCallbacks(execute=True):
+            if order is None:
+                return Order.objects.create(user=self.customer, total='10.00',
+                                            date=date(2024, 5, 1), **changes)
+            for field, value in changes.items():
+                setattr(order, field, value)
+            order.save()
+            return order
+
+    def history(self, channel):
+        return [event.type for channels, event in get_broker().history if channel in channels]
+
+    def test_saving_orders_publishes_assignments_and_status_changes(self):
+        order = self.save_order(delivery_crew=self.crew)
+        self.save_order(order, status=True)
+        self.save_order(order, delivery_crew=self.other_crew)
+        self.save_order(order, total='12.00')
+        self.assertEqual(self.history(crew_channel(self.crew.pk)),
+                         ['order.assigned', 'order.status', 'order.unassigned'])
+        self.assertEqual(self.history(crew_channel(self.other_crew.pk)), ['order.assigned'])
+        self.assertEqual(len(self.history(customer_channel(self.customer.pk))), 4)
+
+    async def test_broker_replays_missed_events_then_streams(self):
+        broker = get_broker()
+        first = broker.publish(['crew:1'], 'order.assigned', {'order': 1})
+        broker.publish(['crew:2'], 'order.assigned', {'order': 2})
+        second = broker.publish(['crew:1'], 'order.status', {'order': 1})
+        events = broker.subscribe('crew:1', last_event_id=first.id, keepalive=0.01)
+        self.assertEqual(await anext(events), second)
+        await sync_to_async(broker.publish)(['crew:1'], 'order.unassigned', {'order': 1})
+        self.assertEqual((await anext(events)).type, 'order.unassigned')
+        self.assertIsNone(await anext(events))
+        await events.aclose()
+        self.assertFalse(broker.subscribers['crew:1'])
+
+    async def test_broker_resets_clients_it_cannot_catch_up(self):
+        events = get_broker().subscribe('crew:1', last_event_id=99)
+        self.assertEqual((await anext(events)).type, RESET)
+        await events.aclose()
+
+    async def test_feed_streams_the_delivery_crews_events(self):
+        token = await sync_to_async(Token.objects.create)(user=self.crew)
+        response = await self.async_client.get(
+            '/api/orders/events/', headers={'Authorization': f'Token {token.key}'})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+        self.assertTrue((await anext(stream)).startswith(b'retry:'))
+        pending = asyncio.ensure_future(anext(stream))
+        await asyncio.sleep(0)
+        get_broker().publish(['crew:0', crew_channel(self.crew.pk)], 'order.assigned', {'order': 7})
+        self.assertEqual(await pending, b'id: 1\nevent: order.assigned\ndata: {"order": 7}\n\n')
+        await stream.aclose()
+
+    async def test_feed_requires_authentication(self):
+        response = await self.async_client.get('/api/orders/events/')
+        self.assertEqual(response.status_code, 401)
+
+
+task_calls = []
+
+
+@task
+def record_call(**payload):
+    task_calls.append(payload)
+
+
+@task(max_attempts=2)
+def fail(**payload):
+    raise RuntimeError('kitchen printer offline')
+
+
+class JobQueueTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        task_calls.clear()
+        self.customer = self.create_user('sana', CUSTOMER)
+
+    def test_order_hooks_queue_jobs_with_the_order(self):
+        hooks = {ORDER_CREATED: [record_call.task_name], ORDER_STATUS_CHANGED: [record_call.task_name]}
+        with mock.patch.dict(HOOKS, hooks):
+            order = Order.objects.create(user=self.customer, total='10.00', date=date(2024, 5, 1))
+            order.total = '12.00'
+            order.save()
+            order.status = True
+            order.save()
+        jobs = Job.objects.filter(task=record_call.task_name).order_by('id')
+        self.assertEqual(list(jobs.values_list('task', 'payload')), [
+            (record_call.task_name, {'order': order.pk}),
+            (record_call.task_name, {'order': order.pk, 'status': True}),
+        ])
+
+        call_command('run_jobs', once=True, stdout=mock.Mock())
+        self.assertEqual(task_calls, [{'order': order.pk}, {'order': order.pk, 'status': True}])
+        self.assertFalse(Job.objects.exists())
+
+    def test_failing_jobs_are_retried_with_backoff_then_kept(self):
+        job = enqueue(fail, {'order': 1})
+        self.assertEqual(work('worker-1'), (0, 1))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.QUEUED, 1))
+        self.assertIn('kitchen printer offline', job.last_error)
+        self.assertAlmostEqual(job.run_at, timezone.now() + timedelta(seconds=30),
+                               delta=timedelta(seconds=5))
+
+        self.assertEqual(work('worker-1'), (0, 0))
+        Job.objects.update(run_at=timezone.now())
+        self.assertEqual(work('worker-1'), (0, 1))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+        self.assertEqual(work('worker-1'), (0, 0))
+
+    def test_jobs_are_claimed_once_until_their_worker_times_out(self):
+        job = enqueue(record_call, {'order': 1})
+        self.assertEqual([claimed.pk for claimed in claim('worker-1')], [job.pk])
+        self.assertEqual(claim('worker-2'), [])
+
+        Job.objects.update(locked_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(work('worker-2'), (1, 0))
+        self.assertEqual(task_calls, [{'order': 1}])
+
+    def test_unknown_tasks_are_refused(self):
+        with self.assertRaises(LookupError):
+            enqueue('LittleLemonAPI.tasks.missing')
+
+
+class CheckoutTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.customer = self.create_user('sana', CUSTOMER)
+        self.manager = self.create_user('adrian', MANAGER)
+        self.authenticate(self.customer)
+        self.items = self.create_menu_items(2)
+        for quantity, item in enumerate(self.items, start=1):
+            Cart.objects.create(user=self.customer, menuitem=item, quantity=quantity,
+                                unit_price=item.price, price=quantity * Decimal(item.price))
+
+    def test_checkout_turns_the_cart_into_an_order(self):
+        response = self.client.post('/api/orders/', {}, headers={'Idempotency-Key': 'abc'})
+        self.assertEqual(response.status_code, 201)
+        order = response.json()
+        self.assertEqual(order['total'], '28.50')
+        self.assertEqual([(item['menuitem'], item['quantity']) for item in order['items']],
+                         [(self.items[0].pk, 1), (self.items[1].pk, 2)])
+        self.assertFalse(Cart.objects.exists())
+        # The rollups are counted by the jobs checkout queued.
+        self.assertFalse(DailyMenuItemRollup.objects.exists())
+        self.assertEqual(work('worker-1'), (2, 0))
+        self.assertEqual(list(DailyMenuItemRollup.objects.order_by('menuitem').values_list(
+            'quantity', flat=True)), [1, 2])
+        self.assertEqual(list(DailyOrderRollup.objects.values_list('order_count', 'revenue')),
+                         [(1, Decimal('28.50'))])
+
+        repeat = self.client.post('/api/orders/', {}, headers={'Idempotency-Key': 'abc'})
+        self.assertEqual(repeat.status_code, 200)
+        self.assertEqual(repeat.json(), order)
+
+    def test_replaying_a_key_does_not_bill_the_cart_again(self):
+        order = self.client.post('/api/orders/', {}, headers={'Idempotency-Key': 'abc'}).json()
+        Cart.objects.create(user=self.customer, menuitem=self.items[0], quantity=1,
+                            unit_price=self.items[0].price, price=self.items[0].price)
+        repeat = self.client.post('/api/orders/', {}, headers={'Idempotency-Key': 'abc'})
+        self.assertEqual(repeat.status_code, 200)
+        self.assertEqual(repeat.json()['id'], order['id'])
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(Cart.objects.count(), 1)
+
+    def test_losing_a_race_for_the_key_returns_the_winner(self):
+        winner = Order.objects.create(user=self.customer, total='1.00', date=date(2024, 5, 1),
+                                      idempotency_key='abc')
+        first = QuerySet.first
+        # The winner commits between the key lookup and the insert.
+        lookups = iter([lambda queryset: None])
+        with mock.patch.object(QuerySet, 'first', autospec=True,
+                               side_effect=lambda queryset: next(lookups, first)(queryset)):
+            response = self.client.post('/api/orders/', {}, headers={'Idempotency-Key': 'abc'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['id'], winner.pk)
+        self.assertEqual(Cart.objects.count(), 2)
+
+    def test_other_integrity_errors_are_raised(self):
+        with mock.patch.object(OrderItem.objects, 'bulk_create', side_effect=IntegrityError):
+            with self.assertRaises(IntegrityError):
+                self.client.post('/api/orders/', {}, headers={'Idempotency-Key': 'abc'})
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(Cart.objects.count(), 2)
+
+    def test_empty_cart(self):
+        Cart.objects.all().delete()
+        response = self.client.post('/api/orders/', {}, headers={'Idempotency-Key': 'abc'})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.exists())
+
+    def test_deleting_an_order_removes_its_items_and_rollups(self):
+        order_id = self.client.post('/api/orders/', {}).json()['id']
+        self.authenticate(self.manager)
+        self.assertEqual(self.client.delete(f'/api/orders/{order_id}/').status_code, 204)
+        self.assertFalse(OrderItem.objects.exists())
+        # Deleted before its jobs ran, which still bring it back to nothing.
+        work('worker-1')
+        self.assertEqual(list(DailyMenuItemRollup.objects.values_list('quantity', flat=True)), [0, 0])
+
+    def test_exports_one_row_per_item(self):
+        self.client.post('/api/orders/', {})
+        self.authenticate(self.manager)
+        response = self.client.get('/api/orders/export/?output=ndjson')
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual([(row['menuitem'], row['quantity']) for row in rows],
+                         [(self.items[0].title, 1), (self.items[1].title, 2)])
+
+    async def test_async_orders_match_the_sync_view(self):
+        await sync_to_async(self.client.post)('/api/orders/', {})
+        expected = (await sync_to_async(self.client.get)('/api/orders/')).json()
+        response = await self.async_client.get('/api/async/orders/', headers={
+            'Authorization': self.client.defaults['HTTP_AUTHORIZATION']})
+        self.assertEqual(response.json()['results'], expected['results'])
+
+
+class ReportTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.manager = self.create_user('adrian', MANAGER)
+        self.crew = self.create_user('mario', DELIVERY_CREW)
+        self.customer = self.create_user('sana', CUSTOMER)
+        self.authenticate(self.manager)
+
+    def create_order(self, day, total, **fields):
+        return Order.objects.create(user=self.customer, date=date(2024, 12, day),
+                                    total=total, **fields)
+
+    def test_rollups_follow_order_changes(self):
+        self.create_order(2, '10.00')
+        self.create_order(3, '15.00')
+        order = self.create_order(9, '20.00')
+        order.status = True
+        order.delivery_crew = self.crew
+        order.save()
+        # Moved before the job counting the new order ran.
+        work('worker-1')
+
+        response = self.client.get('/api/reports/revenue/?period=week')
+        self.assertEqual(response.json(), [
+            {'period': '2024-12-02', 'orders': 2, 'revenue': '25.00'},
+            {'period': '2024-12-09', 'orders': 1, 'revenue': '20.00'},
+        ])
+        response = self.client.get('/api/reports/delivery-crew/?status=true')
+        self.assertEqual(response.json(), [
+            {'period': '2024-12-09', 'orders': 1, 'revenue': '20.00',
+             'delivery_crew': self.crew.pk},
+        ])
+
+    def test_reports_are_for_managers_only(self):
+        self.authenticate(self.customer)
+        response = self.client.get('/api/reports/revenue/')
+        self.assertEqual(response.status_code, 403)
+
+    def item_rollups(self):
+        return list(DailyMenuItemRollup.objects.exclude(quantity=0).order_by(
+            'date', 'menuitem', 'status').values_list('date', 'menuitem', 'status', 'quantity'))
+
+    def test_item_rollups_follow_items_and_their_order(self):
+        soup, salad = MenuItem.objects.bulk_create([
+            MenuItem(title='Soup', price='6.00', featured=False, category=self.category),
+            MenuItem(title='Salad', price='8.00', featured=False, category=self.category),
+        ])
+        order = self.create_order(2, '20.00')
+        # Items written outside checkout, as the admin does.
+        item = OrderItem.objects.create(order=order, menuitem=soup, quantity=2,
+                                        unit_price='6.00', price='12.00')
+        OrderItem.objects.create(order=order, menuitem=salad, quantity=1,
+                                 unit_price='8.00', price='8.00')
+        item.quantity = 3
+        item.price = Decimal('18.00')
+        item.save()
+        self.assertEqual(self.item_rollups(), [
+            (date(2024, 12, 2), soup.pk, False, 3), (date(2024, 12, 2), salad.pk, False, 1)])
+
+        order.date = date(2024, 12, 5)
+        order.status = True
+        order.save()
+        self.assertEqual(self.item_rollups(), [
+            (date(2024, 12, 5), soup.pk, True, 3), (date(2024, 12, 5), salad.pk, True, 1)])
+
+        OrderItem.objects.get(menuitem=salad).delete()
+        self.assertEqual(self.item_rollups(), [(date(2024, 12, 5), soup.pk, True, 3)])
+        order.delete()
+        self.assertEqual(self.item_rollups(), [])
+        self.assertFalse(DailyMenuItemRollup.objects.filter(quantity__lt=0).exists())
+
+    def test_saving_a_loaded_order_reads_nothing_back(self):
+        order = self.create_order(2, '9.50')
+        OrderItem.objects.create(order=order, menuitem=self.create_menu_items(1)[0], quantity=1,
+                                 unit_price='9.50', price='9.50')
+        order = Order.objects.prefetch_related('orderitem_set').get(pk=order.pk)
+        order.status = True
+        # The order update, then a lookup, an insert and an update per rollup table.
+        with self.assertNumQueries(7):
+            order.save()
+        self.assertEqual(list(DailyMenuItemRollup.objects.filter(quantity=1).values_list(
+            'status', flat=True)), [True])
+
+    def test_top_menu_items_are_ranked_by_revenue_within_the_status(self):
+        soup, salad, cake = MenuItem.objects.bulk_create([
+            MenuItem(title='Soup', price='6.00', featured=False, category=self.category),
+            MenuItem(title='Salad', price='8.00', featured=False, category=self.category),
+            MenuItem(title='Cake', price='4.00', featured=False, category=self.category),
+        ])
+        delivered = self.create_order(2, '44.00', status=True)
+        pending = self.create_order(3, '40.00')
+        for order, menuitem, quantity in [(delivered, soup, 2), (delivered, salad, 1),
+                                          (delivered, cake, 5), (pending, cake, 10)]:
+            price = quantity * Decimal(menuitem.price)
+            OrderItem.objects.create(order=order, menuitem=menuitem, quantity=quantity,
+                                     unit_price=menuitem.price, price=price)
+
+        response = self.client.get('/api/reports/top-menu-items/?period=week&status=true&limit=2')
+        self.assertEqual([(row['title'], row['quantity'], row['revenue']) for row in response.json()],
+                         [('Cake', 5, '20.00'), ('Soup', 2, '12.00')])
+
+
+class InstrumentationTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        histograms.clear()
+        self.authenticate(self.create_user('sana', CUSTOMER))
+
+    def test_server_timing_header_lists_phases(self):
+        response = self.client.get('/api/cart/menu-items/')
+        phases = [entry.split(';')[0] for entry in response['Server-Timing'].split(', ')]
+        self.assertEqual(phases, ['url', 'auth', 'permissions', 'throttle', 'db',
+                                  'serialize', 'render', 'total'])
+
+    def test_row_and_model_serializers_are_timed(self):
+        self.create_menu_items(3)
+        with mock.patch('LittleLemonAPI.instrumentation.RequestTimings.add',
+                        autospec=True, side_effect=RequestTimings.add) as add:
+            self.client.get('/api/menu-items/', {'page_size': 2})
+            response = self.client.post('/api/cart/menu-items/', {
+                'menuitem': MenuItem.objects.first().pk, 'quantity': 1})
+        serialized = [call.args[2] for call in add.call_args_list if call.args[1] == 'serialize']
+        self.assertEqual(len(serialized), 2)
+        # Less the queries run meanwhile, so never below zero.
+        self.assertTrue(all(seconds >= 0 for seconds in serialized))
+        view = response.renderer_context['view']
+        self.assertIs(type(view.get_serializer()), CartSerializer)
+
+    @override_settings(METRICS_TOKEN='scrape-me')
+    def test_metrics_are_aggregated_per_view(self):
+        self.client.get('/api/menu-items/')
+        self.client.get('/api/menu-items/')
+        body = self.client.get('/metrics/', HTTP_AUTHORIZATION='Bearer scrape-me').content.decode()
+        self.assertIn(
+            'littlelemon_request_phase_seconds_count{view="MenuItemsView",phase="total"} 2',
+            body)
+
+    @override_settings(METRICS_TOKEN='scrape-me')
+    def test_metrics_need_the_token_or_staff(self):
+        # An API token, even from a local address, is not enough.
+        self.assertEqual(self.client.get('/metrics/', REMOTE_ADDR='127.0.0.1').status_code, 403)
+        response = self.client.get('/metrics/', HTTP_AUTHORIZATION='Bearer guess')
+        self.assertEqual(response.status_code, 403)
+        with override_settings(METRICS_TOKEN=''):
+            response = self.client.get('/metrics/', HTTP_AUTHORIZATION='Bearer ')
+            self.assertEqual(response.status_code, 403)
+
+        self.client.force_login(User.objects.create_user('adrian', is_staff=True))
+        self.assertEqual(self.client.get('/metrics/').status_code, 200)
+
+
+class BenchmarkTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.dataset = benchmark.seed(categories=1, menu_items=3, customers=2, delivery_crew=1,
+                                      managers=1, days=1, orders_per_day=1)
+
+    def test_unexpected_statuses_are_flagged_and_not_timed(self):
+        results = {
+            'working': benchmark.measure(benchmark.Scenario('menu-items'), self.dataset, 2),
+            'broken': benchmark.measure(
+                benchmark.Scenario('menu-items', method='post', data={}), self.dataset, 2),
+        }
+        self.assertEqual(results['working']['unexpected'], {})
+        self.assertIn('p50_ms', results['working'])
+        self.assertEqual(results['broken']['unexpected'], {'403': 2})
+        self.assertNotIn('p50_ms', results['broken'])
+        self.assertEqual(benchmark.failures(results), ['broken'])
+
+
+class CachedTokenAuthenticationTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.manager = self.create_user('adrian', MANAGER)
+        self.authenticate(self.manager)
+
+    def test_repeat_requests_skip_token_and_role_lookups(self):
+        self.client.get('/api/groups/manager/users/')
+        # Only the listing itself hits the database.
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/groups/manager/users/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_group_changes_take_effect_immediately(self):
+        self.client.get('/api/groups/manager/users/')
+        Group.objects.get(name=MANAGER).user_set.remove(self.manager)
+        response = self.client.get('/api/groups/manager/users/')
+        self.assertEqual(response.status_code, 403)
+
+    def test_logout_and_deactivation_revoke_cached_tokens(self):
+        self.client.get('/api/groups/manager/users/')
+        self.manager.is_active = False
+        self.manager.save()
+        self.assertEqual(self.client.get('/api/groups/manager/users/').status_code, 401)
+
+        self.manager.is_active = True
+        self.manager.save()
+        self.client.get('/api/groups/manager/users/')
+        self.assertEqual(self.client.post('/auth/token/logout/').status_code, 204)
+        self.assertEqual(self.client.get('/api/groups/manager/users/').status_code, 401)
+
+    @override_settings(TOKEN_CACHE_ALIAS='default')
+    def test_revocations_reach_workers_sharing_the_cache(self):
+        key = Token.objects.get(user=self.manager).key
+        first, second = TokenCache(), TokenCache()
+        first.set(key, 'cached')
+        self.assertEqual(second.get(key), 'cached')
+        first.discard_users([self.manager.pk])
+        self.assertIsNone(second.get(key))
+        self.assertIsNone(first.get(key))
+
+    def test_only_credential_changes_revoke_cached_tokens(self):
+        self.client.get('/api/groups/manager/users/')
+        user = User.objects.get(pk=self.manager.pk)
+        user.first_name = 'Adrian'
+        # The update alone: no token lookup to revoke anything.
+        with self.assertNumQueries(1):
+            user.save()
+        with self.assertNumQueries(2):
+            self.client.get('/api/groups/manager/users/')
+
+        user.set_password('lemon@456!')
+        user.save()
+        # The token is looked up again.
+        with self.assertNumQueries(3):
+            self.client.get('/api/groups/manager/users/')
+
+
+@mock.patch.dict(ScopedSlidingWindowThrottle.THROTTLE_RATES, {'menu': '4/minute'})
+class SlidingWindowThrottleTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.authenticate(self.create_user('sana', CUSTOMER))
+        self.clock = mock.patch.object(
+            ScopedSlidingWindowThrottle, 'timer', mock.Mock(return_value=6000.0))
+        self.timer = self.clock.start()
+        self.addCleanup(self.clock.stop)
+
+    def statuses(self, count):
+        return [self.client.get('/api/menu-items/').status_code for _ in range(count)]
+
+    def test_previous_window_is_weighted_by_its_overlap(self):
+        self.assertEqual(self.statuses(5), [200, 200, 200, 200, 429])
+        # Halfway through the next window half of the previous count remains.
+        self.timer.return_value = 6090.0
+        self.assertEqual(self.statuses(3), [200, 200, 429])
+
+    def test_retry_after_reflects_the_window(self):
+        self.statuses(4)
+        response = self.client.get('/api/menu-items/')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '60')
+
+    def test_scopes_only_apply_to_their_method(self):
+        self.statuses(4)
+        response = self.client.get('/api/cart/menu-items/')
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(THROTTLE_STORE='LittleLemonAPI.throttling.DatabaseCounters')
+@mock.patch.dict(UserSlidingWindowThrottle.THROTTLE_RATES, {'user': '3/hour'})
+class ThrottleStoreTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.authenticate(self.create_user('sana', CUSTOMER))
+        self.clock = mock.patch.object(
+            UserSlidingWindowThrottle, 'timer', mock.Mock(return_value=7200.0))
+        self.timer = self.clock.start()
+        self.addCleanup(self.clock.stop)
+
+    def test_counts_last_the_whole_window(self):
+        for _ in range(3):
+            self.assertEqual(self.client.get('/api/cart/menu-items/').status_code, 200)
+        # Well past any default cache timeout, still inside the hour.
+        self.timer.return_value = 7200.0 + 1800
+        self.assertEqual(self.client.get('/api/cart/menu-items/').status_code, 429)
+        self.assertEqual(ThrottleCounter.objects.get().count, 3)
+
+    def test_previous_window_is_kept_for_the_estimate(self):
+        for _ in range(3):
+            self.client.get('/api/cart/menu-items/')
+        # A quarter into the next window 3 * 0.75 requests still count,
+        # so only one more fits.
+        self.timer.return_value = 7200.0 + 3600 + 900
+        statuses = [self.client.get('/api/cart/menu-items/').status_code for _ in range(2)]
+        self.assertEqual(statuses, [200, 429])
+
+    def test_increments_are_updates_of_one_row(self):
+        counters = DatabaseCounters()
+        for _ in range(5):
+            counters.incr('user_1', 2, 7200.0, 7200)
+        self.assertEqual(counters.counts('user_1', [2, 1], 7200.0), [5, 0])
+        # An expired counter starts again, and older ones are dropped.
+        counters.incr('user_1', 1, 1000.0, 10)
+        counters.incr('user_1', 3, 20000.0, 7200)
+        self.assertEqual(counters.counts('user_1', [3, 2], 20000.0), [1, 0])
+        self.assertEqual(list(ThrottleCounter.objects.values_list('window', flat=True)), [3])
+
+
+
+
+class OrderItemBackfillTests(TransactionTestCase):
+    """Run between migrations 0008 and 0009, on rows that still point at customers."""
+
+    before = [('LittleLemonAPI', '0008_orderitem_order_ref')]
+
+    class Stop(Exception):
+        pass
+
+    def setUp(self):
+        self.migrate(self.before)
+        self.apps = MigrationExecutor(connection).loader.project_state(self.before).apps
+        User = self.apps.get_model('auth', 'User')
+        Category = self.apps.get_model('LittleLemonAPI', 'Category')
+        MenuItem = self.apps.get_model('LittleLemonAPI', 'MenuItem')
+        Order = self.apps.get_model('LittleLemonAPI', 'Order')
+        self.OrderItem = self.apps.get_model('LittleLemonAPI', 'OrderItem')
+
+        ann = User.objects.create(username='ann')
+        bob = User.objects.create(username='bob')
+        category = Category.objects.create(slug='mains', title='Mains')
+        items = [MenuItem.objects.create(title=f'Dish {i}', price='9.50', featured=False,
+                                         category=category) for i in range(5)]
+        self.first = Order.objects.create(user=ann, total='9.50', date=date(2024, 5, 1))
+        Order.objects.create(user=ann, total='9.50', date=date(2024, 5, 2))
+        # The legacy column holds the customer's id.
+        for item in items:
+            self.OrderItem.objects.create(order_id=ann.pk, menuitem=item, quantity=1,
+                                          unit_price='9.50', price='9.50')
+        self.stray = self.OrderItem.objects.create(order_id=bob.pk, menuitem=items[0], quantity=1,
+                                                   unit_price='9.50', price='9.50')
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        if FINAL_MIGRATION not in executor.loader.applied_migrations:
+            self.OrderItem.objects.all().delete()
+        self.migrate(executor.loader.graph.leaf_nodes())
+
+    def migrate(self, targets):
+        MigrationExecutor(connection).migrate(targets)
+
+    def test_fills_rows_in_batches_and_reports_unmatched_ones(self):
+        progress = []
+        unmatched = backfill_order_items(self.apps, batch_size=2,
+                                         progress=lambda *args: progress.append(args[:2]))
+        self.assertEqual(progress, [(2, 6), (4, 6), (6, 6)])
+        self.assertEqual(unmatched, [self.stray.pk])
+        self.assertEqual(set(self.OrderItem.objects.exclude(pk=self.stray.pk)
+                             .values_list('order_ref', flat=True)), {self.first.pk})
+        self.assertIsNone(self.OrderItem.objects.get(pk=self.stray.pk).order_ref_id)
+
+    def test_resumes_where_a_stopped_run_left_off(self):
+        def stop(done, total, last_id):
+            raise self.Stop()
+
+        with self.assertRaises(self.Stop):
+            backfill_order_items(self.apps, batch_size=2, progress=stop)
+        # The first batch was committed on its own.
+        self.assertEqual(self.OrderItem.objects.filter(order_ref__isnull=False).count(), 2)
+
+        progress = []
+        backfill_order_items(self.apps, batch_size=2,
+                             progress=lambda *args: progress.append(args[:2]))
+        self.assertEqual(progress, [(2, 4), (4, 4)])
+        self.assertEqual(self.OrderItem.objects.filter(order_ref__isnull=True).count(), 1)
+
+    def test_command_refuses_to_run_before_0008(self):
+        self.OrderItem.objects.all().delete()
+        self.migrate([('LittleLemonAPI', '0007_job_queue')])
+        with self.assertRaisesMessage(CommandError, 'migrate LittleLemonAPI 0008'):
+            call_command('backfill_order_items', stdout=io.StringIO())
+
+    def test_migration_waits_for_unmatched_rows_to_be_dealt_with(self):
+        with self.assertRaisesMessage(RuntimeError, '1 order items belong to customers without orders'):
+            self.migrate([FINAL_MIGRATION])
+
+        call_command('backfill_order_items', delete_unmatched=True, stdout=io.StringIO())
+        self.migrate([FINAL_MIGRATION])
+        OrderItem = MigrationExecutor(connection).loader.project_state(
+            [FINAL_MIGRATION]).apps.get_model('LittleLemonAPI', 'OrderItem')
+        self.assertEqual(list(OrderItem.objects.values_list('order', flat=True).distinct()),
+                         [self.first.pk])
+
+
+class MenuImportKeysMigrationTests(TransactionTestCase):
+    """Run 0005, which makes category slugs and menu item titles unique."""
+
+    before = [('LittleLemonAPI', '0004_daily_rollups')]
+    after = [('LittleLemonAPI', '0005_menu_import_keys')]
+
+    def setUp(self):
+        MigrationExecutor(connection).migrate(self.before)
+        apps = MigrationExecutor(connection).loader.project_state(self.before).apps
+        self.Category = apps.get_model('LittleLemonAPI', 'Category')
+        self.MenuItem = apps.get_model('LittleLemonAPI', 'MenuItem')
+        mains = self.Category.objects.create(slug='mains', title='Mains')
+        self.Category.objects.create(slug='mains', title='Main courses')
+        for title in ['Soup', 'Soup', 'Salad']:
+            self.MenuItem.objects.create(title=title, price='9.50', featured=False, category=mains)
+
+    def tearDown(self):
+        self.MenuItem.objects.all().delete()
+        self.Category.objects.all().delete()
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_refuses_duplicates_and_names_them(self):
+        with self.assertRaisesMessage(RuntimeError, "Category slugs used more than once: 'mains'; "
+                                                    "MenuItem titles used more than once: 'Soup'."):
+            MigrationExecutor(connection).migrate(self.after)
+        self.assertNotIn(self.after[0], MigrationExecutor(connection).loader.applied_migrations)
+
+        self.Category.objects.filter(title='Main courses').update(slug='main-courses')
+        self.MenuItem.objects.filter(pk=self.MenuItem.objects.filter(title='Soup').last().pk).update(
+            title='Soup of the day')
+        MigrationExecutor(connection).migrate(self.after)
+        self.assertIn(self.after[0], MigrationExecutor(connection).loader.applied_migrations)
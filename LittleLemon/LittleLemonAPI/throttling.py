@@ -0,0 +1,158 @@
+import functools
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils.module_loading import import_string
+from rest_framework.throttling import AnonRateThrottle, ScopedRateThrottle, UserRateThrottle
+
+from .models import ThrottleCounter
+
+
+class CounterStore:
+    """
+    Per-window request counters. ``now`` is the throttle's clock, in
+    seconds since the epoch; every increment makes the counter expire
+    ``timeout`` seconds after it.
+    """
+
+    def counts(self, key, windows, now):
+        """The current count of ``key`` in each of ``windows``, 0 if none."""
+        raise NotImplementedError
+
+    def incr(self, key, window, now, timeout):
+        raise NotImplementedError
+
+
+class DatabaseCounters(CounterStore):
+    """
+    Counters in the ThrottleCounter table, shared by every process using
+    the database. Increments are single UPDATEs, so none are lost between
+    concurrent requests.
+    """
+
+    def counts(self, key, windows, now):
+        found = dict(ThrottleCounter.objects.filter(
+            key=key, window__in=windows, expires__gt=self.datetime(now),
+        ).values_list('window', 'count'))
+        return [found.get(window, 0) for window in windows]
+
+    def incr(self, key, window, now, timeout):
+        now, expires = self.datetime(now), self.datetime(now + timeout)
+        counter = ThrottleCounter.objects.filter(key=key, window=window)
+        if counter.filter(expires__gt=now).update(count=F('count') + 1, expires=expires):
+            return
+        # Expired: start again, unless another request just did.
+        if counter.filter(expires__lte=now).update(count=1, expires=expires):
+            return
+        try:
+            with transaction.atomic():
+                ThrottleCounter.objects.create(key=key, window=window, count=1, expires=expires)
+        except IntegrityError:
+            counter.update(count=F('count') + 1, expires=expires)
+            return
+        # Once per client and window, drop its counters nobody reads any more.
+        ThrottleCounter.objects.filter(key=key, expires__lte=now).delete()
+
+    def datetime(self, timestamp):
+        return datetime.fromtimestamp(timestamp, timezone.utc)
+
+
+class CacheCounters(CounterStore):
+    """
+    Counters in the THROTTLE_CACHE_ALIAS cache. Increments are atomic in
+    Redis and in a local-memory cache, which only one process sees; other
+    backends can lose one to a concurrent request.
+    """
+
+    def __init__(self):
+        self.cache = caches[getattr(settings, 'THROTTLE_CACHE_ALIAS', 'default')]
+
+    def counts(self, key, windows, now):
+        found = self.cache.get_many([f'{key}:{window}' for window in windows])
+        return [found.get(f'{key}:{window}', 0) for window in windows]
+
+    def incr(self, key, window, now, timeout):
+        name = f'{key}:{window}'
+        if not self.cache.add(name, 1, timeout):
+            try:
+                self.cache.incr(name)
+            except ValueError:
+                # Expired since add().
+                self.cache.set(name, 1, timeout)
+            self.cache.touch(name, timeout)
+
+
+@functools.cache
+def get_counters():
+    return import_string(settings.THROTTLE_STORE)()
+
+
+class SlidingWindowMixin:
+    """
+    Sliding-window rate limiting from two fixed-window counters.
+
+    Instead of DRF's list of request timestamps, each client has one integer
+    per window in the THROTTLE_STORE, which is shared by all worker
+    processes. The rate for "now" is estimated as the current window's
+    count plus the previous window's count weighted by how much of it still
+    overlaps the sliding window.
+    """
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        self.now = self.timer()
+        window, elapsed = divmod(self.now, self.duration)
+        window = int(window)
+        self.fraction = elapsed / self.duration
+
+        counters = get_counters()
+        self.current, self.previous = counters.counts(self.key, [window, window - 1], self.now)
+        if self.previous * (1 - self.fraction) + self.current >= self.num_requests:
+            return self.throttle_failure()
+
+        # Counters outlive their window by one window, for the estimate.
+        counters.incr(self.key, window, self.now, 2 * self.duration)
+        return True
+
+    def wait(self):
+        remaining = self.num_requests - self.current
+        if remaining > 0 and self.previous:
+            # Wait until the previous window's weight drops far enough.
+            fraction = 1 - remaining / self.previous
+            return max(fraction - self.fraction, 0) * self.duration
+        # The current window alone is full: wait for it to become the
+        # previous one, then for its weight to drop below the limit.
+        fraction = max(1 - self.num_requests / max(self.current, 1), 0)
+        return (1 - self.fraction + fraction) * self.duration
+
+
+class UserSlidingWindowThrottle(SlidingWindowMixin, UserRateThrottle):
+    pass
+
+
+class AnonSlidingWindowThrottle(SlidingWindowMixin, AnonRateThrottle):
+    pass
+
+
+class ScopedSlidingWindowThrottle(SlidingWindowMixin, ScopedRateThrottle):
+    """
+    Per-endpoint limits: views map HTTP methods to a rate scope with
+    ``throttle_scopes``, e.g. ``{'POST': 'checkout'}``.
+    """
+
+    def allow_request(self, request, view):
+        self.scope = getattr(view, 'throttle_scopes', {}).get(request.method)
+        if not self.scope:
+            return True
+        self.rate = self.get_rate()
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        return super().allow_request(request, view)
@@ -1,13 +1,17 @@
 from django.contrib import admin
 from django.urls import path, include
-from . import views
+from . import async_views, views
 
 urlpatterns = [
     path("menu-items/", views.MenuItemsView.as_view(), name="menu-items"),
+    path("menu-items/import/", views.MenuImportView.as_view(), name="menu-items-import"),
+    path("menu-items/changes/", views.MenuChangesView.as_view(), name="menu-changes"),
     path("menu-items/<int:pk>/", views.SingleMenuItemView.as_view(),
          name="single-menu-item"),
     path("cart/menu-items/", views.CartView.as_view(), name="cart"),
+    path("cart/menu-items/bulk/", views.BulkCartView.as_view(), name="cart-bulk"),
     path("orders/", views.OrdersView.as_view(), name="orders"),
+    path("orders/export/", views.OrderExportView.as_view(), name="orders-export"),
     path("orders/<int:pk>/", views.SingleOrderView.as_view(), name="single-order"),
     path("groups/manager/users/", views.ManagersView.as_view(), name="managers"),
     path("groups/delivery-crew/users/",
@@ -15,5 +19,17 @@ urlpatterns = [
     path("groups/manager/users/<int:pk>/",
          views.DeleteManagerView.as_view(), name="delete-manager"),
     path("groups/delivery-crew/users/<int:pk>/",
-         views.DeleteDeliveryCrewView.as_view(), name="delete-delivery-crew")
+         views.DeleteDeliveryCrewView.as_view(), name="delete-delivery-crew"),
+    path("reports/revenue/", views.RevenueReportView.as_view(), name="report-revenue"),
+    path("reports/delivery-crew/", views.DeliveryCrewReportView.as_view(),
+         name="report-delivery-crew"),
+    path("reports/top-menu-items/", views.TopMenuItemsReportView.as_view(),
+         name="report-top-menu-items"),
+    # Async versions of the read-heavy endpoints, for ASGI deployments.
+    path("async/menu-items/", async_views.AsyncMenuItemsView.as_view(),
+         name="async-menu-items"),
+    path("async/menu-items/<int:pk>/", async_views.AsyncSingleMenuItemView.as_view(),
+         name="async-single-menu-item"),
+    path("async/orders/", async_views.AsyncOrdersView.as_view(), name="async-orders"),
+    path("orders/events/", async_views.OrderEventsView.as_view(), name="order-events"),
 ]
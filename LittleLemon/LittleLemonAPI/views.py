@@ -1,16 +1,42 @@
-from .serializers import MenuItemSerializer, CartSerializer, OrderSerializer, OrderItemSerializer, ManagerGetSerializer, ManagerCreateSerializer
-from .models import MenuItem, Cart, Order, OrderItem
+from .serializers import CategorySerializer, MenuItemSerializer, CartSerializer, CartEntrySerializer, OrderSerializer, OrderItemSerializer, ManagerGetSerializer, ManagerCreateSerializer
+from .serializers import ExportQuerySerializer, MenuChangesQuerySerializer, ReportQuerySerializer, RevenueReportSerializer, DeliveryCrewReportSerializer, TopMenuItemReportSerializer
+from .models import MenuChange, MenuItem, Cart, Order, OrderItem, DailyOrderRollup, DailyMenuItemRollup
 from rest_framework import generics, permissions, status
+from rest_framework.exceptions import PermissionDenied
+from rest_framework.parsers import JSONParser, MultiPartParser
 from rest_framework.response import Response
 from django.contrib.auth.models import User, Group
+from django.http import StreamingHttpResponse
+from django.db.models import F, Prefetch, Sum, Window
+from django.db.models.functions import RowNumber, TruncDay, TruncMonth, TruncWeek
+from .catalogue import CatalogueCacheMixin
+from .checkout import checkout
+from .db_routers import ReplicaReadMixin
+from .exports import ORDER_COLUMNS, WRITERS, order_rows
+from .instrumentation import InstrumentedViewMixin
+from .menu_import import MenuImport, read_rows
+from .menu_sync import menu_delta
+from .pagination import SelectablePaginationMixin, MenuItemKeysetPagination, OrderKeysetPagination
 from .permissions import IsManager, IsCustomer
+from .roles import MANAGER, DELIVERY_CREW
+from .row_serializers import CartRowSerializer, MenuItemRowSerializer, OrderRowSerializer, RowListMixin
+from .search import MenuSearchFilter
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework.filters import OrderingFilter, SearchFilter
-# from django.core.exceptions import PermissionDenied
+from rest_framework.filters import OrderingFilter
+
+
+# Query plans: everything a serializer touches is fetched up front so the
+# number of queries does not grow with the page size. Lists read only the
+# columns their row serializer needs from these.
+MENU_ITEM_PLAN = MenuItem.objects.select_related('category')
+CART_PLAN = Cart.objects.select_related('menuitem__category')
+ORDER_PLAN = Order.objects.select_related('user', 'delivery_crew').prefetch_related(
+    Prefetch('orderitem_set',
+             queryset=OrderItem.objects.select_related('menuitem__category').order_by('pk')))
 
 
 # Create your views here.
-class ManagersView(generics.ListCreateAPIView):
+class ManagersView(InstrumentedViewMixin, generics.ListCreateAPIView):
     permission_classes = [permissions.IsAuthenticated, IsManager]
 
     def get_serializer_class(self):
@@ -19,8 +45,7 @@ class ManagersView(generics.ListCreateAPIView):
         return ManagerGetSerializer
 
     def get_queryset(self):
-        manager_group = Group.objects.get(name='Manager')
-        return manager_group.user_set.all()
+        return User.objects.filter(groups__name=MANAGER)
 
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
@@ -28,8 +53,8 @@ class ManagersView(generics.ListCreateAPIView):
         username = serializer.validated_data['username']
 
         user = User.objects.get(username=username)
-        manager_group = Group.objects.get_or_create(name='Manager')
-        if user in manager_group.user_set.all():
+        manager_group = Group.objects.get_or_create(name=MANAGER)[0]
+        if manager_group.user_set.filter(pk=user.pk).exists():
             return Response(
                 {"message": f"User '{username}' is already a manager"},
                 status=status.HTTP_200_OK,
@@ -42,7 +67,7 @@ class ManagersView(generics.ListCreateAPIView):
         )
 
 
-class DeliveryCrewView(generics.ListCreateAPIView):
+class DeliveryCrewView(InstrumentedViewMixin, generics.ListCreateAPIView):
     permission_classes = [permissions.IsAuthenticated, IsManager]
 
     def get_serializer_class(self):
@@ -51,8 +76,7 @@ class DeliveryCrewView(generics.ListCreateAPIView):
         return ManagerGetSerializer
 
     def get_queryset(self):
-        delivery_team_group = Group.objects.get(name='Delivery Team')
-        return delivery_team_group.user_set.all()
+        return User.objects.filter(groups__name=DELIVERY_CREW)
 
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
@@ -60,29 +84,28 @@ class DeliveryCrewView(generics.ListCreateAPIView):
         username = serializer.validated_data['username']
 
         user = User.objects.get(username=username)
-        delivery_team_group = Group.objects.get_or_create(
-            name='Delivery Team')
-        if user in delivery_team_group.user_set.all():
+        delivery_crew_group = Group.objects.get_or_create(name=DELIVERY_CREW)[0]
+        if delivery_crew_group.user_set.filter(pk=user.pk).exists():
             return Response(
-                {"message": f"User '{username}' is already part of the delivery team"},
+                {"message": f"User '{username}' is already part of the delivery crew"},
                 status=status.HTTP_200_OK,
             )
-        delivery_team_group.user_set.add(user)
+        delivery_crew_group.user_set.add(user)
 
         return Response(
-            {"message": f"User '{username}' has been added to the Manager group"},
+            {"message": f"User '{username}' has been added to the Delivery Crew group"},
             status=status.HTTP_201_CREATED,
         )
 
 
-class DeleteManagerView(generics.DestroyAPIView):
+class DeleteManagerView(InstrumentedViewMixin, generics.DestroyAPIView):
     queryset = User.objects.all()
     permission_classes = [permissions.IsAuthenticated]
 
     def destroy(self, request, *args, **kwargs):
         user = self.get_object()
-        manager_group = Group.objects.get(name="Manager")
-        if user not in manager_group.user_set.all():
+        manager_group = Group.objects.get_or_create(name=MANAGER)[0]
+        if not manager_group.user_set.filter(pk=user.pk).exists():
             return Response(
                 {"error": f"User '{user.username}' is not in the Manager group"},
                 status=status.HTTP_400_BAD_REQUEST,
@@ -94,14 +117,14 @@ class DeleteManagerView(generics.DestroyAPIView):
         )
 
 
-class DeleteDeliveryCrewView(generics.DestroyAPIView):
+class DeleteDeliveryCrewView(InstrumentedViewMixin, generics.DestroyAPIView):
     queryset = User.objects.all()
     permission_classes = [permissions.IsAuthenticated]
 
     def destroy(self, request, *args, **kwargs):
         user = self.get_object()
-        delivery_crew_group = Group.objects.get(name="Delivery Crew")
-        if user not in delivery_crew_group.user_set.all():
+        delivery_crew_group = Group.objects.get_or_create(name=DELIVERY_CREW)[0]
+        if not delivery_crew_group.user_set.filter(pk=user.pk).exists():
             return Response(
                 {"error": f"User '{user.username}' is not in the Delivery Crew group"},
                 status=status.HTTP_400_BAD_REQUEST,
@@ -112,14 +135,18 @@ class DeleteDeliveryCrewView(generics.DestroyAPIView):
                         )
 
 
-class MenuItemsView(generics.ListCreateAPIView):
-    queryset = MenuItem.objects.all()
+class MenuItemsView(InstrumentedViewMixin, ReplicaReadMixin, CatalogueCacheMixin, SelectablePaginationMixin, RowListMixin, generics.ListCreateAPIView):
+    queryset = MENU_ITEM_PLAN
+    keyset_pagination_class = MenuItemKeysetPagination
+    throttle_scopes = {'GET': 'menu'}
     serializer_class = MenuItemSerializer
+    row_serializer_class = MenuItemRowSerializer
     permission_classes = [permissions.IsAuthenticated]
-    filter_backends = [DjangoFilterBackend, OrderingFilter, SearchFilter]
+    filter_backends = [DjangoFilterBackend, MenuSearchFilter, OrderingFilter]
     filterset_fields = ['category', 'price']
-    search_fields = ['name', 'description']
-    ordering_fields = ['price', 'name']
+    # Used only where the database has no search index.
+    search_fields = ['title', 'category__title', 'description']
+    ordering_fields = ['price', 'title']
 
     def create(self, request, *args, **kwargs):
         if not request.user.has_perm('LittleLemonAPI.add_menuitem'):
@@ -127,8 +154,55 @@ class MenuItemsView(generics.ListCreateAPIView):
         return super().create(request, *args, **kwargs)
 
 
-class SingleMenuItemView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = MenuItem.objects.all()
+class MenuImportView(InstrumentedViewMixin, generics.GenericAPIView):
+    """
+    Upsert menu items by title from a JSON list or an uploaded ``file``
+    (CSV with a header line, or JSON). Categories are given by slug.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    parser_classes = [JSONParser, MultiPartParser]
+
+    def post(self, request, *args, **kwargs):
+        if not request.user.has_perms(['LittleLemonAPI.add_menuitem', 'LittleLemonAPI.change_menuitem']):
+            return Response({"error": "Permission denied"}, status=status.HTTP_403_FORBIDDEN)
+        upload = request.FILES.get('file')
+        if upload is not None:
+            rows = read_rows(upload.read(), upload.name)
+        else:
+            rows = read_rows(request.data)
+        report = MenuImport().run(rows)
+        failed = report['errors'] and not report['imported']
+        return Response(report, status=status.HTTP_400_BAD_REQUEST if failed else status.HTTP_200_OK)
+
+
+class MenuChangesView(InstrumentedViewMixin, CatalogueCacheMixin, generics.RetrieveAPIView):
+    """
+    The menu items and categories changed since ``?since=``, the
+    ``version`` a client got from its last sync, and the ids of those
+    deleted. Without ``since``, or when it is older than the change log
+    keeps, everything is sent with ``snapshot`` set.
+    """
+    throttle_scopes = {'GET': 'menu'}
+    permission_classes = [permissions.IsAuthenticated]
+
+    def retrieve(self, request, *args, **kwargs):
+        query = MenuChangesQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        version, snapshot, changed, deleted = menu_delta(query.validated_data.get('since'))
+        return Response({
+            'version': version,
+            'snapshot': snapshot,
+            'menu_items': MenuItemSerializer(changed[MenuChange.MENU_ITEM], many=True).data,
+            'categories': CategorySerializer(changed[MenuChange.CATEGORY], many=True).data,
+            'deleted': {
+                'menu_items': deleted[MenuChange.MENU_ITEM],
+                'categories': deleted[MenuChange.CATEGORY],
+            },
+        })
+
+
+class SingleMenuItemView(InstrumentedViewMixin, CatalogueCacheMixin, generics.RetrieveUpdateDestroyAPIView):
+    queryset = MENU_ITEM_PLAN
     serializer_class = MenuItemSerializer
     permission_classes = [permissions.IsAuthenticated]
 
@@ -138,13 +212,14 @@ class SingleMenuItemView(generics.RetrieveUpdateDestroyAPIView):
         return super().destroy(request, *args, **kwargs)
 
 
-class CartView(generics.ListCreateAPIView):
-    queryset = Cart.objects.all()
+class CartView(InstrumentedViewMixin, RowListMixin, generics.ListCreateAPIView):
+    queryset = CART_PLAN
     serializer_class = CartSerializer
+    row_serializer_class = CartRowSerializer
     permission_classes = [permissions.IsAuthenticated, IsCustomer]
 
     def get_queryset(self):
-        return Cart.objects.filter(user=self.request.user)
+        return CART_PLAN.filter(user=self.request.user)
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
@@ -155,65 +230,82 @@ class CartView(generics.ListCreateAPIView):
         return Response({"success": "Your cart has been emptied."}, status=status.HTTP_204_NO_CONTENT)
 
 
-class OrdersView(generics.ListCreateAPIView):
+class BulkCartView(InstrumentedViewMixin, generics.GenericAPIView):
+    serializer_class = CartEntrySerializer
+    permission_classes = [permissions.IsAuthenticated, IsCustomer]
+
+    def post(self, request, *args, **kwargs):
+        # Entries replace the quantity of menu items already in the cart.
+        serializer = self.get_serializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        serializer.save(user=request.user)
+        cart = CART_PLAN.filter(user=request.user)
+        return Response(CartSerializer(cart, many=True).data, status=status.HTTP_200_OK)
+
+
+class OrdersView(InstrumentedViewMixin, SelectablePaginationMixin, RowListMixin, generics.ListCreateAPIView):
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = OrderSerializer
+    row_serializer_class = OrderRowSerializer
+    keyset_pagination_class = OrderKeysetPagination
+    throttle_scopes = {'POST': 'checkout'}
     filter_backends = [DjangoFilterBackend, OrderingFilter]
     filterset_fields = ['status', 'delivery_crew', 'user', 'date']
     ordering_fields = ['total', 'date']
 
     def get_queryset(self):
         user = self.request.user
-        if user.groups.filter(name='Manager').exists():
-            return Order.objects.all()
-        elif user.groups.filter(name='Delivery Crew').exists():
-            return Order.objects.filter(delivery_crew=user)
+        if self.request.roles.is_manager:
+            return ORDER_PLAN.all()
+        elif self.request.roles.is_delivery_crew:
+            return ORDER_PLAN.filter(delivery_crew=user)
         else:
-            return Order.objects.filter(user=user)
+            return ORDER_PLAN.filter(user=user)
 
-    def perform_create(self, serializer):
-        user = self.request.user
-        cart_items = Cart.objects.filter(user=user)
-
-        if not cart_items.exists():
-            raise serializers.ValidationError("Your cart is empty.")
-
-        order = serializer.save(user=user, total=sum(
-            item.price for item in cart_items))
-        order_items = [
-            OrderItem(
-                order=order,
-                menuitem=item.menuitem,
-                quantity=item.quantity,
-                unit_price=item.unit_price,
-                price=item.price
-            )
-            for item in cart_items
-        ]
-        OrderItem.objects.bulk_create(order_items)
-        cart_items.delete()
-        return order
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        order, created = checkout(
+            request.user, request.headers.get('Idempotency-Key'),
+            **serializer.validated_data)
+        # Through the plan, or serializing the items costs queries per item.
+        order = ORDER_PLAN.get(pk=order.pk)
+        return Response(
+            self.get_serializer(order).data,
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK,
+        )
 
 
-class SingleOrderView(generics.RetrieveUpdateDestroyAPIView):
+class SingleOrderView(InstrumentedViewMixin, generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = OrderSerializer
 
     def get_queryset(self):
         user = self.request.user
-        if user.groups.filter(name='Manager').exists():
-            return Order.objects.all()
-        elif user.groups.filter(name='Delivery Crew').exists():
-            return Order.objects.filter(delivery_crew=user)
+        if self.request.roles.is_manager:
+            return ORDER_PLAN.all()
+        elif self.request.roles.is_delivery_crew:
+            return ORDER_PLAN.filter(delivery_crew=user)
         else:
-            return Order.objects.filter(user=user)
+            return ORDER_PLAN.filter(user=user)
+
+    def update(self, request, *args, **kwargs):
+        # UpdateModelMixin drops the prefetched items after saving, and the
+        # serializer would then read each item's menu item and category on
+        # its own; the updated order is read back through ORDER_PLAN instead.
+        partial = kwargs.pop('partial', False)
+        instance = self.get_object()
+        serializer = self.get_serializer(instance, data=request.data, partial=partial)
+        serializer.is_valid(raise_exception=True)
+        self.perform_update(serializer)
+        return Response(self.get_serializer(ORDER_PLAN.get(pk=instance.pk)).data)
 
     def perform_update(self, serializer):
-        user = self.request.user
+        roles = self.request.roles
 
-        if user.groups.filter(name='Manager').exists():
+        if roles.is_manager:
             serializer.save()
-        elif user.groups.filter(name='Delivery Crew').exists():
+        elif roles.is_delivery_crew:
             if 'status' in serializer.validated_data and len(serializer.validated_data) == 1:
                 serializer.save()
             else:
@@ -223,8 +315,88 @@ class SingleOrderView(generics.RetrieveUpdateDestroyAPIView):
                 "You do not have permission to update this order.")
 
     def destroy(self, request, *args, **kwargs):
-        user = request.user
-
-        if user.groups.filter(name='Manager').exists():
+        if request.roles.is_manager:
             return super().destroy(request, *args, **kwargs)
         raise PermissionDenied("Only managers can delete orders.")
+
+
+class ReportView(InstrumentedViewMixin, ReplicaReadMixin, generics.GenericAPIView):
+    """
+    Base for the manager reports, which read the daily rollup tables rather
+    than live orders. ``?period=day|week|month`` picks the bucket size and
+    ``start``/``end`` bound the dates.
+    """
+    permission_classes = [permissions.IsAuthenticated, IsManager]
+    periods = {'day': TruncDay, 'week': TruncWeek, 'month': TruncMonth}
+
+    def get_report_queryset(self, model):
+        params = ReportQuerySerializer(data=self.request.query_params)
+        params.is_valid(raise_exception=True)
+        self.params = params.validated_data
+
+        queryset = model.objects.all()
+        if 'start' in self.params:
+            queryset = queryset.filter(date__gte=self.params['start'])
+        if 'end' in self.params:
+            queryset = queryset.filter(date__lte=self.params['end'])
+        if self.params['status'] is not None:
+            queryset = queryset.filter(status=self.params['status'])
+        return queryset.annotate(period=self.periods[self.params['period']]('date'))
+
+
+class RevenueReportView(ReportView):
+    serializer_class = RevenueReportSerializer
+
+    def get(self, request, *args, **kwargs):
+        rows = self.get_report_queryset(DailyOrderRollup).values('period').annotate(
+            orders=Sum('order_count'), revenue=Sum('revenue')).order_by('period')
+        return Response(self.get_serializer(rows, many=True).data)
+
+
+class DeliveryCrewReportView(ReportView):
+    serializer_class = DeliveryCrewReportSerializer
+
+    def get(self, request, *args, **kwargs):
+        rows = self.get_report_queryset(DailyOrderRollup).values('period', 'delivery_crew').annotate(
+            orders=Sum('order_count'), revenue=Sum('revenue')
+        ).order_by('period', 'delivery_crew')
+        return Response(self.get_serializer(rows, many=True).data)
+
+
+class TopMenuItemsReportView(ReportView):
+    serializer_class = TopMenuItemReportSerializer
+
+    def get(self, request, *args, **kwargs):
+        # Ranked within each period by the database, which returns the top rows only.
+        rows = self.get_report_queryset(DailyMenuItemRollup).values(
+            'period', 'menuitem', title=F('menuitem__title')
+        ).annotate(
+            quantity=Sum('quantity'), revenue=Sum('revenue')
+        ).annotate(rank=Window(
+            RowNumber(), partition_by=F('period'),
+            order_by=(F('revenue').desc(), F('quantity').desc(), F('menuitem').asc()),
+        )).filter(rank__lte=self.params['limit']).order_by('period', 'rank')
+        return Response(self.get_serializer(rows, many=True).data)
+
+
+class OrderExportView(InstrumentedViewMixin, ReplicaReadMixin, generics.GenericAPIView):
+    """
+    Stream the order history as ``?output=csv|ndjson``, one row per order
+    item, optionally bounded by ``start``/``end`` dates.
+    """
+    permission_classes = [permissions.IsAuthenticated, IsManager]
+
+    def get(self, request, *args, **kwargs):
+        params = ExportQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        output = params.validated_data.pop('output')
+
+        rows = order_rows(**params.validated_data)
+        # The body is produced after dispatch returns, so pin the database
+        # the router picks now rather than when the rows are read.
+        rows = rows.using(rows.db)
+        write, content_type = WRITERS[output]
+        response = StreamingHttpResponse(write(rows, list(ORDER_COLUMNS)),
+                                         content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="orders.{output}"'
+        return response